@@ -7,7 +7,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PathFinder_AI.settings')
 
+from django.conf import settings
 from intelligent_assistant import routing
+from intelligent_assistant.gemini import get_model_catalog
+from intelligent_assistant.metrics import metrics
+from intelligent_assistant.model_registry import ai_models
+
+# Carga anticipada: el servidor arranca ya con YOLO cargado y calentado (readiness en /intelligent-assistant/health/ready/).
+if settings.AI_MODELS_EAGER_LOAD:
+  ai_models.load_all(background=True)
+
+# El catálogo de modelos de Gemini se consulta al arrancar (en segundo plano) y no dentro de una petición.
+if settings.GEMINI_API_KEY:
+  get_model_catalog().start()
+
+# Cada worker publica sus métricas en METRICS_DIR; cualquiera de ellos sirve el agregado.
+if settings.METRICS_DIR:
+  metrics.start_export(settings.METRICS_DIR, interval=settings.METRICS_EXPORT_INTERVAL)
 
 application = ProtocolTypeRouter({
   "http": get_asgi_application(),
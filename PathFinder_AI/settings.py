@@ -34,11 +34,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'core.apps.CoreConfig',
     'auth_api.apps.AuthConfig',
+    'intelligent_assistant.apps.IntelligentAssistantConfig',
     'channels',
     'storages',
 ]
 
 MIDDLEWARE = [
+    'utils.middleware.RequestTracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -138,6 +140,20 @@ CSRF_TRUSTED_ORIGINS = [
     'http://127.0.0.1:8000',
 ]
 
+# Cachés: la del lector de texto puede apuntar a un backend compartido entre workers
+# (p. ej. django.core.cache.backends.filebased.FileBasedCache con una ruta común)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "text_reader": {
+        "BACKEND": os.getenv("TEXT_READER_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("TEXT_READER_CACHE_LOCATION", "text-reader"),
+        "TIMEOUT": int(os.getenv("TEXT_READER_CACHE_TTL", "3600")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("TEXT_READER_CACHE_MAX_ENTRIES", "5000"))},
+    },
+}
+
 # ASGI / Channels
 ASGI_APPLICATION = 'PathFinder_AI.asgi.application'
 CHANNEL_LAYERS = {
@@ -146,6 +162,144 @@ CHANNEL_LAYERS = {
     },
 }
 
+# --------------------------
+# OBSTACLE DETECTION PIPELINE
+# --------------------------
+# Hilos compartidos para YOLO, Gemini y S3 (no se crea un hilo por ciclo)
+AI_EXECUTOR_WORKERS = int(os.getenv("AI_EXECUTOR_WORKERS", os.cpu_count() or 1))
+# Ciclos pendientes por conexión; si la cola está llena el ciclo se descarta
+OBSTACLE_WORK_QUEUE_SIZE = int(os.getenv("OBSTACLE_WORK_QUEUE_SIZE", "1"))
+# Lotes de YOLO entre conexiones: ventana de espera (ms) y tamaño máximo del lote
+YOLO_BATCH_WINDOW_MS = float(os.getenv("YOLO_BATCH_WINDOW_MS", "15"))
+YOLO_BATCH_MAX_SIZE = int(os.getenv("YOLO_BATCH_MAX_SIZE", "8"))
+# Lado mayor mínimo al decodificar frames (reducción nativa 1/2, 1/4, 1/8 de JPEG); 0 = resolución completa
+FRAME_DECODE_MAX_SIDE = int(os.getenv("FRAME_DECODE_MAX_SIDE", "640"))
+# Backend de inferencia en CPU: pytorch (.pt), onnx (.onnx) u openvino (_openvino_model/); onnx y openvino
+# necesitan requirements-backends.txt
+YOLO_BACKEND = os.getenv("YOLO_BACKEND", "pytorch")
+# segment = yolov8m-seg (máscaras que no se usan); detect = cabeza solo de detección, más rápida
+YOLO_TASK = os.getenv("YOLO_TASK", "segment")
+YOLO_MODELS_DIR = os.getenv("YOLO_MODELS_DIR", "intelligent_assistant/IA_models")
+YOLO_MODEL_NAME = os.getenv("YOLO_MODEL_NAME", "yolov8m")
+# Ruta explícita de pesos; si está vacía se deduce de backend, tarea y nombre del modelo
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS") or None
+# 0 = inferencia dentro del proceso; N > 0 = N procesos de inferencia con memoria compartida
+YOLO_WORKER_PROCESSES = int(os.getenv("YOLO_WORKER_PROCESSES", "0"))
+YOLO_WORKER_MAX_FRAME_SIZE = (1920, 1080)
+YOLO_WORKER_TIMEOUT = float(os.getenv("YOLO_WORKER_TIMEOUT", "30"))
+# Modelos de IA: carga perezosa con la primera conexión o anticipada al arrancar el servidor ASGI;
+# WARMUP ejecuta una inferencia de prueba tras cargar YOLO
+AI_MODELS_EAGER_LOAD = os.getenv("AI_MODELS_EAGER_LOAD", "False") == "True"
+AI_MODELS_WARMUP = os.getenv("AI_MODELS_WARMUP", "True") == "True"
+# Métricas de Prometheus: directorio compartido por los workers del host (vacío = solo el proceso que
+# atiende la petición), cada cuántos segundos exporta cada worker y antigüedad máxima de una exportación
+METRICS_DIR = os.getenv("METRICS_DIR") or None
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "5"))
+METRICS_MAX_AGE = float(os.getenv("METRICS_MAX_AGE", "60"))
+# Logs estructurados: formato json (agregador de logs) o text (consola), nivel de la aplicación y
+# registro de los spans de tiempo por etapa (logger pathfinder.spans en DEBUG)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+TRACE_SPANS = os.getenv("TRACE_SPANS", "False") == "True"
+# Perfilado por muestreo: 1 de cada N ciclos, frames del modo continuo o peticiones HTTP (0 = desactivado),
+# carpeta de los perfiles y motor (cprofile o pyinstrument)
+TRACE_PROFILE_EVERY = int(os.getenv("TRACE_PROFILE_EVERY", "0"))
+TRACE_PROFILE_DIR = os.getenv("TRACE_PROFILE_DIR", str(BASE_DIR / "profiles"))
+TRACE_PROFILE_ENGINE = os.getenv("TRACE_PROFILE_ENGINE", "cprofile")
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'correlation': {'()': 'utils.tracing.CorrelationFilter'},
+    },
+    'formatters': {
+        'structured': {'()': 'utils.tracing.StructuredFormatter', 'output': LOG_FORMAT},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['correlation'],
+            'formatter': 'structured',
+        },
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        **{app: {'level': LOG_LEVEL} for app in ('intelligent_assistant', 'auth_api', 'core', 'utils')},
+        'pathfinder.spans': {'level': 'DEBUG' if TRACE_SPANS else 'INFO'},
+    },
+}
+# Gemini: envío de la instrucción por fragmentos a medida que se genera y timeout por llamada (s)
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "True") == "True"
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "15"))
+# Gateway de Gemini compartido por navegación y lector de texto: llamadas simultáneas, token bucket
+# (llamadas/minuto y ráfaga), espera máxima en cola (s) y circuit breaker (fallos seguidos, s abierto)
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "600"))
+GEMINI_RATE_BURST = int(os.getenv("GEMINI_RATE_BURST", "10"))
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "10"))
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+GEMINI_PREWARM = os.getenv("GEMINI_PREWARM", "True") == "True"
+# Intervalo (s) de refresco en segundo plano del catálogo de modelos; 0 = solo al arrancar
+GEMINI_CATALOG_REFRESH = float(os.getenv("GEMINI_CATALOG_REFRESH", "3600"))
+# Lector de texto: la imagen subida se reduce a MAX_EDGE px en su lado mayor y se recodifica en JPEG
+TEXT_READER_MAX_EDGE = int(os.getenv("TEXT_READER_MAX_EDGE", "1600"))
+TEXT_READER_JPEG_QUALITY = int(os.getenv("TEXT_READER_JPEG_QUALITY", "85"))
+# Caché de resultados del lector de texto: alias en CACHES, TTL (s) y distancia máxima del pHash de 256 bits
+TEXT_READER_CACHE_ENABLED = os.getenv("TEXT_READER_CACHE_ENABLED", "True") == "True"
+TEXT_READER_CACHE_ALIAS = "text_reader"
+TEXT_READER_CACHE_TTL = int(os.getenv("TEXT_READER_CACHE_TTL", "3600"))
+TEXT_READER_CACHE_MAX_DISTANCE = int(os.getenv("TEXT_READER_CACHE_MAX_DISTANCE", "24"))
+# OCR local (easyocr) antes de Gemini para texto impreso; por debajo de MIN_CONFIDENCE decide Gemini
+TEXT_OCR_ENABLED = os.getenv("TEXT_OCR_ENABLED", "False") == "True"
+TEXT_OCR_LANGUAGES = tuple(os.getenv("TEXT_OCR_LANGUAGES", "es,en").split(","))
+TEXT_OCR_MAX_SIDE = int(os.getenv("TEXT_OCR_MAX_SIDE", "1280"))
+TEXT_OCR_MIN_CONFIDENCE = float(os.getenv("TEXT_OCR_MIN_CONFIDENCE", "0.8"))
+# Caché de instrucciones por escena: TTL (s), distancia máxima de dHash (bits) y tamaños LRU
+SCENE_CACHE_ENABLED = os.getenv("SCENE_CACHE_ENABLED", "True") == "True"
+SCENE_CACHE_TTL = float(os.getenv("SCENE_CACHE_TTL", "10"))
+SCENE_CACHE_MAX_DISTANCE = int(os.getenv("SCENE_CACHE_MAX_DISTANCE", "6"))
+SCENE_CACHE_USER_ENTRIES = int(os.getenv("SCENE_CACHE_USER_ENTRIES", "32"))
+SCENE_CACHE_GLOBAL_ENTRIES = int(os.getenv("SCENE_CACHE_GLOBAL_ENTRIES", "512"))
+# Filtro de escena estática (diferencia media en gris 0-255 sobre miniaturas a 1/8):
+# < STATIC repite la última instrucción, < YOLO solo re-ejecuta YOLO; MAX_SKIPS fuerza un ciclo completo
+FRAME_GATE_ENABLED = os.getenv("FRAME_GATE_ENABLED", "True") == "True"
+FRAME_GATE_STATIC_THRESHOLD = float(os.getenv("FRAME_GATE_STATIC_THRESHOLD", "3"))
+FRAME_GATE_YOLO_THRESHOLD = float(os.getenv("FRAME_GATE_YOLO_THRESHOLD", "10"))
+FRAME_GATE_MAX_SKIPS = int(os.getenv("FRAME_GATE_MAX_SKIPS", "5"))
+# Seguimiento de objetos por conexión: umbral IoU, distancia máxima entre centros (normalizada),
+# edad máxima de un track sin ver (s) y TTC (s) por debajo del cual un objeto se considera que se acerca
+TRACKER_IOU_THRESHOLD = float(os.getenv("TRACKER_IOU_THRESHOLD", "0.3"))
+TRACKER_MAX_CENTROID_DISTANCE = float(os.getenv("TRACKER_MAX_CENTROID_DISTANCE", "0.15"))
+TRACKER_MAX_AGE = float(os.getenv("TRACKER_MAX_AGE", "3"))
+TRACKER_APPROACH_TTC = float(os.getenv("TRACKER_APPROACH_TTC", "4"))
+# Aviso local inmediato a partir de YOLO antes de Gemini. Áreas como fracción del frame;
+# NEAR_BOTTOM es la posición normalizada del borde inferior a partir de la cual el objeto está cerca
+LOCAL_TIER_ENABLED = os.getenv("LOCAL_TIER_ENABLED", "True") == "True"
+LOCAL_TIER_MIN_AREA = float(os.getenv("LOCAL_TIER_MIN_AREA", "0.02"))
+LOCAL_TIER_NEAR_AREA = float(os.getenv("LOCAL_TIER_NEAR_AREA", "0.25"))
+LOCAL_TIER_NEAR_BOTTOM = float(os.getenv("LOCAL_TIER_NEAR_BOTTOM", "0.9"))
+# La página de la guía usa ciclos de verificación salvo que se active el modo continuo
+OBSTACLE_CONTINUOUS_MODE = os.getenv("OBSTACLE_CONTINUOUS_MODE", "False") == "True"
+# Modo continuo (último frame gana): fps objetivo del cliente, frames seguidos para confirmar un
+# cambio de peligro, refresco de Gemini (s) sin cambios y cada cuántos frames se registran estadísticas
+STREAM_TARGET_FPS = float(os.getenv("STREAM_TARGET_FPS", "5"))
+STREAM_HAZARD_CONFIRM_FRAMES = int(os.getenv("STREAM_HAZARD_CONFIRM_FRAMES", "2"))
+STREAM_GEMINI_INTERVAL = float(os.getenv("STREAM_GEMINI_INTERVAL", "3"))
+STREAM_STATS_INTERVAL = int(os.getenv("STREAM_STATS_INTERVAL", "50"))
+# Control AIMD de lo que envía cada cliente en modo continuo: niveles (lado mayor px, calidad JPEG),
+# nivel inicial, límites del intervalo entre frames (ms), latencia objetivo de detección (ms),
+# cola máxima del batcher de YOLO y cada cuántos segundos se recalculan los objetivos
+STREAM_CONTROL_ENABLED = os.getenv("STREAM_CONTROL_ENABLED", "True") == "True"
+STREAM_CONTROL_LEVELS = ((320, 50), (480, 60), (640, 70), (960, 75), (1280, 80))
+STREAM_CONTROL_START_LEVEL = int(os.getenv("STREAM_CONTROL_START_LEVEL", "2"))
+STREAM_CONTROL_MIN_INTERVAL_MS = float(os.getenv("STREAM_CONTROL_MIN_INTERVAL_MS", "100"))
+STREAM_CONTROL_MAX_INTERVAL_MS = float(os.getenv("STREAM_CONTROL_MAX_INTERVAL_MS", "2000"))
+STREAM_CONTROL_TARGET_LATENCY_MS = float(os.getenv("STREAM_CONTROL_TARGET_LATENCY_MS", "150"))
+STREAM_CONTROL_MAX_QUEUE_DEPTH = int(os.getenv("STREAM_CONTROL_MAX_QUEUE_DEPTH", "8"))
+STREAM_CONTROL_INTERVAL = float(os.getenv("STREAM_CONTROL_INTERVAL", "1"))
+
 # --------------------------
 # AWS S3 CONFIGURATION
 # --------------------------
@@ -154,6 +308,15 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME", "novidentes")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME", "us-east-1")
 AWS_S3_CUSTOM_DOMAIN = os.getenv("AWS_S3_CUSTOM_DOMAIN", f"{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com")
+# Endpoint compatible con S3 (p. ej. MinIO); vacío = AWS
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
+
+# Subida de frames de verificación en segundo plano: s3 o local (MEDIA_ROOT, para pruebas);
+# cada hilo sube un frame a la vez, así que FRAME_UPLOAD_WORKERS es el número de subidas simultáneas
+FRAME_UPLOAD_BACKEND = os.getenv("FRAME_UPLOAD_BACKEND", "s3")
+FRAME_UPLOAD_QUEUE_SIZE = int(os.getenv("FRAME_UPLOAD_QUEUE_SIZE", "64"))
+FRAME_UPLOAD_WORKERS = int(os.getenv("FRAME_UPLOAD_WORKERS", "2"))
+FRAME_UPLOAD_MAX_RETRIES = int(os.getenv("FRAME_UPLOAD_MAX_RETRIES", "3"))
 
 # Prefijo donde se colocarán assets estáticos
 AWS_LOCATION = "static"
@@ -1,4 +1,4 @@
-import traceback
+import logging
 
 from django.contrib import messages
 from django.contrib.auth.views import LoginView, LogoutView
@@ -15,6 +15,8 @@ from auth_api.models import CustomUser
 from auth_api.utils.validators import Validation
 from utils.safe_views import SafeExceptionMixin
 
+logger = logging.getLogger(__name__)
+
 
 @method_decorator(never_cache, name='dispatch')
 class RegisterView(SafeExceptionMixin, CreateView):
@@ -55,12 +57,8 @@ class RegisterView(SafeExceptionMixin, CreateView):
         return JsonResponse({"error": "No se especificó un campo"}, status=400)
 
       field_value = request.POST.get(field_name, '').strip()
-
-      print(f"\n{'=' * 50}")
-      print(f"Campo: {field_name}")
-      print(f"Valor recibido: '{field_value}'")
-      print(f"Longitud: {len(field_value)}")
-      print(f"{'=' * 50}\n")
+      # Nunca se registran los valores: pueden ser contraseñas o datos personales.
+      logger.debug("Validando campo de registro.", extra={'field': field_name})
 
       optional_fields = {'alternative_contact', 'emailAlternative'}
 
@@ -72,41 +70,32 @@ class RegisterView(SafeExceptionMixin, CreateView):
 
       try:
         if field_name == 'full_name':
-          print(f"Validando full_name...")
-          result = Validation.validate_full_name(field_value)
-          print(f"Resultado validación: {result}")
+          Validation.validate_full_name(field_value)
 
         elif field_name == 'email':
-          print(f"Validando email...")
           validated_email = Validation.validate_email(field_value)
           if CustomUser.objects.filter(email=validated_email).exists():
             return JsonResponse({field_name: "invalid", "error": "Este correo ya está registrado"})
 
         elif field_name == 'emailEmergency':
-          print(f"Validando emailEmergency...")
           Validation.validate_email(field_value)
 
         elif field_name == 'emailAlternative':
-          print(f"Validando emailAlternative...")
           Validation.validate_email(field_value)
 
         elif field_name == 'emergency_contact':
-          print(f"Validando emergency_contact...")
           Validation.validate_phone_number(field_value)
 
         elif field_name == 'alternative_contact':
           if field_value:
-            print(f"Validando alternative_contact...")
             Validation.validate_phone_number(field_value)
 
         elif field_name == 'age':
-          print(f"Validando age...")
           if not field_value.isdigit():
             return JsonResponse({field_name: "invalid", "error": "Ingrese un número válido"})
           Validation.validate_age(int(field_value))
 
         elif field_name == 'password1':
-          print(f"Validando password1...")
           if len(field_value) < 8:
             return JsonResponse({field_name: "invalid", "error": "La contraseña debe tener al menos 8 caracteres"})
 
@@ -127,18 +116,13 @@ class RegisterView(SafeExceptionMixin, CreateView):
                 {field_name: "invalid", "error": "La contraseña es muy similar al correo electrónico"})
 
         elif field_name == 'password2':
-          print(f"Validando password2...")
           password1 = request.POST.get('password1', '')
-          print(f"Password1 recibido: '{password1}'")
-          print(f"Password2 recibido: '{field_value}'")
-          print(f"¿Son iguales?: {field_value == password1}")
 
           if not password1:
             return JsonResponse({field_name: "invalid", "error": "Primero ingrese la contraseña"})
           if field_value != password1:
             return JsonResponse({field_name: "invalid", "error": "Las contraseñas no coinciden"})
 
-        print(f"✓ Validación exitosa para {field_name}")
         return JsonResponse({field_name: "valid"})
 
       except ValidationError as e:
@@ -152,14 +136,10 @@ class RegisterView(SafeExceptionMixin, CreateView):
         if isinstance(error_message, list):
           error_message = error_message[0]
 
-        print(f"✗ ValidationError: {error_message}")
-        print(f"✗ Tipo de error: {type(e)}")
-        print(f"✗ Dir del error: {dir(e)}")
         return JsonResponse({field_name: "invalid", "error": error_message})
 
       except Exception as e:
-        print(f"✗ Exception: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error validando el campo de registro.", extra={'field': field_name})
         return JsonResponse({field_name: "invalid", "error": str(e)})
 
     return super().post(request, *args, **kwargs)
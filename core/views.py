@@ -1,4 +1,5 @@
 import json
+import logging
 from datetime import datetime
 
 from django.conf import settings
@@ -17,6 +18,8 @@ from django.views.generic.edit import FormView
 from .forms import UserFeedbackForm
 from .models import TrainingExercise
 
+logger = logging.getLogger(__name__)
+
 
 class HomeView(SafeExceptionMixin, LoginRequiredMixin, TemplateView):
   template_name = 'core/home.html'
@@ -101,7 +104,7 @@ class SendAlertView(SafeExceptionMixin, LoginRequiredMixin, View):
       return JsonResponse({'status': 'success', 'message': 'Alerta enviada correctamente.'})
 
     except Exception as e:
-      print(f"Error al enviar alerta: {e}")
+      logger.exception("Error al enviar alerta.")
       return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 
@@ -1,236 +1,628 @@
+import asyncio
 import base64
+import functools
 import json
-import threading
+import logging
+import os
 import time
-from uuid import uuid4
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
-import cv2
-import numpy as np
-from botocore.exceptions import BotoCoreError, ClientError
-from channels.generic.websocket import WebsocketConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
-from ultralytics import YOLO
-
-try:
-  yolo_model = YOLO('intelligent_assistant/IA_models/yolov8m-seg.pt')
-  import google.generativeai as genai
-
-  genai.configure(api_key=settings.GEMINI_API_KEY)
-  gemini_model = genai.GenerativeModel('gemini-flash-lite-latest') 
-
-  print("✅ Modelos de IA cargados correctamente:")
-  print("   - YOLOv8m-seg (Detección de objetos)")
-  print("   - Gemini 1.5 Flash (Análisis contextual)")
-
-except Exception as e:
-  print(f"❌ ERROR CRÍTICO: No se pudieron cargar los modelos de IA. {e}")
-  yolo_model = None
-  gemini_model = None
-
-
-def upload_frame_to_s3(image_bytes: bytes, filename_prefix: str = "frames") -> str:
-  bucket = settings.AWS_STORAGE_BUCKET_NAME
-  region = getattr(settings, "AWS_S3_REGION_NAME", None)
-  filename = f"{filename_prefix}/{uuid4().hex}_{int(time.time())}.jpg"
-
-  s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=getattr(settings, "AWS_ACCESS_KEY_ID", None),
-    aws_secret_access_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
-    region_name=region
-  )
-
-  try:
-    s3_client.put_object(
-      Bucket=bucket,
-      Key=filename,
-      Body=image_bytes,
-      ContentType='image/jpeg',
-    )
-  except (BotoCoreError, ClientError) as e:
-    raise RuntimeError(f"Error subiendo a S3: {e}")
-
-  domain = getattr(settings, "AWS_S3_CUSTOM_DOMAIN", f"{bucket}.s3.amazonaws.com")
-  url = f"https://{domain}/{filename}"
-  return url
+
+from utils.tracing import bind, correlation, get_profiler, new_id, span
+
+from .fast_tier import hazard_state, local_instruction
+from .frame_gate import GATE_FULL, GATE_REEMIT, GATE_YOLO, FrameChangeGate
+from .frames import ROLE_CONTEXT, ROLE_STREAM, ROLE_VERIFICATION, Frame, parse_binary_frame
+from .gemini import (
+  PRIORITY_NAVIGATION, GeminiUnavailable, compact_yolo_context, get_gateway, navigation_contents, stream_text,
+)
+from .inference import InferenceBatcher, assign_zones
+from .metrics import COUNTER, GAUGE, Sample, metrics
+from .model_registry import MODEL_GEMINI, MODEL_YOLO, ai_models
+from .scene_cache import SceneInstructionCache, zone_signature
+from .streaming import AdaptiveStreamController, HazardMonitor, LatestFrameSlot, StreamStats
+from .tracking import ObjectTracker
+from .uploads import FrameUploader, build_frame_store
+
+YOLO_WORKER_PROCESSES = getattr(settings, "YOLO_WORKER_PROCESSES", 0)
+FRAME_DECODE_MAX_SIDE = getattr(settings, "FRAME_DECODE_MAX_SIDE", 640)
+GEMINI_STREAMING = getattr(settings, "GEMINI_STREAMING", True)
+GEMINI_TIMEOUT = getattr(settings, "GEMINI_TIMEOUT", 15)
+LOCAL_TIER_ENABLED = getattr(settings, "LOCAL_TIER_ENABLED", True)
+STREAM_TARGET_FPS = getattr(settings, "STREAM_TARGET_FPS", 5)
+STREAM_GEMINI_INTERVAL = getattr(settings, "STREAM_GEMINI_INTERVAL", 3.0)
+STREAM_STATS_INTERVAL = getattr(settings, "STREAM_STATS_INTERVAL", 50)
+STREAM_CONTROL_ENABLED = getattr(settings, "STREAM_CONTROL_ENABLED", True)
+STREAM_CONTROL_INTERVAL = getattr(settings, "STREAM_CONTROL_INTERVAL", 1.0)
+
+logger = logging.getLogger(__name__)
+
+TIER_LOCAL = 'local'
+TIER_GEMINI = 'gemini'
+
+MODE_CONTINUOUS = 'continuous'
+
+# Todas las llamadas a Gemini pasan por el gateway del proceso (límites de cuota y circuit breaker).
+# YOLO y el modelo de navegación se cargan en ai_models con la primera conexión, no al importar.
+gemini_gateway = get_gateway()
+
+# Pool compartido por todas las conexiones para las llamadas bloqueantes (YOLO, Gemini, S3).
+AI_EXECUTOR = ThreadPoolExecutor(
+  max_workers=getattr(settings, "AI_EXECUTOR_WORKERS", None) or os.cpu_count() or 1,
+  thread_name_prefix="ai-executor",
+)
+
+
+def detect_batch(images):
+  return ai_models.get(MODEL_YOLO)(images)
+
+
+# Un único lote de YOLO por ventana de tiempo para todas las conexiones del proceso.
+yolo_batcher = InferenceBatcher(
+  detect_batch,
+  AI_EXECUTOR,
+  window_ms=getattr(settings, "YOLO_BATCH_WINDOW_MS", 15),
+  max_batch_size=getattr(settings, "YOLO_BATCH_MAX_SIZE", 8),
+  max_concurrent_batches=YOLO_WORKER_PROCESSES or 1,
+)
+
+
+# Instrucciones recientes por escena (resumen de zonas YOLO + dHash del frame de verificación).
+scene_cache = SceneInstructionCache(
+  ttl=getattr(settings, "SCENE_CACHE_TTL", 10),
+  max_distance=getattr(settings, "SCENE_CACHE_MAX_DISTANCE", 6),
+  user_entries=getattr(settings, "SCENE_CACHE_USER_ENTRIES", 32),
+  global_entries=getattr(settings, "SCENE_CACHE_GLOBAL_ENTRIES", 512),
+) if getattr(settings, "SCENE_CACHE_ENABLED", True) else None
+
+
+# Subidas de frames de verificación fuera del camino crítico de la instrucción.
+frame_uploader = FrameUploader(
+  build_frame_store(),
+  max_queue=getattr(settings, "FRAME_UPLOAD_QUEUE_SIZE", 64),
+  workers=getattr(settings, "FRAME_UPLOAD_WORKERS", 2),
+  max_retries=getattr(settings, "FRAME_UPLOAD_MAX_RETRIES", 3),
+)
+
+
+# Métricas del pipeline de obstáculos (exportadas en /intelligent-assistant/metrics/).
+STAGE_SECONDS = metrics.histogram('pathfinder_stage_seconds', "Duración de cada etapa del pipeline de obstáculos en segundos")
+ACTIVE_CONNECTIONS = metrics.gauge('pathfinder_active_connections', "Conexiones WebSocket de guía abiertas")
+CYCLES_IN_FLIGHT = metrics.gauge('pathfinder_cycles_in_flight', "Ciclos y frames del modo continuo en análisis")
+FRAMES_DROPPED = metrics.counter('pathfinder_frames_dropped_total', "Frames descartados sin analizar, por motivo")
+INSTRUCTIONS_SENT = metrics.counter('pathfinder_instructions_total', "Instrucciones enviadas, por nivel y origen")
+GEMINI_FAILURES = metrics.counter('pathfinder_gemini_failures_total', "Análisis de Gemini sin instrucción, por motivo")
+
+
+def pipeline_samples():
+  # Estado de los recursos compartidos del proceso en el momento de exportar.
+  samples = [
+    Sample('pathfinder_yolo_queue_depth', GAUGE, "Frames esperando lote de YOLO", {}, yolo_batcher.stats()['queued']),
+    Sample('pathfinder_yolo_batches_in_flight', GAUGE, "Lotes de YOLO en ejecución", {}, yolo_batcher.stats()['batches_in_flight']),
+    Sample('pathfinder_upload_queue_depth', GAUGE, "Frames esperando subida a S3", {}, frame_uploader.pending()),
+  ]
+  gateway = gemini_gateway.stats()
+  samples += [
+    Sample('pathfinder_gemini_in_flight', GAUGE, "Llamadas a Gemini en curso", {}, gateway['in_flight']),
+    Sample('pathfinder_gemini_pending', GAUGE, "Llamadas a Gemini en cola del gateway", {}, gateway['pending']),
+    Sample('pathfinder_gemini_rejected_total', COUNTER, "Llamadas rechazadas por el gateway", {}, gateway['rejected']),
+    Sample('pathfinder_gemini_breaker_open', GAUGE, "Workers con el circuit breaker abierto", {}, int(gateway['breaker'] != 'closed')),
+  ]
+  if scene_cache is not None:
+    stats = scene_cache.stats()
+    for result in ('user_hits', 'global_hits', 'misses'):
+      samples.append(Sample(
+        'pathfinder_scene_cache_lookups_total', COUNTER, "Consultas a la caché de escenas, por resultado",
+        {'result': result}, stats[result],
+      ))
+  return samples
+
+
+metrics.register_collector(pipeline_samples)
+
+# Muestreo 1 de cada N ciclos y frames del modo continuo (TRACE_PROFILE_EVERY).
+profiler = get_profiler()
+
+
+def stage(name):
+  # Span de una etapa del pipeline: se anida en el del ciclo y alimenta STAGE_SECONDS.
+  return span(name, STAGE_SECONDS, stage=name)
+
+
+async def run_blocking(func, *args, **kwargs):
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(AI_EXECUTOR, functools.partial(func, *args, **kwargs))
 
 
-class ObstacleConsumer(WebsocketConsumer):
-  def connect(self):
-    self.accept()
+class ObstacleConsumer(AsyncWebsocketConsumer):
+  async def connect(self):
+    # Todo lo que ocurra en esta conexión (y en las tareas que cree) lleva su ID en los logs.
+    self.connection_id = new_id()
+    bind(connection=self.connection_id)
+    await self.accept()
     self.frame_batch_buffer = []
-    self.is_gemini_processing = False
-    print("Cliente WebSocket conectado.")
+    user = self.scope.get('user')
+    self.user_key = user.pk if user and user.is_authenticated else self.channel_name
+    self.last_instruction = None
+    self.last_local_instruction = None
+    self.last_zone_signature = None
+    self.frame_gate = FrameChangeGate(
+      static_threshold=getattr(settings, "FRAME_GATE_STATIC_THRESHOLD", 3.0),
+      yolo_threshold=getattr(settings, "FRAME_GATE_YOLO_THRESHOLD", 10.0),
+      max_skips=getattr(settings, "FRAME_GATE_MAX_SKIPS", 5),
+    ) if getattr(settings, "FRAME_GATE_ENABLED", True) else None
+    self.tracker = ObjectTracker(
+      iou_threshold=getattr(settings, "TRACKER_IOU_THRESHOLD", 0.3),
+      max_centroid_distance=getattr(settings, "TRACKER_MAX_CENTROID_DISTANCE", 0.15),
+      max_age=getattr(settings, "TRACKER_MAX_AGE", 3.0),
+      approach_ttc=getattr(settings, "TRACKER_APPROACH_TTC", 4.0),
+    )
+    self.work_queue = asyncio.Queue(maxsize=getattr(settings, "OBSTACLE_WORK_QUEUE_SIZE", 1))
+    self.worker_task = asyncio.create_task(self.process_work_queue())
+    self.pending_uploads = set()
+    self.stream_slot = None
+    self.stream_tasks = []
+    ACTIVE_CONNECTIONS.inc()
+    logger.info("Cliente WebSocket conectado.", extra={'user': self.user_key})
+
+    # La primera conexión del proceso carga los modelos (salvo carga anticipada) sin bloquear el event loop.
+    try:
+      self.detector = await ai_models.aget(MODEL_YOLO)
+      self.gemini_model = await ai_models.aget(MODEL_GEMINI)
+    except Exception:
+      self.detector = self.gemini_model = None
+
+  async def disconnect(self, close_code):
+    worker_task = getattr(self, 'worker_task', None)
+    if worker_task:
+      worker_task.cancel()
+      ACTIVE_CONNECTIONS.dec()
+    for task in getattr(self, 'pending_uploads', ()):
+      task.cancel()
+    for task in getattr(self, 'stream_tasks', ()):
+      task.cancel()
+    logger.info("Cliente WebSocket desconectado.", extra={'close_code': close_code})
+
+  async def receive(self, text_data=None, bytes_data=None):
+    if not self.detector or not self.gemini_model:
+      await self.send_error_message("Los servicios de IA no están disponibles.")
+      return
 
-  def disconnect(self, close_code):
-    print("Cliente WebSocket desconectado.")
+    if bytes_data:
+      try:
+        header, image_bytes = parse_binary_frame(bytes_data)
+      except ValueError as e:
+        logger.warning("Mensaje binario inválido: %s", e)
+        FRAMES_DROPPED.inc(reason='invalid')
+        return
+      self.enqueue_frame(Frame(image_bytes, header.role, header.seq, header.timestamp))
+      return
 
-  def receive(self, text_data):
-    if not yolo_model or not gemini_model:
-      self.send_error_message("Los servicios de IA no están disponibles.")
+    if not text_data:
       return
 
     data = json.loads(text_data)
+    if data.get('mode') == MODE_CONTINUOUS:
+      await self.start_stream()
+      return
+
+    # Formato anterior: JSON con data URL en base64; el tercer frame es el de verificación.
     image_data = data.get('image')
     if not image_data:
       return
 
     try:
-      header, encoded = image_data.split(",", 1)
-      image_bytes = base64.b64decode(encoded)
-      np_arr = np.frombuffer(image_bytes, dtype=np.uint8)
-      image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+      with stage('base64_decode'):
+        header, encoded = image_data.split(",", 1)
+        image_bytes = base64.b64decode(encoded)
     except Exception as e:
-      print(f"❌ Error decodificando la imagen: {e}")
+      logger.warning("Error decodificando la imagen: %s", e)
+      FRAMES_DROPPED.inc(reason='invalid')
       return
 
-    self.frame_batch_buffer.append(image_bytes)
+    role = ROLE_VERIFICATION if len(self.frame_batch_buffer) >= 2 else ROLE_CONTEXT
+    self.enqueue_frame(Frame(image_bytes, role, timestamp=time.time() * 1000))
 
-    if len(self.frame_batch_buffer) >= 3 and not self.is_gemini_processing:
-      self.is_gemini_processing = True
+  def enqueue_frame(self, frame):
+    if frame.role == ROLE_STREAM:
+      if self.stream_slot is not None and self.stream_slot.put(frame):
+        FRAMES_DROPPED.inc(reason='superseded')
+      return
 
-      context_frames_bytes = self.frame_batch_buffer[:2]
-      verification_frame_bytes = self.frame_batch_buffer[2]
+    if frame.role == ROLE_CONTEXT:
+      self.frame_batch_buffer.append(frame)
+      del self.frame_batch_buffer[:-2]
+      return
 
-      self.frame_batch_buffer.clear()
+    context_frames = self.frame_batch_buffer[:]
+    self.frame_batch_buffer.clear()
 
-      threading.Thread(
-        target=self.process_frames_for_gemini,
-        args=(context_frames_bytes, verification_frame_bytes)
-      ).start()
+    # Gemini y S3 necesitan bytes; solo el frame de verificación se copia.
+    frame.data = bytes(frame.data)
+    try:
+      self.work_queue.put_nowait((context_frames, frame))
+    except asyncio.QueueFull:
+      logger.warning("Cola de análisis llena, se descarta el ciclo.")
+      FRAMES_DROPPED.inc(reason='queue_full')
+
+  async def process_work_queue(self):
+    while True:
+      context_frames, verification_frame = await self.work_queue.get()
+      CYCLES_IN_FLIGHT.inc()
+      try:
+        with correlation(cycle=new_id()), profiler.profile('cycle'), stage('cycle'):
+          await self.process_frames_for_gemini(context_frames, verification_frame)
+      except Exception:
+        logger.exception("Error procesando el ciclo.")
+      finally:
+        CYCLES_IN_FLIGHT.dec()
+        self.work_queue.task_done()
+
+  async def process_frames_for_gemini(self, context_frames, verification_frame):
+    decision = GATE_FULL
+    if self.frame_gate is not None:
+      with stage('gate'):
+        thumbnail = await run_blocking(verification_frame.thumbnail)
+        decision = self.frame_gate.decide(thumbnail)
+      if decision == GATE_REEMIT and self.last_instruction:
+        logger.debug("Escena estática, se repite la última instrucción.")
+        await self.send_instruction(self.last_instruction, verification_frame, cached=True)
+        return
+
+    yolo_context_data = await asyncio.gather(
+      *(self.detect_objects(frame) for frame in context_frames)
+    )
+    zones = zone_signature(yolo_context_data)
+    attention = self.track_objects(context_frames, yolo_context_data)
 
-  def process_frames_for_gemini(self, context_frames_bytes, verification_frame_bytes):
-    yolo_context_data = []
-    for frame_bytes in context_frames_bytes:
-        np_arr = np.frombuffer(frame_bytes, dtype=np.uint8)
-        image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        
-        results = yolo_model(image, verbose=False)
-        frame_height, frame_width, _ = image.shape
-        yolo_detections = self.process_yolo_results(results, frame_width, frame_height)
-        yolo_context_data.append(yolo_detections)
+    if decision == GATE_YOLO and zones == self.last_zone_signature and not attention and self.last_instruction:
+      logger.debug("Mismos objetos por zona y ninguno nuevo ni acercándose, se repite la última instrucción.")
+      await self.send_instruction(self.last_instruction, verification_frame, cached=True)
+      return
 
-    yolo_context_text = self.format_yolo_context(yolo_context_data)
-    
-    self.get_gemini_analysis(verification_frame_bytes, yolo_context_text)
+    with stage('context_format'):
+      yolo_context_text = self.format_yolo_context(yolo_context_data)
+
+    instruction = None
+    scene = None
+    if scene_cache is not None:
+      with stage('scene_cache'):
+        phash = await run_blocking(verification_frame.phash)
+        scene = (zones, phash)
+        instruction = scene_cache.get(self.user_key, *scene)
+      if instruction is not None:
+        logger.debug("Escena sin cambios, instrucción en caché.", extra={'instruction': instruction})
+        await self.send_instruction(instruction, verification_frame, cached=True)
+
+    if instruction is None:
+      if LOCAL_TIER_ENABLED and yolo_context_data:
+        await self.send_local_instruction(yolo_context_data[-1], verification_frame)
+      instruction = await self.get_gemini_analysis(verification_frame, yolo_context_text, scene)
+
+    if instruction is not None:
+      self.last_zone_signature = zones
+      if self.frame_gate is not None:
+        self.frame_gate.commit(verification_frame.thumbnail())
+
+  async def start_stream(self):
+    """
+    Modo continuo: el cliente envía frames a `STREAM_TARGET_FPS` sin esperar
+    respuesta. Solo se procesa el frame más reciente (los anteriores se
+    descartan) y Gemini se consulta cuando cambia el estado de peligro, con
+    un refresco periódico para lo que YOLO no ve (escaleras, desniveles).
+    """
+    if self.stream_slot is None:
+      self.stream_slot = LatestFrameSlot()
+      self.analysis_slot = LatestFrameSlot()
+      self.stream_stats = StreamStats()
+      self.hazard_monitor = HazardMonitor(confirm_frames=getattr(settings, "STREAM_HAZARD_CONFIRM_FRAMES", 2))
+      self.stream_context = deque(maxlen=2)
+      self.last_stream_analysis = time.monotonic()
+      self.stream_controller = AdaptiveStreamController(
+        levels=getattr(settings, "STREAM_CONTROL_LEVELS", ((320, 50), (480, 60), (640, 70), (960, 75), (1280, 80))),
+        start_level=getattr(settings, "STREAM_CONTROL_START_LEVEL", 2),
+        start_interval_ms=1000 / STREAM_TARGET_FPS,
+        min_interval_ms=getattr(settings, "STREAM_CONTROL_MIN_INTERVAL_MS", 100),
+        max_interval_ms=getattr(settings, "STREAM_CONTROL_MAX_INTERVAL_MS", 2000),
+        target_latency_ms=getattr(settings, "STREAM_CONTROL_TARGET_LATENCY_MS", 150),
+        max_queue_depth=getattr(settings, "STREAM_CONTROL_MAX_QUEUE_DEPTH", 8),
+      ) if STREAM_CONTROL_ENABLED else None
+      self.last_control_update = time.monotonic()
+      self.stream_tasks = [
+        asyncio.create_task(self.process_stream()),
+        asyncio.create_task(self.process_stream_analysis()),
+      ]
+      logger.info("Modo continuo activado.")
+
+    await self.send(text_data=json.dumps({'stream': {
+      'fps': STREAM_TARGET_FPS,
+      'frame_interval_ms': round(1000 / STREAM_TARGET_FPS),
+    }}))
+    if self.stream_controller is not None:
+      await self.send_control(self.stream_controller.targets())
+
+  async def process_stream(self):
+    while True:
+      frame, received_at = await self.stream_slot.get()
+      processing = stage('stream_frame')
+      CYCLES_IN_FLIGHT.inc()
+      try:
+        with correlation(frame=frame.seq if frame.seq is not None else new_id()), \
+            profiler.profile('stream_frame'), processing:
+          await self.process_stream_frame(frame)
+      except Exception:
+        logger.exception("Error procesando frame del modo continuo.")
+      finally:
+        CYCLES_IN_FLIGHT.dec()
+      queue_seconds = processing.started - received_at
+      STAGE_SECONDS.observe(queue_seconds, stage='stream_wait')
+
+      self.stream_stats.record(queue_seconds, queue_seconds + processing.seconds)
+      await self.send_stream_ack(frame, queue_seconds, queue_seconds + processing.seconds)
+      if self.stream_controller is not None:
+        self.stream_controller.observe(processing.seconds)
+        await self.adjust_stream()
+      if self.stream_stats.processed % STREAM_STATS_INTERVAL == 0:
+        logger.info("Estadísticas del modo continuo.", extra=self.stream_stats.summary(self.stream_slot))
+
+  async def process_stream_frame(self, frame):
+    objects = await self.detect_objects(frame)
+    update = self.tracker.update(objects, frame.timestamp / 1000)
+    state = hazard_state(
+      objects,
+      self.tracker.approaching(update),
+      min_area=getattr(settings, "LOCAL_TIER_MIN_AREA", 0.02),
+      near_area=getattr(settings, "LOCAL_TIER_NEAR_AREA", 0.25),
+      near_bottom=getattr(settings, "LOCAL_TIER_NEAR_BOTTOM", 0.9),
+    )
+    # Igual que en el modo por ciclos, Gemini recibe las detecciones de los frames anteriores.
+    context = list(self.stream_context)
+    self.stream_context.append(objects)
+
+    if self.hazard_monitor.update(state):
+      logger.info("Cambio en el estado de peligro.", extra={'hazards': state})
+      if LOCAL_TIER_ENABLED:
+        await self.send_local_instruction(objects, frame)
+      self.request_stream_analysis(frame, context)
+      return
 
+    if time.monotonic() - self.last_stream_analysis < STREAM_GEMINI_INTERVAL:
+      return
+
+    decision = GATE_FULL
+    if self.frame_gate is not None:
+      with stage('gate'):
+        decision = self.frame_gate.decide(await run_blocking(frame.thumbnail))
+    if decision == GATE_FULL:
+      self.request_stream_analysis(frame, context)
+    else:
+      self.last_stream_analysis = time.monotonic()
+
+  async def adjust_stream(self):
+    # Una vez por ventana: latencia de detección de esta conexión y cola de YOLO de todo el proceso.
+    now = time.monotonic()
+    if now - self.last_control_update < STREAM_CONTROL_INTERVAL:
+      return
+    self.last_control_update = now
+
+    queue_depth = yolo_batcher.stats()['queued']
+    targets = self.stream_controller.update(queue_depth)
+    if targets is not None:
+      logger.info("Nuevos objetivos de envío.", extra={
+        **targets, 'detection_ms': round(self.stream_controller.latency_ms), 'yolo_queue': queue_depth,
+      })
+      await self.send_control(targets)
+
+  async def send_control(self, targets):
+    # Canal de control: el cliente ajusta resolución, calidad JPEG e intervalo entre frames.
+    await self.send(text_data=json.dumps({'control': targets}))
+
+  def request_stream_analysis(self, frame, context):
+    # Si Gemini sigue ocupado con un frame anterior, el pendiente se sustituye por este.
+    frame.data = bytes(frame.data)
+    self.last_stream_analysis = time.monotonic()
+    self.analysis_slot.put((frame, context))
+
+  async def process_stream_analysis(self):
+    while True:
+      (frame, context), _ = await self.analysis_slot.get()
+      try:
+        with correlation(frame=frame.seq if frame.seq is not None else new_id()):
+          await self.analyze_stream_frame(frame, context)
+      except Exception:
+        logger.exception("Error en el análisis del modo continuo.")
+
+  async def analyze_stream_frame(self, frame, context):
+    zones = zone_signature(context)
+    instruction = None
+    scene = None
+    if scene_cache is not None:
+      with stage('scene_cache'):
+        phash = await run_blocking(frame.phash)
+        scene = (zones, phash)
+        instruction = scene_cache.get(self.user_key, *scene)
+      if instruction is not None and instruction != self.last_instruction:
+        logger.debug("Escena sin cambios, instrucción en caché.", extra={'instruction': instruction})
+        await self.send_instruction(instruction, frame, cached=True)
+
+    if instruction is None:
+      with stage('context_format'):
+        yolo_context_text = self.format_yolo_context(context)
+      instruction = await self.get_gemini_analysis(frame, yolo_context_text, scene)
+
+    if instruction is not None and self.frame_gate is not None:
+      self.frame_gate.commit(frame.thumbnail())
+
+  async def send_stream_ack(self, frame, queue_seconds, total_seconds):
+    # Por cada frame procesado: descartes acumulados y latencia en el servidor (llegada -> fin de YOLO).
+    # El cliente completa la latencia extremo a extremo con la hora de captura del mismo `seq`.
+    payload = {
+      'stream_ack': True,
+      'received': self.stream_slot.received,
+      'dropped': self.stream_slot.dropped,
+      'latency': {'queue_ms': round(1000 * queue_seconds, 1), 'server_ms': round(1000 * total_seconds, 1)},
+    }
+    if frame.seq is not None:
+      payload['seq'] = frame.seq
+    await self.send(text_data=json.dumps(payload))
+
+  def track_objects(self, frames, objects_list):
+    # Devuelve cuántos objetos son nuevos o se acercan (TTC bajo) en los frames de contexto.
+    attention = 0
+    for frame, objects in zip(frames, objects_list):
+      update = self.tracker.update(objects, frame.timestamp / 1000)
+      attention += int((update.new | self.tracker.approaching(update)).sum())
+    return attention
+
+  async def detect_objects(self, frame):
+    with stage('imdecode'):
+      image = await run_blocking(frame.image, FRAME_DECODE_MAX_SIDE)
+    with stage('yolo'):
+      detections = await yolo_batcher.infer(image)
+    frame_height, frame_width, _ = image.shape
+    return self.process_yolo_results(detections, frame_width, frame_height)
 
   def format_yolo_context(self, yolo_data_list):
-    context_parts = []
-    for i, detections in enumerate(yolo_data_list, 1):
-      if not detections['objects']:
-        context_parts.append(f"Contexto Frame {i}: No se detectaron objetos.")
-      else:
-        objects_by_zone = {'izquierda': [], 'centro': [], 'derecha': []}
-        for obj in detections['objects']:
-          if obj['zone'] in objects_by_zone:
-            objects_by_zone[obj['zone']].append(obj['label'])
-        
-        desc = f"Contexto Frame {i}: "
-        zone_descs = []
-        for zone, labels in objects_by_zone.items():
-          if labels:
-            zone_descs.append(f"en la {zone} hay {', '.join(set(labels))}")
-        
-        if not zone_descs:
-            desc += "sin objetos claros en las zonas."
-        else:
-            desc += "; ".join(zone_descs) + "."
-        context_parts.append(desc)
-    
-    return "\n".join(context_parts)
+    return compact_yolo_context(yolo_data_list, self.detector.names)
+
+  async def get_gemini_analysis(self, frame, yolo_context, scene=None):
+    image_bytes = frame.data
+    logger.debug("Disparando análisis con Gemini.", extra={'yolo_context': yolo_context})
 
-  def get_gemini_analysis(self, image_bytes, yolo_context):
-    print(f"\n{'=' * 60}\n🔮 Disparando análisis con Gemini...\nContexto YOLO:\n{yolo_context}\n{'=' * 60}")
+    # La subida corre en segundo plano; la URL se envía en un mensaje posterior.
+    upload = frame_uploader.submit(image_bytes)
+    upload_started = time.perf_counter()
 
     try:
-      s3_url = None
-      try:
-        s3_url = upload_frame_to_s3(image_bytes)
-        print(f"📤 Frame de verificación en S3: {s3_url}")
-      except Exception as e:
-        print(f"⚠️ No se pudo subir frame a S3: {e}")
-
-      image_part = {"mime_type": "image/jpeg", "data": image_bytes}
-      prompt = f"""
-            Eres un asistente de guía para una persona con discapacidad visual. Tu única función es dar una instrucción de navegación corta, clara y directa.
-
-            **Información Recibida:**
-            1.  **Contexto de YOLO:** Objetos detectados en 2 frames anteriores. Úsalo para entender la escena que conduce a este momento.
-            2.  **Fotograma Actual:** La imagen que el usuario ve ahora mismo. Tu instrucción DEBE basarse en esta imagen, usando el contexto solo como referencia.
-
-            **Contexto YOLO (Frames Anteriores):**
-            {yolo_context}
-
-            **REGLAS OBLIGATORIAS:**
-            1.  **Formato Estricto:** Tu respuesta DEBE ser `Instrucción, [contexto breve]`. Sin excepciones.
-            2.  **Brevedad:** La respuesta completa no debe superar las 10 palabras.
-            3.  **Directo al Punto:** No saludes, no expliques, no uses frases como "Basado en el análisis". Responde ÚNICAMENTE con la instrucción.
-            4.  **Prioriza la Seguridad:** La instrucción debe advertir sobre el peligro más inmediato y relevante en el **Fotograma Actual**.
-
-            **Ejemplos de Respuestas CORRECTAS:**
-            *   Gire a la derecha, pared al frente.
-            *   Gire a la izquierda, silla en centro.
-            *   Cuidado con el altillo.
-            *   Cuidado con las escaleras, suba con cuidado.
-            *   Cuidado con la persona del centro.
-            *   Cuidado puerta cerrada al frente, la manija está del lado izquierdo.
-            *   Avance con cuidado, desnivel en el suelo.
-            *   Alerta, posible hueco a la derecha.
-
-            **Situaciones de URGENCIA (Máxima Prioridad):**
-            - **Obstáculo Total (pared, puerta, objeto grande):** Si el **Fotograma Actual** muestra un bloqueo total, indica una vía de escape. Ejemplo: "Gire a la derecha, pared al frente".
-            - **Peligros Graves (escaleras, huecos, desniveles, ascensores):** Tu instrucción debe centrarse en ese peligro específico. Ejemplo: "Cuidado con las escaleras, suba con cuidado".
-
-            Analiza el **Fotograma Actual** para confirmar el peligro real y da la instrucción más segura para este preciso momento.
-
-            **INSTRUCCIÓN:**
-            """
-
-      response = gemini_model.generate_content(
-        [prompt, image_part],
-        request_options={"timeout": 15} 
-      )
-
-      if response and response.text:
-        gemini_instruction = response.text.strip().replace('*', '').replace('\n', ' ')
-        print(f"✅ Instrucción de Gemini: '{gemini_instruction}'")
-
-        payload = {
-          'instruction': gemini_instruction,
-          'from_gemini': True, 
-        }
-        if s3_url:
-          payload['frame_s3_url'] = s3_url
-
-        self.send(text_data=json.dumps(payload))
-      else:
-        print("⚠️ Gemini no devolvió una respuesta válida.")
-        self.send_error_message("Análisis no disponible.")
+      contents = navigation_contents(yolo_context, image_bytes)
 
-    except Exception as e:
-      print(f"❌ Error en la llamada a Gemini: {e}")
-      self.send_error_message("Error en el análisis. Reintentando.")
+      with stage('gemini') as call:
+        if GEMINI_STREAMING:
+          gemini_instruction, first_chunk_seconds = await self.stream_gemini_instruction(contents, frame)
+        else:
+          response = await asyncio.wrap_future(gemini_gateway.submit(
+            self.gemini_model.generate_content,
+            contents,
+            request_options={"timeout": GEMINI_TIMEOUT},
+            priority=PRIORITY_NAVIGATION,
+          ))
+          gemini_instruction = response.text if response else None
+          first_chunk_seconds = None
+      total_seconds = call.seconds
+      if first_chunk_seconds is not None:
+        STAGE_SECONDS.observe(first_chunk_seconds, stage='gemini_first_chunk')
+
+      if gemini_instruction:
+        gemini_instruction = gemini_instruction.strip().replace('*', '').replace('\n', ' ')
+        latency = {'total_ms': round(1000 * total_seconds)}
+        if first_chunk_seconds is not None:
+          latency['ttft_ms'] = round(1000 * first_chunk_seconds)
+        logger.info("Instrucción de Gemini.", extra={'instruction': gemini_instruction, **latency})
+
+        if scene is not None:
+          scene_cache.record_miss_latency(total_seconds)
+          scene_cache.put(self.user_key, *scene, gemini_instruction)
+
+        await self.send_instruction(gemini_instruction, frame, latency=latency)
+        return gemini_instruction
+      else:
+        logger.warning("Gemini no devolvió una respuesta válida.")
+        GEMINI_FAILURES.inc(reason='empty')
+        await self.send_error_message("Análisis no disponible.")
+
+    except GeminiUnavailable as e:
+      # Gateway saturado o circuit breaker abierto: se falla rápido sin esperar a la API.
+      logger.warning("Gemini no disponible: %s", e)
+      GEMINI_FAILURES.inc(reason='unavailable')
+      await self.send_error_message("Análisis no disponible por el momento.")
+    except Exception:
+      logger.exception("Error en la llamada a Gemini.")
+      GEMINI_FAILURES.inc(reason='error')
+      await self.send_error_message("Error en el análisis. Reintentando.")
     finally:
-      self.is_gemini_processing = False
-
-  def process_yolo_results(self, results, frame_width, frame_height):
-    zone_width = frame_width / 3
-    detections = {"objects": []}
-    for r in results:
-      for box in r.boxes:
-        x1, _, x2, _ = box.xyxy[0]
-        cls_id = int(box.cls[0])
-        label = yolo_model.names[cls_id]
-        cx = (x1 + x2) / 2
-        zone = "centro"
-        if cx < zone_width:
-          zone = "izquierda"
-        elif cx > 2 * zone_width:
-          zone = "derecha"
-        detections["objects"].append({"label": label, "zone": zone})
-    return detections
-
-  def send_error_message(self, message):
-    self.send(text_data=json.dumps({'instruction': message, 'error': True, 'from_gemini': True}))
\ No newline at end of file
+      task = asyncio.create_task(self.send_frame_url(upload, frame, upload_started))
+      self.pending_uploads.add(task)
+      task.add_done_callback(self.pending_uploads.discard)
+
+  async def stream_gemini_instruction(self, contents, frame):
+    # Cada fragmento se envía en cuanto llega para que el cliente empiece a hablar antes.
+    started = time.perf_counter()
+    first_chunk_seconds = None
+    parts = []
+    async for text in stream_text(self.gemini_model, contents, gemini_gateway, timeout=GEMINI_TIMEOUT):
+      if first_chunk_seconds is None:
+        first_chunk_seconds = time.perf_counter() - started
+      text = text.replace('*', '').replace('\n', ' ')
+      parts.append(text)
+
+      payload = {'instruction_chunk': text, 'partial': True, 'tier': TIER_GEMINI}
+      if frame.seq is not None:
+        payload['seq'] = frame.seq
+      await self.send(text_data=json.dumps(payload))
+
+    return ''.join(parts), first_chunk_seconds
+
+  async def send_frame_url(self, upload, frame, started):
+    try:
+      s3_url = await asyncio.wrap_future(upload)
+    except Exception as e:
+      logger.warning("No se pudo subir frame a S3: %s", e)
+      FRAMES_DROPPED.inc(reason='upload_failed')
+      return
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage='s3_upload')
+
+    logger.debug("Frame de verificación en S3.", extra={'url': s3_url})
+    payload = {'frame_s3_url': s3_url}
+    if frame.seq is not None:
+      payload['seq'] = frame.seq
+    await self.send(text_data=json.dumps(payload))
+
+  def process_yolo_results(self, detections, frame_width, frame_height):
+    return assign_zones(detections, frame_width, frame_height)
+
+  async def send_local_instruction(self, objects, frame):
+    # Aviso inmediato con las detecciones del frame más reciente; Gemini lo confirma o corrige después.
+    instruction = local_instruction(
+      objects,
+      self.detector.names,
+      min_area=getattr(settings, "LOCAL_TIER_MIN_AREA", 0.02),
+      near_area=getattr(settings, "LOCAL_TIER_NEAR_AREA", 0.25),
+      near_bottom=getattr(settings, "LOCAL_TIER_NEAR_BOTTOM", 0.9),
+    )
+    if instruction is None or instruction == self.last_local_instruction:
+      return
+    self.last_local_instruction = instruction
+    INSTRUCTIONS_SENT.inc(tier=TIER_LOCAL, cached='false')
+
+    payload = {
+      'instruction': instruction,
+      'tier': TIER_LOCAL,
+      'provisional': True,
+    }
+    if frame.seq is not None:
+      payload['seq'] = frame.seq
+    await self.send(text_data=json.dumps(payload))
+
+  async def send_instruction(self, instruction, frame, cached=False, latency=None):
+    self.last_instruction = instruction
+    INSTRUCTIONS_SENT.inc(tier=TIER_GEMINI, cached='true' if cached else 'false')
+    payload = {
+      'instruction': instruction,
+      'from_gemini': True,
+      'final': True,
+      'tier': TIER_GEMINI,
+    }
+    if cached:
+      payload['cached'] = True
+    if latency:
+      payload['latency'] = latency
+    if frame.seq is not None:
+      payload['seq'] = frame.seq
+
+    await self.send(text_data=json.dumps(payload))
+
+  async def send_error_message(self, message):
+    await self.send(text_data=json.dumps({'instruction': message, 'error': True, 'from_gemini': True}))
\ No newline at end of file
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Nombres en español de las clases COCO más habituales en interiores y en la calle.
+SPANISH_LABELS = {
+  'person': 'persona',
+  'bicycle': 'bicicleta',
+  'car': 'auto',
+  'motorcycle': 'moto',
+  'bus': 'bus',
+  'truck': 'camión',
+  'traffic light': 'semáforo',
+  'fire hydrant': 'hidrante',
+  'stop sign': 'señal de pare',
+  'bench': 'banco',
+  'dog': 'perro',
+  'cat': 'gato',
+  'backpack': 'mochila',
+  'suitcase': 'maleta',
+  'bottle': 'botella',
+  'chair': 'silla',
+  'couch': 'sofá',
+  'potted plant': 'maceta',
+  'bed': 'cama',
+  'dining table': 'mesa',
+  'toilet': 'inodoro',
+  'tv': 'televisor',
+  'laptop': 'computadora',
+  'refrigerator': 'refrigeradora',
+  'sink': 'lavabo',
+  'oven': 'horno',
+}
+
+ZONE_PHRASES = ('a la izquierda', 'en el centro', 'a la derecha')
+CENTER_ZONE = 1
+
+
+def proximity(objects, min_area=0.02, near_area=0.25, near_bottom=0.9):
+  # Área normalizada de cada caja, si es relevante por tamaño y si está cerca.
+  area = (objects['x2'] - objects['x1']) * (objects['y2'] - objects['y1'])
+  relevant = area >= min_area
+  near = relevant & ((area >= near_area) | (objects['y2'] >= near_bottom))
+  return area, relevant, near
+
+
+def hazard_state(objects, approaching, min_area=0.02, near_area=0.25, near_bottom=0.9):
+  """
+  Resumen de peligros de un frame: (clase, zona, nivel) de cada objeto
+  relevante, con nivel 0 = presente, 1 = cerca y 2 = se acerca según el
+  tracker. Dos frames con el mismo estado no necesitan una nueva instrucción.
+  """
+  if not len(objects):
+    return ()
+
+  _, relevant, near = proximity(objects, min_area, near_area, near_bottom)
+  level = np.where(approaching, 2, near.astype(np.int8))
+  return tuple(sorted(set(zip(
+    objects['cls'][relevant].tolist(), objects['zone'][relevant].tolist(), level[relevant].tolist(),
+  ))))
+
+
+def local_instruction(objects, names, min_area=0.02, near_area=0.25, near_bottom=0.9):
+  """
+  Instrucción provisional a partir de las detecciones de YOLO, sin llamar a
+  Gemini. El tamaño de la caja y su borde inferior sirven de aproximación a
+  la distancia: una caja grande o que toca el borde inferior está cerca.
+  Devuelve None si no hay ningún objeto relevante.
+  """
+  if not len(objects):
+    return None
+
+  area, relevant, near = proximity(objects, min_area, near_area, near_bottom)
+  if not relevant.any():
+    return None
+
+  center = objects['zone'] == CENTER_ZONE
+  # Prioridad: cercanía, después zona central y, por último, tamaño.
+  score = np.where(relevant, area + center + 2 * near, -1.0)
+  best = int(np.argmax(score))
+
+  name = names[int(objects['cls'][best])]
+  label = SPANISH_LABELS.get(name, 'obstáculo')
+  zone = ZONE_PHRASES[int(objects['zone'][best])]
+  if near[best]:
+    return f"Cuidado, {label} muy cerca {zone}"
+  return f"{label.capitalize()} {zone}"
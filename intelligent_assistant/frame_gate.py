@@ -0,0 +1,50 @@
+GATE_FULL = 'full'
+GATE_YOLO = 'yolo'
+GATE_REEMIT = 'reemit'
+
+
+def frame_difference(a, b):
+  import cv2
+
+  if a.shape != b.shape:
+    return float('inf')
+  # Diferencia absoluta media en niveles de gris (0-255).
+  return cv2.norm(a, b, cv2.NORM_L1) / a.size
+
+
+class FrameChangeGate:
+  """
+  Detector de cambios barato que se ejecuta antes de la inferencia. Compara
+  la miniatura en gris del frame de verificación con la del último ciclo
+  analizado por completo:
+
+  - diferencia < `static_threshold`: se repite la última instrucción.
+  - diferencia < `yolo_threshold`: solo se vuelve a ejecutar YOLO.
+  - en otro caso, o tras `max_skips` ciclos omitidos: pipeline completo.
+  """
+
+  def __init__(self, static_threshold=3.0, yolo_threshold=10.0, max_skips=5):
+    self.static_threshold = static_threshold
+    self.yolo_threshold = yolo_threshold
+    self.max_skips = max_skips
+    self._reference = None
+    self._skips = 0
+
+  def decide(self, thumbnail):
+    if self._reference is None or self._skips >= self.max_skips:
+      return GATE_FULL
+
+    difference = frame_difference(self._reference, thumbnail)
+    if difference < self.static_threshold:
+      decision = GATE_REEMIT
+    elif difference < self.yolo_threshold:
+      decision = GATE_YOLO
+    else:
+      return GATE_FULL
+
+    self._skips += 1
+    return decision
+
+  def commit(self, thumbnail):
+    self._reference = thumbnail
+    self._skips = 0
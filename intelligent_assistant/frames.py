@@ -0,0 +1,138 @@
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# OpenCV se importa en las funciones que lo usan: `manage.py check` y el arranque
+# de la aplicación ASGI no lo cargan hasta que llega el primer frame.
+
+# Mensaje binario del WebSocket: cabecera fija (little-endian) seguida del JPEG.
+#   versión (uint8) | rol (uint8) | secuencia (uint32) | timestamp del cliente en ms (float64)
+FRAME_PROTOCOL_VERSION = 1
+FRAME_HEADER = struct.Struct('<BBId')
+
+ROLE_CONTEXT = 0
+ROLE_VERIFICATION = 1
+# Modo continuo: cada frame es independiente y solo se analiza el más reciente.
+ROLE_STREAM = 2
+FRAME_ROLES = (ROLE_CONTEXT, ROLE_VERIFICATION, ROLE_STREAM)
+
+FrameHeader = namedtuple('FrameHeader', ['version', 'role', 'seq', 'timestamp'])
+
+# Marcadores SOF (Start Of Frame) de JPEG que contienen alto y ancho.
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def parse_binary_frame(bytes_data):
+  if len(bytes_data) <= FRAME_HEADER.size:
+    raise ValueError("Mensaje binario sin imagen.")
+
+  header = FrameHeader(*FRAME_HEADER.unpack_from(bytes_data))
+  if header.version != FRAME_PROTOCOL_VERSION:
+    raise ValueError(f"Versión de protocolo no soportada: {header.version}")
+  if header.role not in FRAME_ROLES:
+    raise ValueError(f"Rol de frame desconocido: {header.role}")
+
+  # Vista sobre el mismo buffer: el JPEG no se copia.
+  return header, memoryview(bytes_data)[FRAME_HEADER.size:]
+
+
+def decode_frame(frame_bytes, flags=None):
+  import cv2
+
+  np_arr = np.frombuffer(frame_bytes, dtype=np.uint8)
+  image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR if flags is None else flags)
+  if image is None:
+    raise ValueError("No se pudo decodificar el frame.")
+  return image
+
+
+def jpeg_size(frame_bytes):
+  view = memoryview(frame_bytes)
+  if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+    return None
+
+  i = 2
+  while i + 9 < len(view):
+    if view[i] != 0xFF:
+      return None
+    marker = view[i + 1]
+    if marker == 0xFF:
+      i += 1
+      continue
+    if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+      i += 2
+      continue
+    if marker in _JPEG_SOF_MARKERS:
+      height, width = struct.unpack_from('>HH', view, i + 5)
+      return width, height
+    (length,) = struct.unpack_from('>H', view, i + 2)
+    i += 2 + length
+  return None
+
+
+def reduced_decode_flag(size, max_side):
+  import cv2
+
+  if not max_side or size is None:
+    return cv2.IMREAD_COLOR
+
+  # libjpeg puede decodificar directamente a 1/2, 1/4 y 1/8 de la resolución.
+  long_side = max(size)
+  reduced_flags = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+  )
+  for factor, flag in reduced_flags:
+    if long_side / factor >= max_side:
+      return flag
+  return cv2.IMREAD_COLOR
+
+
+class Frame:
+  """
+  Frame JPEG recibido por el WebSocket. Se decodifica una sola vez, bajo
+  demanda, y la imagen queda en caché. Con `max_side` se usa la reducción
+  nativa de libjpeg para no decodificar más píxeles de los que necesita el
+  modelo (p. ej. 1280x720 -> 640x360 con max_side=640).
+  """
+
+  __slots__ = ('data', 'role', 'seq', 'timestamp', '_image', '_thumbnail')
+
+  def __init__(self, data, role=ROLE_CONTEXT, seq=None, timestamp=None):
+    self.data = data
+    self.role = role
+    self.seq = seq
+    self.timestamp = timestamp
+    self._image = None
+    self._thumbnail = None
+
+  def image(self, max_side=None):
+    if self._image is None:
+      flag = reduced_decode_flag(jpeg_size(self.data), max_side)
+      self._image = decode_frame(self.data, flag)
+    return self._image
+
+  def thumbnail(self):
+    # Escala de grises a 1/8 de resolución, decodificada directamente por libjpeg.
+    if self._thumbnail is None:
+      import cv2
+
+      self._thumbnail = decode_frame(self.data, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    return self._thumbnail
+
+  def phash(self):
+    return perceptual_hash(self.thumbnail())
+
+
+def perceptual_hash(gray):
+  # dHash de 64 bits: compara cada píxel con su vecino derecho en una imagen de 9x8.
+  import cv2
+
+  small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+  bits = (small[:, 1:] > small[:, :-1]).flatten()
+  return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hash_distance(a, b):
+  return (a ^ b).bit_count()
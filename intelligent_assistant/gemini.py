@@ -0,0 +1,413 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+from .inference import ZONES, zone_labels
+
+logger = logging.getLogger(__name__)
+
+NAVIGATION_MODEL = 'gemini-flash-lite-latest'
+TEXT_READER_MODEL = 'gemini-2.5-flash'
+
+# Menor valor = mayor prioridad: la navegación se adelanta al lector de texto.
+PRIORITY_NAVIGATION = 0
+PRIORITY_TEXT_READER = 1
+
+# Reglas fijas del asistente de navegación. Se envían como system instruction
+# del modelo una sola vez; cada llamada solo lleva el contexto YOLO y la imagen.
+NAVIGATION_SYSTEM_INSTRUCTION = """
+Eres un asistente de guía para una persona con discapacidad visual. Tu única función es dar una instrucción de navegación corta, clara y directa.
+
+**Información Recibida en cada mensaje:**
+1.  **Contexto YOLO:** Objetos detectados en los frames anteriores, una línea por frame con el formato `F<n> I:<objetos> C:<objetos> D:<objetos>` (I = izquierda, C = centro, D = derecha, `-` = nada detectado). Úsalo para entender la escena que conduce a este momento.
+2.  **Fotograma Actual:** La imagen que el usuario ve ahora mismo. Tu instrucción DEBE basarse en esta imagen, usando el contexto solo como referencia.
+
+**REGLAS OBLIGATORIAS:**
+1.  **Formato Estricto:** Tu respuesta DEBE ser `Instrucción, [contexto breve]`. Sin excepciones.
+2.  **Brevedad:** La respuesta completa no debe superar las 10 palabras.
+3.  **Directo al Punto:** No saludes, no expliques, no uses frases como "Basado en el análisis". Responde ÚNICAMENTE con la instrucción.
+4.  **Prioriza la Seguridad:** La instrucción debe advertir sobre el peligro más inmediato y relevante en el **Fotograma Actual**.
+
+**Ejemplos de Respuestas CORRECTAS:**
+*   Gire a la derecha, pared al frente.
+*   Gire a la izquierda, silla en centro.
+*   Cuidado con el altillo.
+*   Cuidado con las escaleras, suba con cuidado.
+*   Cuidado con la persona del centro.
+*   Cuidado puerta cerrada al frente, la manija está del lado izquierdo.
+*   Avance con cuidado, desnivel en el suelo.
+*   Alerta, posible hueco a la derecha.
+
+**Situaciones de URGENCIA (Máxima Prioridad):**
+- **Obstáculo Total (pared, puerta, objeto grande):** Si el **Fotograma Actual** muestra un bloqueo total, indica una vía de escape. Ejemplo: "Gire a la derecha, pared al frente".
+- **Peligros Graves (escaleras, huecos, desniveles, ascensores):** Tu instrucción debe centrarse en ese peligro específico. Ejemplo: "Cuidado con las escaleras, suba con cuidado".
+
+Analiza el **Fotograma Actual** para confirmar el peligro real y da la instrucción más segura para este preciso momento.
+""".strip()
+
+TEXT_READER_PROMPT = (
+  "Analiza esta imagen. Tu tarea es responder de la manera más concisa posible. "
+  "Si la imagen contiene principalmente texto legible (como un cartel, un documento o una etiqueta), "
+  "extrae y devuelve ÚNICAMENTE el texto que ves, sin añadir ninguna palabra introductoria. "
+  "Si la imagen contiene símbolos, dibujos, objetos, personas o una escena, "
+  "describe brevemente lo que ves en la imagen, como si se lo explicaras a una persona ciega. "
+  "No incluyas formatos como markdown."
+)
+
+_ZONE_KEYS = {zone: zone[0].upper() for zone in ZONES}
+
+
+def compact_yolo_context(objects_list, names):
+  """
+  Contexto YOLO en el formato compacto descrito en la system instruction:
+  `F1 I:persona C:silla,mesa D:-`, una línea por frame.
+  """
+  lines = []
+  for i, objects in enumerate(objects_list, 1):
+    zones = zone_labels(objects, names)
+    lines.append(f"F{i} " + " ".join(f"{_ZONE_KEYS[zone]}:{','.join(labels) or '-'}" for zone, labels in zones.items()))
+  return "\n".join(lines)
+
+
+def navigation_contents(yolo_context, image_bytes):
+  return [f"Contexto YOLO:\n{yolo_context}", {"mime_type": "image/jpeg", "data": image_bytes}]
+
+
+class GeminiUnavailable(RuntimeError):
+  pass
+
+
+class TokenBucket:
+  def __init__(self, rate, burst):
+    self.rate = rate
+    self.capacity = burst
+    self.tokens = burst
+    self.updated = time.monotonic()
+
+  def delay(self, now):
+    # Segundos hasta que haya una ficha disponible (0 si ya la hay).
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+    return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+  def take(self):
+    self.tokens -= 1
+
+
+class CircuitBreaker:
+  """
+  Tras `failure_threshold` fallos seguidos del servicio (cuota, timeouts,
+  errores 5xx) se abre y rechaza llamadas durante `reset_timeout` segundos;
+  después deja pasar una única llamada de prueba que lo cierra o lo reabre.
+  """
+
+  CLOSED = 'closed'
+  OPEN = 'open'
+  HALF_OPEN = 'half_open'
+
+  def __init__(self, failure_threshold=5, reset_timeout=30):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.state = self.CLOSED
+    self.failures = 0
+    self.opened_at = 0.0
+    self._trial_in_flight = False
+
+  def is_open(self, now):
+    return self.state == self.OPEN and now - self.opened_at < self.reset_timeout
+
+  def allow(self, now):
+    if self.state == self.OPEN:
+      if self.is_open(now):
+        return False
+      self.state = self.HALF_OPEN
+      self._trial_in_flight = False
+    if self.state == self.HALF_OPEN:
+      if self._trial_in_flight:
+        return False
+      self._trial_in_flight = True
+    return True
+
+  def cancel_trial(self):
+    # La llamada autorizada por `allow` no llegó a ejecutarse: la siguiente puede hacer de prueba.
+    self._trial_in_flight = False
+
+  def record(self, degraded, now):
+    if not degraded:
+      self.state = self.CLOSED
+      self.failures = 0
+      return
+    self.failures += 1
+    if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+      self.state = self.OPEN
+      self.opened_at = now
+
+
+def is_degraded_error(error):
+  from google.api_core import exceptions
+
+  return isinstance(error, (
+    exceptions.TooManyRequests,
+    exceptions.ServerError,
+    exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError,
+  ))
+
+
+class GeminiGateway:
+  """
+  Punto de acceso único a Gemini para todo el proceso (navegación y lector
+  de texto). Las llamadas esperan en una cola con prioridad y se despachan
+  cuando hay hueco (`max_in_flight`) y ficha en el token bucket; si el
+  circuit breaker está abierto o la espera supera `max_wait`, fallan al
+  momento con GeminiUnavailable. Los modelos se crean una vez y comparten
+  el cliente del SDK.
+  """
+
+  def __init__(self, api_key=None, max_in_flight=8, rate_per_minute=600, burst=10, max_wait=10,
+               failure_threshold=5, reset_timeout=30, prewarm=False):
+    self.api_key = api_key
+    self.max_in_flight = max_in_flight
+    self.max_wait = max_wait
+    self.prewarm = prewarm
+    self.bucket = TokenBucket(rate_per_minute / 60, burst)
+    self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+    self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="gemini")
+    self._cond = threading.Condition()
+    self._pending = []
+    self._sequence = itertools.count()
+    self._in_flight = 0
+    self._dispatcher = None
+    self._models = {}
+    self._configured = False
+    self.rejected = 0
+
+  def configure(self):
+    import google.generativeai as genai
+
+    with self._cond:
+      if not self._configured:
+        genai.configure(api_key=self.api_key)
+        self._configured = True
+    return genai
+
+  def model(self, name, system_instruction=None):
+    genai = self.configure()
+    with self._cond:
+      key = (name, system_instruction)
+      model = self._models.get(key)
+      if model is None:
+        model = self._models[key] = genai.GenerativeModel(name, system_instruction=system_instruction)
+        if self.prewarm:
+          threading.Thread(target=self._warm, args=(model,), name="gemini-prewarm", daemon=True).start()
+      return model
+
+  def _warm(self, model):
+    # count_tokens no genera contenido pero abre la conexión del cliente compartido.
+    try:
+      model.count_tokens("ping")
+    except Exception:
+      pass
+
+  def submit(self, fn, *args, priority=PRIORITY_NAVIGATION, **kwargs):
+    future = Future()
+    with self._cond:
+      if self.breaker.is_open(time.monotonic()):
+        self.rejected += 1
+        future.set_exception(GeminiUnavailable("Gemini no está disponible temporalmente."))
+        return future
+      deadline = time.monotonic() + self.max_wait
+      heapq.heappush(self._pending, (priority, next(self._sequence), deadline, future, fn, args, kwargs))
+      self._ensure_started()
+      self._cond.notify()
+    return future
+
+  def stats(self):
+    with self._cond:
+      return {
+        'in_flight': self._in_flight,
+        'pending': len(self._pending),
+        'breaker': self.breaker.state,
+        'rejected': self.rejected,
+      }
+
+  def _ensure_started(self):
+    if self._dispatcher is None:
+      self._dispatcher = threading.Thread(target=self._dispatch, name="gemini-gateway", daemon=True)
+      self._dispatcher.start()
+
+  def _reject_pending(self, reason, expired_only=False, now=0.0):
+    kept = []
+    for job in self._pending:
+      if expired_only and job[2] > now:
+        kept.append(job)
+        continue
+      self.rejected += 1
+      job[3].set_exception(GeminiUnavailable(reason))
+    heapq.heapify(kept)
+    self._pending = kept
+
+  def _dispatch(self):
+    with self._cond:
+      while True:
+        now = time.monotonic()
+        self._reject_pending("Tiempo de espera agotado en la cola de Gemini.", expired_only=True, now=now)
+        if not self._pending or self._in_flight >= self.max_in_flight:
+          timeout = min(job[2] for job in self._pending) - now if self._pending else None
+          self._cond.wait(timeout)
+          continue
+
+        delay = self.bucket.delay(now)
+        if delay:
+          self._cond.wait(delay)
+          continue
+
+        if not self.breaker.allow(now):
+          self._reject_pending("Gemini no está disponible temporalmente.")
+          continue
+
+        _, _, _, future, fn, args, kwargs = heapq.heappop(self._pending)
+        if not future.set_running_or_notify_cancel():
+          # Cancelada en la cola (p. ej. el cliente se desconectó): si era la prueba del
+          # breaker semiabierto nunca llamaría a `record` y el circuito quedaría bloqueado.
+          self.breaker.cancel_trial()
+          continue
+        self.bucket.take()
+        self._in_flight += 1
+        self._executor.submit(self._run, future, fn, args, kwargs)
+
+  def _run(self, future, fn, args, kwargs):
+    degraded = False
+    try:
+      result = fn(*args, **kwargs)
+    except Exception as e:
+      degraded = is_degraded_error(e)
+      future.set_exception(e)
+    else:
+      future.set_result(result)
+    finally:
+      with self._cond:
+        self._in_flight -= 1
+        self.breaker.record(degraded, time.monotonic())
+        self._cond.notify()
+
+
+class ModelCatalog:
+  """
+  Modelos de la API con `generateContent`, consultados una vez al arrancar y
+  refrescados en segundo plano cada `refresh_interval` segundos, para que
+  ninguna petición pague `list_models()`.
+  """
+
+  def __init__(self, gateway, refresh_interval=3600):
+    self.gateway = gateway
+    self.refresh_interval = refresh_interval
+    self.models = frozenset()
+    self._missing = set()
+    self._thread = None
+    self._lock = threading.Lock()
+
+  def start(self):
+    with self._lock:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name="gemini-catalog", daemon=True)
+        self._thread.start()
+    return self
+
+  def _run(self):
+    while True:
+      try:
+        self.refresh()
+      except Exception as e:
+        logger.warning("No se pudo consultar el catálogo de modelos de Gemini: %s", e)
+      if not self.refresh_interval:
+        return
+      time.sleep(self.refresh_interval)
+
+  def refresh(self):
+    genai = self.gateway.configure()
+    models = frozenset(
+      model.name.removeprefix('models/')
+      for model in genai.list_models()
+      if 'generateContent' in model.supported_generation_methods
+    )
+    if models != self.models:
+      logger.info("Catálogo de Gemini: %d modelos con generateContent.", len(models))
+      self._missing = set()
+    self.models = models
+
+  def resolve(self, name):
+    # Siempre se usa el modelo configurado; si no está en el catálogo se avisa una vez por versión del catálogo.
+    if self.models and name not in self.models and name not in self._missing:
+      self._missing.add(name)
+      logger.warning("%s no aparece en el catálogo de modelos de Gemini; se usa igualmente.", name)
+    return name
+
+
+_gateway = None
+_catalog = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+  global _gateway
+  with _gateway_lock:
+    if _gateway is None:
+      _gateway = GeminiGateway(
+        api_key=settings.GEMINI_API_KEY,
+        max_in_flight=getattr(settings, "GEMINI_MAX_IN_FLIGHT", 8),
+        rate_per_minute=getattr(settings, "GEMINI_RATE_PER_MINUTE", 600),
+        burst=getattr(settings, "GEMINI_RATE_BURST", 10),
+        max_wait=getattr(settings, "GEMINI_MAX_WAIT", 10),
+        failure_threshold=getattr(settings, "GEMINI_BREAKER_FAILURES", 5),
+        reset_timeout=getattr(settings, "GEMINI_BREAKER_RESET", 30),
+        prewarm=getattr(settings, "GEMINI_PREWARM", True),
+      )
+    return _gateway
+
+
+def get_model_catalog():
+  global _catalog
+  gateway = get_gateway()
+  with _gateway_lock:
+    if _catalog is None:
+      _catalog = ModelCatalog(gateway, refresh_interval=getattr(settings, "GEMINI_CATALOG_REFRESH", 3600))
+    return _catalog
+
+
+async def stream_text(model, contents, gateway, timeout=15, priority=PRIORITY_NAVIGATION):
+  """
+  Generador asíncrono sobre `generate_content(..., stream=True)`. La
+  iteración del SDK es bloqueante, así que corre como una sola llamada del
+  gateway y cada fragmento de texto se entrega al event loop en cuanto llega.
+  """
+  loop = asyncio.get_running_loop()
+  chunks = asyncio.Queue()
+
+  def produce():
+    response = model.generate_content(contents, stream=True, request_options={"timeout": timeout})
+    for chunk in response:
+      try:
+        text = chunk.text
+      except ValueError:
+        # Fragmentos sin partes de texto (p. ej. solo finish_reason).
+        continue
+      if text:
+        loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+  producer = asyncio.wrap_future(gateway.submit(produce, priority=priority))
+  # El fin (o el rechazo del gateway) llega después de todos los fragmentos.
+  producer.add_done_callback(lambda _: chunks.put_nowait(None))
+  while True:
+    item = await chunks.get()
+    if item is None:
+      break
+    yield item
+  await producer
@@ -0,0 +1,23 @@
+import io
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+def normalize_image(source, max_edge=1600, quality=85):
+  """
+  Reduce una imagen subida a `max_edge` píxeles en su lado mayor y la
+  recodifica como JPEG. Se aplica la orientación EXIF (las fotos del móvil
+  suelen llegar giradas) y, en JPEG, `draft` hace que libjpeg decodifique ya
+  a 1/2, 1/4 o 1/8 de la resolución, sin cargar la imagen completa.
+  """
+  try:
+    with Image.open(source) as image:
+      image.draft('RGB', (max_edge, max_edge))
+      image = ImageOps.exif_transpose(image).convert('RGB')
+  except (UnidentifiedImageError, OSError) as e:
+    raise ValueError("No se pudo decodificar la imagen.") from e
+
+  image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+  output = io.BytesIO()
+  image.save(output, 'JPEG', quality=quality)
+  return output.getvalue()
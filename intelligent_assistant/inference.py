@@ -0,0 +1,188 @@
+import asyncio
+import os
+
+import numpy as np
+
+# Cada detección viaja como una fila float32: x1, y1, x2, y2, confianza, clase.
+DETECTION_COLUMNS = 6
+
+# Formato de archivo de cada backend de inferencia soportado por ultralytics.
+YOLO_BACKENDS = {
+  'pytorch': '{name}.pt',
+  'onnx': '{name}.onnx',
+  'openvino': '{name}_openvino_model',
+}
+
+YOLO_TASKS = ('detect', 'segment')
+
+ZONES = ('izquierda', 'centro', 'derecha')
+
+# Registro compacto por objeto detectado; coordenadas normalizadas y `zone` como índice en ZONES.
+DETECTION_DTYPE = np.dtype([
+  ('x1', np.float32),
+  ('y1', np.float32),
+  ('x2', np.float32),
+  ('y2', np.float32),
+  ('conf', np.float32),
+  ('cls', np.int16),
+  ('zone', np.int8),
+])
+
+
+def resolve_weights(models_dir, model_name, backend='pytorch', task='segment'):
+  if backend not in YOLO_BACKENDS:
+    raise ValueError(f"Backend de YOLO desconocido: {backend}")
+  if task not in YOLO_TASKS:
+    raise ValueError(f"Tarea de YOLO desconocida: {task}")
+
+  name = model_name if task == 'detect' else f"{model_name}-seg"
+  return os.path.join(models_dir, YOLO_BACKENDS[backend].format(name=name))
+
+
+def load_yolo(weights, task='segment'):
+  from ultralytics import YOLO
+
+  # Los modelos exportados (ONNX/OpenVINO) no guardan la tarea; se indica explícitamente.
+  return YOLO(weights, task=task)
+
+
+def results_to_array(result):
+  boxes = result.boxes
+  if boxes is None or len(boxes) == 0:
+    return np.empty((0, DETECTION_COLUMNS), dtype=np.float32)
+
+  return np.column_stack((
+    boxes.xyxy.cpu().numpy(),
+    boxes.conf.cpu().numpy(),
+    boxes.cls.cpu().numpy(),
+  )).astype(np.float32, copy=False)
+
+
+def assign_zones(detections, frame_width, frame_height):
+  objects = np.empty(len(detections), dtype=DETECTION_DTYPE)
+  if not len(detections):
+    return objects
+
+  # Coordenadas normalizadas a [0, 1]: no dependen de la resolución decodificada.
+  objects['x1'] = detections[:, 0] / frame_width
+  objects['y1'] = detections[:, 1] / frame_height
+  objects['x2'] = detections[:, 2] / frame_width
+  objects['y2'] = detections[:, 3] / frame_height
+  objects['conf'] = detections[:, 4]
+  objects['cls'] = detections[:, 5]
+
+  cx = (objects['x1'] + objects['x2']) / 2
+  # 0 = izquierda (cx < 1/3), 1 = centro, 2 = derecha (cx > 2/3)
+  objects['zone'] = (cx >= 1 / 3).astype(np.int8) + (cx > 2 / 3)
+  return objects
+
+
+def zone_labels(objects, names):
+  labels = {}
+  for zone_id, zone in enumerate(ZONES):
+    class_ids = np.unique(objects['cls'][objects['zone'] == zone_id])
+    labels[zone] = [names[int(cls_id)] for cls_id in class_ids]
+  return labels
+
+
+class LocalDetector:
+  """
+  Ejecuta el modelo YOLO dentro del proceso actual y devuelve las
+  detecciones como arreglos compactos, igual que InferenceWorkerPool.
+  """
+
+  def __init__(self, model):
+    self.model = model
+    self.names = model.names
+
+  def __call__(self, images):
+    return [results_to_array(result) for result in self.model(images, verbose=False)]
+
+
+class InferenceBatcher:
+  """
+  Agrupa los frames de todas las conexiones del proceso en una sola llamada
+  al detector. Espera como máximo `window_ms` desde el primer frame o hasta
+  reunir `max_batch_size` frames, ejecuta un único `detector([...])` en el
+  executor y devuelve a cada llamador su propio resultado. Con
+  `max_concurrent_batches` > 1 se despachan varios lotes a la vez (un lote
+  por proceso del pool de inferencia).
+  """
+
+  def __init__(self, detector, executor, window_ms=15, max_batch_size=8, max_concurrent_batches=1):
+    self.detector = detector
+    self.executor = executor
+    self.window = window_ms / 1000
+    self.max_batch_size = max(1, max_batch_size)
+    self.max_concurrent_batches = max(1, max_concurrent_batches)
+    self._loop = None
+    self._queue = None
+    self._slots = None
+    self._task = None
+    self._dispatches = set()
+
+  async def infer(self, image):
+    self._ensure_running()
+    future = self._loop.create_future()
+    await self._queue.put((image, future))
+    return await future
+
+  def stats(self):
+    # Frames esperando lote y lotes en curso en este proceso.
+    return {
+      'queued': self._queue.qsize() if self._queue is not None else 0,
+      'batches_in_flight': len(self._dispatches),
+    }
+
+  def _ensure_running(self):
+    loop = asyncio.get_running_loop()
+    if self._task is None or self._task.done() or self._loop is not loop:
+      self._loop = loop
+      self._queue = asyncio.Queue()
+      self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+      self._task = loop.create_task(self._run())
+
+  async def _run(self):
+    while True:
+      await self._slots.acquire()
+      batch = await self._collect_batch()
+      if not batch:
+        self._slots.release()
+        continue
+
+      dispatch = self._loop.create_task(self._dispatch(batch))
+      self._dispatches.add(dispatch)
+      dispatch.add_done_callback(self._dispatches.discard)
+
+  async def _collect_batch(self):
+    batch = [await self._queue.get()]
+    deadline = self._loop.time() + self.window
+
+    while len(batch) < self.max_batch_size:
+      timeout = deadline - self._loop.time()
+      if timeout <= 0:
+        break
+      try:
+        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+      except asyncio.TimeoutError:
+        break
+
+    # Las conexiones cerradas mientras esperaban no necesitan inferencia.
+    return [item for item in batch if not item[1].cancelled()]
+
+  async def _dispatch(self, batch):
+    try:
+      images = [image for image, _ in batch]
+      try:
+        results = await self._loop.run_in_executor(self.executor, self.detector, images)
+      except Exception as e:
+        for _, future in batch:
+          if not future.done():
+            future.set_exception(e)
+        return
+
+      for (_, future), result in zip(batch, results):
+        if not future.done():
+          future.set_result(result)
+    finally:
+      self._slots.release()
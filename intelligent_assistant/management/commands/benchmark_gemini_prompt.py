@@ -0,0 +1,139 @@
+import statistics
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from intelligent_assistant.gemini import (
+  NAVIGATION_MODEL, NAVIGATION_SYSTEM_INSTRUCTION, compact_yolo_context, navigation_contents,
+)
+from intelligent_assistant.inference import assign_zones, zone_labels
+from intelligent_assistant.streaming import percentile
+
+NAMES = {0: 'person', 56: 'chair', 60: 'dining table', 62: 'tv'}
+
+# Escena de referencia: dos frames de contexto con objetos en las tres zonas.
+SAMPLE_DETECTIONS = [
+  [[40, 200, 180, 630, 0.91, 0], [300, 380, 420, 620, 0.83, 56], [500, 300, 640, 560, 0.77, 60]],
+  [[60, 190, 200, 635, 0.90, 0], [290, 370, 430, 630, 0.85, 56], [520, 120, 620, 220, 0.64, 62]],
+]
+
+
+def legacy_yolo_context(objects_list, names):
+  # Formato de contexto anterior, conservado solo para comparar.
+  context_parts = []
+  for i, objects in enumerate(objects_list, 1):
+    if not len(objects):
+      context_parts.append(f"Contexto Frame {i}: No se detectaron objetos.")
+      continue
+
+    zone_descs = [
+      f"en la {zone} hay {', '.join(labels)}"
+      for zone, labels in zone_labels(objects, names).items()
+      if labels
+    ]
+    context_parts.append(f"Contexto Frame {i}: " + "; ".join(zone_descs) + ".")
+
+  return "\n".join(context_parts)
+
+
+def legacy_contents(yolo_context, image_bytes):
+  # Prompt completo que se reconstruía en cada llamada antes de usar la system instruction.
+  prompt = f"""
+        Eres un asistente de guía para una persona con discapacidad visual. Tu única función es dar una instrucción de navegación corta, clara y directa.
+
+        **Información Recibida:**
+        1.  **Contexto de YOLO:** Objetos detectados en 2 frames anteriores. Úsalo para entender la escena que conduce a este momento.
+        2.  **Fotograma Actual:** La imagen que el usuario ve ahora mismo. Tu instrucción DEBE basarse en esta imagen, usando el contexto solo como referencia.
+
+        **Contexto YOLO (Frames Anteriores):**
+        {yolo_context}
+
+        **REGLAS OBLIGATORIAS:**
+        1.  **Formato Estricto:** Tu respuesta DEBE ser `Instrucción, [contexto breve]`. Sin excepciones.
+        2.  **Brevedad:** La respuesta completa no debe superar las 10 palabras.
+        3.  **Directo al Punto:** No saludes, no expliques, no uses frases como "Basado en el análisis". Responde ÚNICAMENTE con la instrucción.
+        4.  **Prioriza la Seguridad:** La instrucción debe advertir sobre el peligro más inmediato y relevante en el **Fotograma Actual**.
+
+        **Ejemplos de Respuestas CORRECTAS:**
+        *   Gire a la derecha, pared al frente.
+        *   Gire a la izquierda, silla en centro.
+        *   Cuidado con el altillo.
+        *   Cuidado con las escaleras, suba con cuidado.
+        *   Cuidado con la persona del centro.
+        *   Cuidado puerta cerrada al frente, la manija está del lado izquierdo.
+        *   Avance con cuidado, desnivel en el suelo.
+        *   Alerta, posible hueco a la derecha.
+
+        **Situaciones de URGENCIA (Máxima Prioridad):**
+        - **Obstáculo Total (pared, puerta, objeto grande):** Si el **Fotograma Actual** muestra un bloqueo total, indica una vía de escape. Ejemplo: "Gire a la derecha, pared al frente".
+        - **Peligros Graves (escaleras, huecos, desniveles, ascensores):** Tu instrucción debe centrarse en ese peligro específico. Ejemplo: "Cuidado con las escaleras, suba con cuidado".
+
+        Analiza el **Fotograma Actual** para confirmar el peligro real y da la instrucción más segura para este preciso momento.
+
+        **INSTRUCCIÓN:**
+        """
+  return [prompt, {"mime_type": "image/jpeg", "data": image_bytes}]
+
+
+class Command(BaseCommand):
+  help = "Compara tokens de entrada y latencia de Gemini entre el prompt completo por llamada y la system instruction con contexto compacto."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--image', default='static/images/hero-person-cane.png')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--tokens-only', action='store_true', help="Solo cuenta tokens, sin generar respuestas.")
+
+  def handle(self, *args, **options):
+    if not settings.GEMINI_API_KEY:
+      raise CommandError("GEMINI_API_KEY no está configurada.")
+
+    import cv2
+    import google.generativeai as genai
+
+    image = cv2.imread(options['image'])
+    if image is None:
+      raise CommandError(f"No se pudo leer {options['image']}")
+    image_bytes = cv2.imencode('.jpg', image)[1].tobytes()
+
+    objects_list = [assign_zones(np.array(boxes, dtype=np.float32), 640, 640) for boxes in SAMPLE_DETECTIONS]
+
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    variants = {
+      'legacy': (
+        genai.GenerativeModel(NAVIGATION_MODEL),
+        lambda: legacy_contents(legacy_yolo_context(objects_list, NAMES), image_bytes),
+      ),
+      'compact': (
+        genai.GenerativeModel(NAVIGATION_MODEL, system_instruction=NAVIGATION_SYSTEM_INSTRUCTION),
+        lambda: navigation_contents(compact_yolo_context(objects_list, NAMES), image_bytes),
+      ),
+    }
+
+    for name, (model, build) in variants.items():
+      started = time.perf_counter()
+      for _ in range(1000):
+        contents = build()
+      build_us = (time.perf_counter() - started) * 1000
+
+      # count_tokens incluye la system instruction del modelo.
+      tokens = model.count_tokens(contents).total_tokens
+      self.stdout.write(
+        f"{name}: {tokens} tokens de entrada, {len(contents[0])} caracteres por llamada, "
+        f"{build_us:.1f} µs para construir el mensaje"
+      )
+
+      if options['tokens_only'] or options['runs'] <= 0:
+        continue
+
+      latencies = []
+      for _ in range(options['runs']):
+        started = time.perf_counter()
+        response = model.generate_content(contents, request_options={"timeout": 30})
+        latencies.append(1000 * (time.perf_counter() - started))
+      usage = response.usage_metadata
+      self.stdout.write(
+        f"  latencia ms: p50={statistics.median(latencies):.0f} p95={percentile(latencies, 95):.0f} "
+        f"prompt_token_count={usage.prompt_token_count} respuesta={response.text.strip()!r}"
+      )
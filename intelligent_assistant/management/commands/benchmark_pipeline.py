@@ -0,0 +1,381 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from intelligent_assistant.frames import FRAME_HEADER, ROLE_CONTEXT, ROLE_VERIFICATION
+from intelligent_assistant.model_registry import MODEL_GEMINI, ai_models
+from intelligent_assistant.streaming import percentile
+from utils.tracing import span_logger
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# Ajustes que cambian lo que mide el benchmark; se guardan con los resultados para comparar ejecuciones.
+RECORDED_SETTINGS = (
+  'YOLO_MODEL_NAME', 'YOLO_BACKEND', 'YOLO_TASK', 'YOLO_WORKER_PROCESSES', 'YOLO_BATCH_WINDOW_MS',
+  'YOLO_BATCH_MAX_SIZE', 'FRAME_DECODE_MAX_SIDE', 'FRAME_GATE_ENABLED', 'SCENE_CACHE_ENABLED',
+  'LOCAL_TIER_ENABLED', 'GEMINI_STREAMING', 'AI_EXECUTOR_WORKERS',
+)
+
+# Métricas comparadas con --compare: (ruta en el JSON, True si más alto es mejor).
+COMPARED_METRICS = (
+  (('throughput', 'cycles_per_second'), True),
+  (('cycle_latency', 'p50_ms'), False),
+  (('cycle_latency', 'p95_ms'), False),
+)
+
+
+class LatencyDistribution:
+  """
+  Latencia simulada en milisegundos: `fixed:800`, `uniform:400,1200`,
+  `normal:800,150` (media, desviación) o `lognormal:800,0.4` (mediana,
+  sigma). `sample` devuelve segundos, nunca negativos.
+  """
+
+  KINDS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+  def __init__(self, kind, params, seed=None):
+    self.kind = kind
+    self.params = params
+    self.random = random.Random(seed)
+
+  @classmethod
+  def parse(cls, spec, seed=None):
+    kind, _, values = spec.partition(':')
+    try:
+      params = tuple(float(value) for value in values.split(',')) if values else ()
+    except ValueError:
+      params = None
+    expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}.get(kind)
+    if expected is None or params is None or len(params) != expected:
+      raise ValueError(f"Distribución de latencia no válida: '{spec}' (usa {', '.join(cls.KINDS)})")
+    return cls(kind, params, seed)
+
+  def sample(self):
+    if self.kind == 'fixed':
+      milliseconds = self.params[0]
+    elif self.kind == 'uniform':
+      milliseconds = self.random.uniform(*self.params)
+    elif self.kind == 'normal':
+      milliseconds = self.random.gauss(*self.params)
+    else:
+      median, sigma = self.params
+      milliseconds = median * self.random.lognormvariate(0, sigma)
+    return max(0.0, milliseconds) / 1000
+
+  def __str__(self):
+    return f"{self.kind}:{','.join(f'{value:g}' for value in self.params)}"
+
+
+class _Chunk:
+  def __init__(self, text):
+    self.text = text
+
+
+class StubGeminiModel:
+  """
+  Sustituto del modelo de navegación: espera una latencia de la
+  distribución y responde con una instrucción fija. En streaming entrega
+  dos fragmentos; el primero llega tras `first_chunk` de la latencia.
+  """
+
+  INSTRUCTION = ("Siga recto,", " camino despejado.")
+
+  def __init__(self, latency, first_chunk=0.5):
+    self.latency = latency
+    self.first_chunk = first_chunk
+
+  def generate_content(self, contents, stream=False, **kwargs):
+    seconds = self.latency.sample()
+    if not stream:
+      time.sleep(seconds)
+      return _Chunk(''.join(self.INSTRUCTION))
+
+    def chunks():
+      time.sleep(seconds * self.first_chunk)
+      yield _Chunk(self.INSTRUCTION[0])
+      time.sleep(seconds * (1 - self.first_chunk))
+      yield _Chunk(self.INSTRUCTION[1])
+    return chunks()
+
+
+class StubFrameStore:
+  # Sustituto de S3 para FrameUploader: espera una latencia de la distribución y no guarda nada.
+
+  def __init__(self, latency):
+    self.latency = latency
+
+  def put(self, key, body):
+    time.sleep(self.latency.sample())
+    return f"stub://{key}"
+
+
+class SpanRecorder(logging.Handler):
+  # Duración de cada span por etapa (último componente de la ruta), de todas las conexiones.
+
+  def __init__(self):
+    super().__init__(logging.DEBUG)
+    self.durations = defaultdict(list)
+
+  def emit(self, record):
+    self.durations[record.span.rsplit('/', 1)[-1]].append(record.duration_ms)
+
+
+def load_sequence(path):
+  if not os.path.isdir(path):
+    raise CommandError(f"{path} no es un directorio de JPEG.")
+  names = sorted(name for name in os.listdir(path) if name.lower().endswith(JPEG_EXTENSIONS))
+  if len(names) < 3:
+    raise CommandError(f"{path} necesita al menos 3 JPEG (2 de contexto y 1 de verificación por ciclo).")
+  frames = []
+  for name in names:
+    with open(os.path.join(path, name), 'rb') as file:
+      frames.append(file.read())
+  return frames
+
+
+def summarize(milliseconds):
+  if not milliseconds:
+    return {'count': 0}
+  return {
+    'count': len(milliseconds),
+    'mean_ms': round(sum(milliseconds) / len(milliseconds), 3),
+    'p50_ms': round(percentile(milliseconds, 50), 3),
+    'p95_ms': round(percentile(milliseconds, 95), 3),
+    'p99_ms': round(percentile(milliseconds, 99), 3),
+    'max_ms': round(max(milliseconds), 3),
+  }
+
+
+def _live_children_peak_kb():
+  # VmHWM de los procesos hijos vivos (pool de inferencia) según /proc; None fuera de Linux.
+  if not os.path.isdir('/proc'):
+    return None
+  total = 0
+  for entry in os.listdir('/proc'):
+    if not entry.isdigit():
+      continue
+    try:
+      with open(f'/proc/{entry}/stat') as file:
+        parent = int(file.read().rsplit(')', 1)[1].split()[1])
+      if parent != os.getpid():
+        continue
+      with open(f'/proc/{entry}/status') as file:
+        total += next((int(line.split()[1]) for line in file if line.startswith('VmHWM:')), 0)
+    except (OSError, ValueError, IndexError):
+      continue
+  return total
+
+
+def peak_rss_mb():
+  # ru_maxrss está en KiB en Linux y en bytes en macOS. Los hijos son los procesos del pool de
+  # inferencia: siguen vivos al terminar, así que su pico se lee de /proc cuando es posible.
+  scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+  own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+  children = _live_children_peak_kb()
+  if children is None:
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+  else:
+    children /= 1024
+  return {'process': round(own, 1), 'children': round(children, 1)}
+
+
+def compare_results(current, baseline, max_regression):
+  """
+  Variación porcentual de las métricas principales respecto a `baseline`.
+  Devuelve (líneas, regresiones): una regresión es un empeoramiento mayor
+  que `max_regression` %.
+  """
+  lines, regressions = [], []
+  for path, higher_is_better in COMPARED_METRICS:
+    name = '.'.join(path)
+    try:
+      before = baseline[path[0]][path[1]]
+      after = current[path[0]][path[1]]
+    except KeyError:
+      continue
+    if not before:
+      continue
+    change = 100 * (after - before) / before
+    worse = -change if higher_is_better else change
+    lines.append(f"{name}: {before} -> {after} ({change:+.1f} %)")
+    if max_regression is not None and worse > max_regression:
+      regressions.append(name)
+  return lines, regressions
+
+
+async def replay_connection(consumer, frames, loops, fps, timeout, cycle_latencies, counters):
+  from channels.testing import WebsocketCommunicator
+
+  communicator = WebsocketCommunicator(consumer, '/ws/obstacle/')
+  connected, _ = await communicator.connect()
+  if not connected:
+    raise CommandError("El consumer rechazó la conexión.")
+
+  seq = 0
+  try:
+    for _ in range(loops):
+      for start in range(0, len(frames) - 2, 3):
+        started = time.perf_counter()
+        for offset, role in ((0, ROLE_CONTEXT), (1, ROLE_CONTEXT), (2, ROLE_VERIFICATION)):
+          header = FRAME_HEADER.pack(1, role, seq, seq * 1000 / fps)
+          await communicator.send_to(bytes_data=header + frames[start + offset])
+          seq += 1
+        counters['frames'] += 3
+
+        # El ciclo termina con la instrucción final (de Gemini, caché o repetida) o con un error.
+        try:
+          while True:
+            message = json.loads(await communicator.receive_from(timeout=timeout))
+            if message.get('error'):
+              counters['errors'] += 1
+              break
+            if message.get('final') and message.get('seq') == seq - 1:
+              counters['cached' if message.get('cached') else 'gemini'] += 1
+              break
+        except asyncio.TimeoutError:
+          counters['timeouts'] += 1
+          continue
+        cycle_latencies.append(1000 * (time.perf_counter() - started))
+  finally:
+    await communicator.disconnect()
+
+
+class Command(BaseCommand):
+  help = (
+    "Reproduce secuencias de JPEG grabadas a través de ObstacleConsumer (decodificación, YOLO, zonas y "
+    "contexto) con Gemini y S3 simulados, y guarda rendimiento, percentiles por etapa y memoria en JSON. "
+    "Con FRAME_GATE_ENABLED=False y SCENE_CACHE_ENABLED=False todos los ciclos llegan a Gemini."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('sequences', nargs='+', help="Directorios con JPEG ordenados por nombre (una secuencia cada uno).")
+    parser.add_argument('--connections', type=int, default=1, help="Conexiones simultáneas; cada una reproduce una secuencia.")
+    parser.add_argument('--loops', type=int, default=1, help="Veces que cada conexión reproduce su secuencia.")
+    parser.add_argument('--fps', type=float, default=10, help="Frecuencia de captura simulada (marca de tiempo de los frames).")
+    parser.add_argument('--gemini-latency', default='lognormal:700,0.3')
+    parser.add_argument('--gemini-first-chunk', type=float, default=0.5, help="Fracción de la latencia hasta el primer fragmento.")
+    parser.add_argument('--s3-latency', default='lognormal:80,0.5')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30, help="Segundos máximos de espera por ciclo.")
+    parser.add_argument('--output', help="Archivo JSON de resultados (por defecto benchmarks/pipeline-<fecha>.json).")
+    parser.add_argument('--compare', help="JSON de una ejecución anterior con el que comparar.")
+    parser.add_argument('--max-regression', type=float, help="Falla si una métrica comparada empeora más de este %%.")
+
+  def handle(self, *args, **options):
+    try:
+      gemini_latency = LatencyDistribution.parse(options['gemini_latency'], seed=options['seed'])
+      s3_latency = LatencyDistribution.parse(options['s3_latency'], seed=options['seed'] + 1)
+    except ValueError as e:
+      raise CommandError(str(e))
+    sequences = [load_sequence(path) for path in options['sequences']]
+
+    # Gemini y S3 simulados en los mismos puntos que usa el servidor: el registro de modelos y el uploader.
+    ai_models.register(MODEL_GEMINI, lambda: StubGeminiModel(gemini_latency, options['gemini_first_chunk']))
+    from intelligent_assistant import consumers
+
+    consumers.frame_uploader.store = StubFrameStore(s3_latency)
+
+    # Carga y warm-up fuera de la medición.
+    self.stdout.write("Cargando modelos...")
+    ai_models.load_all()
+    if not ai_models.is_ready():
+      raise CommandError(f"No se pudieron cargar los modelos: {ai_models.status()['models']}")
+
+    # Los spans se recogen en memoria sin pasar por la consola.
+    recorder = SpanRecorder()
+    previous_level, previous_propagate = span_logger.level, span_logger.propagate
+    span_logger.addHandler(recorder)
+    span_logger.setLevel(logging.DEBUG)
+    span_logger.propagate = False
+    cycle_latencies = []
+    counters = defaultdict(int)
+    try:
+      started = time.perf_counter()
+      asyncio.run(self.replay(consumers.ObstacleConsumer.as_asgi(), sequences, options, cycle_latencies, counters))
+      wall = time.perf_counter() - started
+    finally:
+      span_logger.removeHandler(recorder)
+      span_logger.setLevel(previous_level)
+      span_logger.propagate = previous_propagate
+
+    results = {
+      'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+      'config': {
+        'sequences': [
+          {'path': path, 'frames': len(frames)} for path, frames in zip(options['sequences'], sequences)
+        ],
+        'connections': options['connections'],
+        'loops': options['loops'],
+        'fps': options['fps'],
+        'gemini_latency': str(gemini_latency),
+        'gemini_first_chunk': options['gemini_first_chunk'],
+        's3_latency': str(s3_latency),
+        'seed': options['seed'],
+        'settings': {name: getattr(settings, name, None) for name in RECORDED_SETTINGS},
+      },
+      'models': ai_models.status()['models'],
+      'wall_seconds': round(wall, 3),
+      'cycles': len(cycle_latencies),
+      'frames': counters['frames'],
+      'outcomes': {key: counters[key] for key in ('gemini', 'cached', 'errors', 'timeouts')},
+      'throughput': {
+        'cycles_per_second': round(len(cycle_latencies) / wall, 3),
+        'frames_per_second': round(counters['frames'] / wall, 3),
+      },
+      'cycle_latency': summarize(cycle_latencies),
+      'stages': {name: summarize(durations) for name, durations in sorted(recorder.durations.items())},
+      'peak_rss_mb': peak_rss_mb(),
+    }
+    self.report(results, options)
+
+  async def replay(self, consumer, sequences, options, cycle_latencies, counters):
+    await asyncio.gather(*(
+      replay_connection(
+        consumer, sequences[index % len(sequences)], options['loops'], options['fps'], options['timeout'],
+        cycle_latencies, counters,
+      )
+      for index in range(options['connections'])
+    ))
+
+  def report(self, results, options):
+    output = options['output'] or os.path.join(
+      settings.BASE_DIR, 'benchmarks', f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+      json.dump(results, file, indent=2, default=str)
+
+    throughput = results['throughput']
+    self.stdout.write(
+      f"{results['cycles']} ciclos ({results['frames']} frames) en {results['wall_seconds']} s: "
+      f"{throughput['cycles_per_second']} ciclos/s, {throughput['frames_per_second']} frames/s; "
+      f"resultados {results['outcomes']}"
+    )
+    for name, stats in [('ciclo (cliente)', results['cycle_latency']), *results['stages'].items()]:
+      if stats['count']:
+        self.stdout.write(
+          f"  {name:<16} n={stats['count']:<5} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms  "
+          f"p99 {stats['p99_ms']:9.2f} ms"
+        )
+    rss = results['peak_rss_mb']
+    self.stdout.write(f"  RSS máximo: {rss['process']} MB (procesos hijos: {rss['children']} MB)")
+    self.stdout.write(f"Resultados guardados en {output}")
+
+    if options['compare']:
+      with open(options['compare']) as file:
+        baseline = json.load(file)
+      lines, regressions = compare_results(results, baseline, options['max_regression'])
+      self.stdout.write(f"Comparación con {options['compare']}:")
+      for line in lines:
+        self.stdout.write(f"  {line}")
+      if regressions:
+        raise CommandError(f"Regresión mayor del {options['max_regression']} % en: {', '.join(regressions)}")
@@ -0,0 +1,70 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Módulos pesados que no deberían importarse fuera del servidor con modelos cargados.
+HEAVY_MODULES = ('torch', 'ultralytics', 'easyocr', 'google.generativeai', 'cv2')
+
+TARGETS = {
+  'check': ['manage.py', 'check'],
+  'asgi': ['-c', 'import PathFinder_AI.asgi'],
+}
+
+
+def parse_importtime(stderr):
+  # Líneas "import time: self [us] | cumulative | paquete"; el sangrado marca los submódulos.
+  modules = {}
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    _, cumulative, name = line.split('|', 2)
+    stripped = name.strip()
+    modules.setdefault(stripped, (int(cumulative), len(name) - len(name.lstrip()) == 1))
+  return modules
+
+
+class Command(BaseCommand):
+  help = "Mide el tiempo de arranque e importación de `manage.py check` y de la aplicación ASGI (sin y con carga anticipada)."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=8, help="Módulos de primer nivel más lentos a mostrar.")
+    parser.add_argument('--target', choices=sorted(TARGETS), action='append')
+
+  def handle(self, *args, **options):
+    for target in options['target'] or sorted(TARGETS):
+      self.benchmark(target, {}, options)
+      if target == 'asgi':
+        # Con carga anticipada los modelos se cargan en segundo plano y el intérprete espera a que
+        # terminen antes de salir: el tiempo incluye la carga completa y el warm-up.
+        self.benchmark(target, {'AI_MODELS_EAGER_LOAD': 'True'}, options)
+
+  def benchmark(self, target, env, options):
+    command = [sys.executable, '-X', 'importtime', *TARGETS[target]]
+    environment = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'PathFinder_AI.settings', **env}
+
+    wall, modules = [], {}
+    for _ in range(options['runs']):
+      started = time.perf_counter()
+      completed = subprocess.run(command, cwd=settings.BASE_DIR, env=environment, capture_output=True, text=True)
+      wall.append(1000 * (time.perf_counter() - started))
+      modules = parse_importtime(completed.stderr)
+
+    label = target + ''.join(f" {key}={value}" for key, value in env.items())
+    top_level = sorted(
+      ((cumulative, name) for name, (cumulative, top) in modules.items() if top), reverse=True
+    )[:options['top']]
+    heavy = [name for name in HEAVY_MODULES if name in modules]
+
+    self.stdout.write(
+      f"{label}: {statistics.median(wall):.0f} ms de arranque (mediana de {len(wall)}), "
+      f"{sum(cumulative for cumulative, _ in top_level) / 1000:.0f} ms en los {len(top_level)} imports más lentos"
+    )
+    for cumulative, name in top_level:
+      self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {name}")
+    self.stdout.write(f"  módulos pesados importados: {', '.join(heavy) or 'ninguno'}")
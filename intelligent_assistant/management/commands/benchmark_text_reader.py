@@ -0,0 +1,108 @@
+import difflib
+import os
+import re
+import statistics
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from intelligent_assistant.gemini import PRIORITY_TEXT_READER, TEXT_READER_MODEL, TEXT_READER_PROMPT, get_gateway
+from intelligent_assistant.ocr import LocalOCR
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Carteles sintéticos para cuando no se indica un directorio de imágenes.
+SAMPLE_SIGNS = [
+  ["SALIDA DE EMERGENCIA"],
+  ["Piso 2", "Farmacia"],
+  ["Tome 1 capsula cada 8 horas", "con abundante agua"],
+  ["PROHIBIDO EL PASO"],
+  ["Bus 14 - Centro Historico"],
+]
+
+
+def sample_images():
+  for lines in SAMPLE_SIGNS:
+    image = np.full((720, 1280, 3), 235, dtype=np.uint8)
+    for i, line in enumerate(lines):
+      cv2.putText(image, line, (80, 260 + 140 * i), cv2.FONT_HERSHEY_SIMPLEX, 2.4, (25, 25, 25), 5)
+    yield " / ".join(lines), cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def fixture_images(directory):
+  for name in sorted(os.listdir(directory)):
+    if name.lower().endswith(IMAGE_EXTENSIONS):
+      image = cv2.imread(os.path.join(directory, name))
+      if image is not None:
+        yield name, cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def normalize(text):
+  return re.sub(r'\W+', ' ', text or '').strip().lower()
+
+
+def agreement(a, b):
+  return difflib.SequenceMatcher(None, normalize(a), normalize(b)).ratio()
+
+
+class Command(BaseCommand):
+  help = "Compara latencia y coincidencia del OCR local frente a Gemini en un conjunto de imágenes."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--fixtures', help="Directorio con imágenes; por defecto, carteles sintéticos.")
+    parser.add_argument('--min-confidence', type=float, default=getattr(settings, "TEXT_OCR_MIN_CONFIDENCE", 0.8))
+    parser.add_argument('--skip-gemini', action='store_true', help="Solo mide el OCR local.")
+
+  def handle(self, *args, **options):
+    if options['fixtures'] and not os.path.isdir(options['fixtures']):
+      raise CommandError(f"{options['fixtures']} no es un directorio.")
+    if not options['skip_gemini'] and not settings.GEMINI_API_KEY:
+      raise CommandError("GEMINI_API_KEY no está configurada (usa --skip-gemini para medir solo el OCR).")
+
+    images = list(fixture_images(options['fixtures']) if options['fixtures'] else sample_images())
+    ocr = LocalOCR(
+      languages=getattr(settings, "TEXT_OCR_LANGUAGES", ('es', 'en')),
+      max_side=getattr(settings, "TEXT_OCR_MAX_SIDE", 1280),
+      min_confidence=options['min_confidence'],
+    )
+    try:
+      ocr.reader
+    except ImportError as e:
+      raise CommandError(f"easyocr no está instalado: {e}")
+
+    gateway = get_gateway()
+    model = None if options['skip_gemini'] else gateway.model(TEXT_READER_MODEL)
+
+    ocr_ms, gemini_ms, agreements, accepted = [], [], [], 0
+    for name, image_bytes in images:
+      started = time.perf_counter()
+      ocr_text, confidence = ocr.read(image_bytes)
+      ocr_ms.append(1000 * (time.perf_counter() - started))
+      accepted += ocr_text is not None
+      self.stdout.write(f"{name}: OCR {ocr_ms[-1]:.0f} ms, confianza {confidence:.2f} -> {ocr_text!r}")
+
+      if model is None:
+        continue
+      started = time.perf_counter()
+      response = gateway.submit(
+        model.generate_content,
+        [TEXT_READER_PROMPT, {"mime_type": "image/jpeg", "data": image_bytes}],
+        priority=PRIORITY_TEXT_READER,
+      ).result()
+      gemini_ms.append(1000 * (time.perf_counter() - started))
+      gemini_text = response.text.strip() if response and response.text else ''
+      if ocr_text is not None:
+        agreements.append(agreement(ocr_text, gemini_text))
+      self.stdout.write(f"  Gemini {gemini_ms[-1]:.0f} ms -> {gemini_text!r}")
+
+    self.stdout.write(self.style.SUCCESS(
+      f"\n{len(images)} imágenes; OCR local aceptado en {accepted} ({100 * accepted / len(images):.0f}%)."
+    ))
+    self.stdout.write(f"OCR local: mediana {statistics.median(ocr_ms):.0f} ms, máx {max(ocr_ms):.0f} ms")
+    if gemini_ms:
+      self.stdout.write(f"Gemini: mediana {statistics.median(gemini_ms):.0f} ms, máx {max(gemini_ms):.0f} ms")
+    if agreements:
+      self.stdout.write(f"Coincidencia OCR/Gemini en aceptadas: media {statistics.mean(agreements):.2f}, mínima {min(agreements):.2f}")
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from intelligent_assistant.inference import YOLO_BACKENDS, YOLO_TASKS, load_yolo, resolve_weights
+
+
+class Command(BaseCommand):
+  help = "Exporta los pesos PyTorch de YOLO a ONNX Runtime u OpenVINO para inferencia en CPU."
+
+  def add_arguments(self, parser):
+    exportable = [backend for backend in YOLO_BACKENDS if backend != 'pytorch']
+    parser.add_argument('--backend', choices=exportable, default='onnx')
+    parser.add_argument('--task', choices=YOLO_TASKS, default='detect')
+    parser.add_argument('--imgsz', type=int, default=640)
+
+  def handle(self, *args, **options):
+    models_dir = getattr(settings, "YOLO_MODELS_DIR", 'intelligent_assistant/IA_models')
+    model_name = getattr(settings, "YOLO_MODEL_NAME", 'yolov8m')
+    source = resolve_weights(models_dir, model_name, 'pytorch', options['task'])
+
+    try:
+      model = load_yolo(source, options['task'])
+      # dynamic=True permite lotes de tamaño variable (ver InferenceBatcher).
+      exported = model.export(format=options['backend'], dynamic=True, imgsz=options['imgsz'])
+    except Exception as e:
+      raise CommandError(f"No se pudo exportar {source}: {e}")
+
+    expected = resolve_weights(models_dir, model_name, options['backend'], options['task'])
+    self.stdout.write(self.style.SUCCESS(f"Modelo exportado en {exported}"))
+    self.stdout.write(f"Ruta esperada por YOLO_BACKEND={options['backend']}: {expected}")
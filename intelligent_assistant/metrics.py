@@ -0,0 +1,312 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Límites (s) de los buckets de latencia: de 0.1 ms (formatear el contexto) a 30 s (timeout de Gemini).
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# Valor calculado en el momento de exportar (estadísticas de cachés, colas, gateway...).
+Sample = namedtuple('Sample', ['name', 'kind', 'help', 'labels', 'value'])
+
+
+def _label_key(labels):
+  return tuple(sorted(labels.items()))
+
+
+class _Metric:
+  kind = None
+
+  def __init__(self, name, help):
+    self.name = name
+    self.help = help
+    self._series = {}
+    self._lock = threading.Lock()
+
+  def series(self):
+    with self._lock:
+      return [[dict(key), self._export(value)] for key, value in self._series.items()]
+
+  def _export(self, value):
+    return value
+
+
+class Counter(_Metric):
+  kind = COUNTER
+
+  def inc(self, amount=1, **labels):
+    key = _label_key(labels)
+    with self._lock:
+      self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+  kind = GAUGE
+
+  def set(self, value, **labels):
+    with self._lock:
+      self._series[_label_key(labels)] = value
+
+  def inc(self, amount=1, **labels):
+    key = _label_key(labels)
+    with self._lock:
+      self._series[key] = self._series.get(key, 0) + amount
+
+  def dec(self, amount=1, **labels):
+    self.inc(-amount, **labels)
+
+
+class _Timer:
+  __slots__ = ('histogram', 'labels', 'started')
+
+  def __init__(self, histogram, labels):
+    self.histogram = histogram
+    self.labels = labels
+
+  def __enter__(self):
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info):
+    self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram(_Metric):
+  """
+  Histograma acumulable entre procesos: conteos por bucket, suma y total.
+  `observe` cuesta una búsqueda binaria y dos sumas bajo un lock; los
+  percentiles se calculan al exportar, no al registrar.
+  """
+
+  kind = HISTOGRAM
+
+  def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+    super().__init__(name, help)
+    self.buckets = tuple(buckets)
+
+  def observe(self, value, **labels):
+    key = _label_key(labels)
+    index = bisect.bisect_left(self.buckets, value)
+    with self._lock:
+      series = self._series.get(key)
+      if series is None:
+        series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+      series[0][index] += 1
+      series[1] += value
+
+  def time(self, **labels):
+    return _Timer(self, labels)
+
+  def _export(self, value):
+    return {'buckets': list(self.buckets), 'counts': list(value[0]), 'sum': value[1]}
+
+
+class MetricsRegistry:
+  def __init__(self):
+    self._metrics = {}
+    self._collectors = []
+    self._export_thread = None
+
+  def counter(self, name, help):
+    return self._register(Counter(name, help))
+
+  def gauge(self, name, help):
+    return self._register(Gauge(name, help))
+
+  def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+    return self._register(Histogram(name, help, buckets))
+
+  def _register(self, metric):
+    return self._metrics.setdefault(metric.name, metric)
+
+  def register_collector(self, collector):
+    # `collector()` devuelve una lista de Sample; se llama en cada exportación.
+    self._collectors.append(collector)
+
+  def snapshot(self):
+    metrics = {
+      metric.name: {'kind': metric.kind, 'help': metric.help, 'series': metric.series()}
+      for metric in self._metrics.values()
+    }
+    for collector in self._collectors:
+      try:
+        samples = collector()
+      except Exception:
+        logger.exception("Error en un colector de métricas.")
+        continue
+      for sample in samples:
+        entry = metrics.setdefault(sample.name, {'kind': sample.kind, 'help': sample.help, 'series': []})
+        entry['series'].append([sample.labels, sample.value])
+    return {'pid': os.getpid(), 'time': time.time(), 'metrics': metrics}
+
+  def start_export(self, directory, interval=5.0):
+    """
+    Escribe la instantánea de este proceso en `directory/<pid>.json` cada
+    `interval` segundos para que cualquier worker pueda servir el agregado.
+    """
+    if self._export_thread is not None:
+      return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+
+    def run():
+      while True:
+        write_snapshot(path, self.snapshot())
+        time.sleep(interval)
+
+    self._export_thread = threading.Thread(target=run, name="metrics-export", daemon=True)
+    self._export_thread.start()
+    atexit.register(_remove_quietly, path)
+
+
+def write_snapshot(path, snapshot):
+  # Escritura atómica: quien lee nunca ve un archivo a medias.
+  temporary = f"{path}.tmp"
+  with open(temporary, 'w') as file:
+    json.dump(snapshot, file)
+  os.replace(temporary, path)
+
+
+def _remove_quietly(path):
+  try:
+    os.remove(path)
+  except OSError:
+    pass
+
+
+def _process_alive(pid):
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    return True
+  return True
+
+
+def read_snapshots(directory, current, max_age=60.0):
+  """
+  Instantáneas de todos los workers del directorio. La del proceso actual
+  se sustituye por `current` (más reciente); los archivos de procesos que ya
+  no existen o sin actualizar en `max_age` segundos se eliminan.
+  """
+  snapshots = [current]
+  if not directory or not os.path.isdir(directory):
+    return snapshots
+
+  now = time.time()
+  for name in os.listdir(directory):
+    if not name.endswith('.json'):
+      continue
+    path = os.path.join(directory, name)
+    try:
+      with open(path) as file:
+        snapshot = json.load(file)
+    except (OSError, ValueError):
+      continue
+    if snapshot['pid'] == current['pid']:
+      continue
+    if not _process_alive(snapshot['pid']) or now - snapshot['time'] > max_age:
+      _remove_quietly(path)
+      continue
+    snapshots.append(snapshot)
+  return snapshots
+
+
+def merge_snapshots(snapshots):
+  # Contadores, gauges y buckets se suman serie a serie entre procesos.
+  merged = {}
+  for snapshot in snapshots:
+    for name, metric in snapshot['metrics'].items():
+      entry = merged.setdefault(name, {'kind': metric['kind'], 'help': metric['help'], 'series': {}})
+      for labels, value in metric['series']:
+        key = _label_key(labels)
+        previous = entry['series'].get(key)
+        if previous is None:
+          entry['series'][key] = value
+        elif metric['kind'] == HISTOGRAM:
+          entry['series'][key] = {
+            'buckets': value['buckets'],
+            'counts': [a + b for a, b in zip(previous['counts'], value['counts'])],
+            'sum': previous['sum'] + value['sum'],
+          }
+        else:
+          entry['series'][key] = previous + value
+  return merged
+
+
+def histogram_quantile(q, buckets, counts):
+  # Interpolación lineal dentro del bucket, como histogram_quantile de Prometheus.
+  total = sum(counts)
+  if not total:
+    return None
+  rank = q * total
+  cumulative = 0
+  for index, count in enumerate(counts):
+    if cumulative + count >= rank and count:
+      if index == len(buckets):
+        return buckets[-1]
+      lower = buckets[index - 1] if index else 0.0
+      return lower + (buckets[index] - lower) * (rank - cumulative) / count
+    cumulative += count
+  return buckets[-1]
+
+
+def _format_labels(labels, **extra):
+  items = list(labels) + sorted(extra.items())
+  if not items:
+    return ''
+  escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+  return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+def _format_number(value):
+  if value == float('inf'):
+    return '+Inf'
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(merged):
+  """
+  Formato de texto de Prometheus (0.0.4). Cada histograma se acompaña de un
+  gauge `<nombre>_quantile` con p50/p95/p99 ya calculados sobre el agregado.
+  """
+  lines = []
+  for name in sorted(merged):
+    metric = merged[name]
+    lines.append(f"# HELP {name} {metric['help']}")
+    lines.append(f"# TYPE {name} {metric['kind']}")
+    for labels, value in sorted(metric['series'].items()):
+      if metric['kind'] != HISTOGRAM:
+        lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        continue
+      cumulative = 0
+      for bound, count in zip(value['buckets'] + [float('inf')], value['counts']):
+        cumulative += count
+        lines.append(f"{name}_bucket{_format_labels(labels, le=_format_number(float(bound)))} {cumulative}")
+      lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(value['sum'])}")
+      lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    if metric['kind'] == HISTOGRAM:
+      lines.append(f"# HELP {name}_quantile Percentiles de {name} calculados sobre todos los workers")
+      lines.append(f"# TYPE {name}_quantile gauge")
+      for labels, value in sorted(metric['series'].items()):
+        for q in QUANTILES:
+          estimate = histogram_quantile(q, value['buckets'], value['counts'])
+          if estimate is not None:
+            lines.append(f"{name}_quantile{_format_labels(labels, quantile=q)} {_format_number(float(estimate))}")
+  return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
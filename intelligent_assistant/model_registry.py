@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODEL_YOLO = 'yolo'
+MODEL_GEMINI = 'gemini'
+
+STATE_IDLE = 'idle'
+STATE_LOADING = 'loading'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
+
+class LazyModel:
+  """
+  Modelo que se carga la primera vez que se pide (o antes, con una carga
+  anticipada) y queda en memoria para el resto del proceso. Tras cargarlo se
+  ejecuta `warmup` una vez para que la primera petición real no pague la
+  inicialización perezosa del backend. Si la carga falla, el siguiente `get`
+  lo vuelve a intentar.
+  """
+
+  def __init__(self, name, loader, warmup=None):
+    self.name = name
+    self.loader = loader
+    self.warmup = warmup
+    self.state = STATE_IDLE
+    self.error = None
+    self.load_seconds = None
+    self.warmup_seconds = None
+    self._value = None
+    self._lock = threading.Lock()
+
+  def get(self):
+    if self.state == STATE_READY:
+      return self._value
+
+    with self._lock:
+      if self.state == STATE_READY:
+        return self._value
+
+      self.state = STATE_LOADING
+      try:
+        started = time.perf_counter()
+        value = self.loader()
+        self.load_seconds = time.perf_counter() - started
+        if self.warmup is not None:
+          started = time.perf_counter()
+          self.warmup(value)
+          self.warmup_seconds = time.perf_counter() - started
+      except Exception as e:
+        self.state = STATE_FAILED
+        self.error = str(e)
+        logger.error("No se pudo cargar el modelo %s: %s", self.name, e)
+        raise
+
+      self._value = value
+      self.state = STATE_READY
+      self.error = None
+      logger.info("Modelo %s cargado.", self.name, extra=self.status())
+      return value
+
+  def status(self):
+    status = {'state': self.state}
+    if self.load_seconds is not None:
+      status['load_seconds'] = round(self.load_seconds, 3)
+    if self.warmup_seconds is not None:
+      status['warmup_seconds'] = round(self.warmup_seconds, 3)
+    if self.error:
+      status['error'] = self.error
+    return status
+
+
+class ModelRegistry:
+  """
+  Modelos de IA del proceso. Nada se importa ni se carga al importar el
+  módulo: los comandos de `manage.py` y los workers que solo sirven HTTP no
+  pagan torch/ultralytics. `load_all` permite la carga anticipada al
+  arrancar el servidor y `status` alimenta el health check de readiness.
+  """
+
+  def __init__(self):
+    self._models = {}
+    # Un hilo por modelo como máximo: las cargas son lentas y no deben ocupar el executor de IA.
+    self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-loader")
+    self.eager = False
+
+  def register(self, name, loader, warmup=None):
+    self._models[name] = LazyModel(name, loader, warmup)
+    return self._models[name]
+
+  def get(self, name):
+    return self._models[name].get()
+
+  async def aget(self, name):
+    # Ya cargado: sin saltos de hilo. Si no, la carga no bloquea el event loop.
+    entry = self._models[name]
+    if entry.state == STATE_READY:
+      return entry.get()
+    return await asyncio.wrap_future(self._executor.submit(entry.get))
+
+  def load_all(self, background=False):
+    self.eager = True
+    futures = [self._executor.submit(self._load_quietly, entry) for entry in self._models.values()]
+    if not background:
+      for future in futures:
+        future.result()
+
+  def _load_quietly(self, entry):
+    try:
+      entry.get()
+    except Exception:
+      pass
+
+  def is_ready(self):
+    # Con carga anticipada hace falta que todo esté cargado; en modo perezoso basta con que nada haya fallado.
+    states = [entry.state for entry in self._models.values()]
+    if self.eager:
+      return all(state == STATE_READY for state in states)
+    return STATE_FAILED not in states
+
+  def status(self):
+    return {
+      'ready': self.is_ready(),
+      'eager': self.eager,
+      'models': {name: entry.status() for name, entry in self._models.items()},
+    }
+
+
+def load_detector():
+  from .inference import LocalDetector, load_yolo, resolve_weights
+
+  task = getattr(settings, "YOLO_TASK", 'segment')
+  weights = getattr(settings, "YOLO_WEIGHTS", None) or resolve_weights(
+    getattr(settings, "YOLO_MODELS_DIR", 'intelligent_assistant/IA_models'),
+    getattr(settings, "YOLO_MODEL_NAME", 'yolov8m'),
+    getattr(settings, "YOLO_BACKEND", 'pytorch'),
+    task,
+  )
+  processes = getattr(settings, "YOLO_WORKER_PROCESSES", 0)
+  if processes:
+    from .worker_pool import InferenceWorkerPool
+
+    # Los procesos del pool cargan el modelo; este proceso no importa torch.
+    return InferenceWorkerPool(
+      weights,
+      processes,
+      task=task,
+      max_frame_size=getattr(settings, "YOLO_WORKER_MAX_FRAME_SIZE", (1920, 1080)),
+      timeout=getattr(settings, "YOLO_WORKER_TIMEOUT", 30),
+    )
+  return LocalDetector(load_yolo(weights, task))
+
+
+def warm_up_detector(detector):
+  # Una inferencia con un frame negro del tamaño de trabajo por proceso de inferencia.
+  side = getattr(settings, "FRAME_DECODE_MAX_SIDE", 640) or 640
+  image = np.zeros((side * 9 // 16, side, 3), dtype=np.uint8)
+  processes = getattr(detector, 'processes', 1)
+  with ThreadPoolExecutor(max_workers=processes) as pool:
+    list(pool.map(detector, [[image]] * processes))
+
+
+def load_navigation_model():
+  from .gemini import NAVIGATION_MODEL, NAVIGATION_SYSTEM_INSTRUCTION, get_gateway
+
+  # El gateway abre la conexión con count_tokens en segundo plano si GEMINI_PREWARM está activo.
+  return get_gateway().model(NAVIGATION_MODEL, system_instruction=NAVIGATION_SYSTEM_INSTRUCTION)
+
+
+ai_models = ModelRegistry()
+ai_models.register(
+  MODEL_YOLO,
+  load_detector,
+  warmup=warm_up_detector if getattr(settings, "AI_MODELS_WARMUP", True) else None,
+)
+ai_models.register(MODEL_GEMINI, load_navigation_model)
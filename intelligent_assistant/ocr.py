@@ -0,0 +1,111 @@
+import threading
+
+from .frames import decode_frame
+
+
+def find_text_regions(gray, min_fill=0.45, max_regions=40):
+  """
+  Regiones con aspecto de línea de texto impreso: gradiente morfológico,
+  umbral de Otsu y cierre horizontal para unir las letras de una línea.
+  Devuelve cajas (x_min, x_max, y_min, y_max) ordenadas de arriba abajo, o
+  una lista vacía si la escena no parece texto (sin regiones o demasiadas).
+  """
+  import cv2
+
+  height, width = gray.shape
+  gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+  _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+  kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, width // 25), 1))
+  connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+  contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+  regions = []
+  for contour in contours:
+    x, y, w, h = cv2.boundingRect(contour)
+    if h < 10 or h > height * 0.3 or w < h:
+      continue
+    if cv2.countNonZero(connected[y:y + h, x:x + w]) / (w * h) < min_fill:
+      continue
+    regions.append((x, x + w, y, y + h))
+
+  if len(regions) > max_regions:
+    return []
+  return reading_order(regions)
+
+
+def reading_order(regions):
+  # Agrupa por líneas (centros verticales a menos de media altura) y ordena cada línea de izquierda a derecha.
+  lines = []
+  for box in sorted(regions, key=lambda box: box[2] + box[3]):
+    center = (box[2] + box[3]) / 2
+    if lines and abs(center - lines[-1][0]) < (box[3] - box[2]) / 2:
+      lines[-1][1].append(box)
+    else:
+      lines.append((center, [box]))
+  return [box for _, line in lines for box in sorted(line)]
+
+
+def combine_lines(results):
+  """
+  Une las líneas reconocidas en orden de lectura. La confianza global es la
+  media de cada línea ponderada por su número de caracteres.
+  """
+  lines = [(text.strip(), confidence) for _, text, confidence in results if text.strip()]
+  if not lines:
+    return "", 0.0
+
+  characters = sum(len(text) for text, _ in lines)
+  confidence = sum(len(text) * conf for text, conf in lines) / characters
+  return " ".join(text for text, _ in lines), float(confidence)
+
+
+class LocalOCR:
+  """
+  OCR local con easyocr para texto impreso. Las regiones se detectan con
+  OpenCV y se pasan al reconocedor, así que no se ejecuta el detector CRAFT
+  de easyocr. El lector se carga la primera vez que se usa.
+  """
+
+  def __init__(self, languages=('es', 'en'), max_side=1280, min_confidence=0.8, min_characters=3):
+    self.languages = list(languages)
+    self.max_side = max_side
+    self.min_confidence = min_confidence
+    self.min_characters = min_characters
+    self._reader = None
+    self._lock = threading.Lock()
+
+  @property
+  def reader(self):
+    if self._reader is None:
+      import easyocr
+
+      self._reader = easyocr.Reader(self.languages, gpu=False, verbose=False)
+    return self._reader
+
+  def load_gray(self, image_bytes):
+    import cv2
+
+    gray = decode_frame(image_bytes, cv2.IMREAD_GRAYSCALE)
+    scale = self.max_side / max(gray.shape)
+    if scale < 1:
+      gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray
+
+  def read(self, image_bytes):
+    """
+    Devuelve (texto, confianza). El texto es None si no hay regiones de
+    texto o la lectura no alcanza `min_confidence`: entonces decide Gemini.
+    """
+    gray = self.load_gray(image_bytes)
+    regions = find_text_regions(gray)
+    if not regions:
+      return None, 0.0
+
+    # El modelo de easyocr no admite llamadas concurrentes sobre el mismo lector.
+    with self._lock:
+      results = self.reader.recognize(gray, horizontal_list=[list(box) for box in regions], free_list=[])
+
+    text, confidence = combine_lines(results)
+    if confidence < self.min_confidence or sum(char.isalnum() for char in text) < self.min_characters:
+      return None, confidence
+    return text, confidence
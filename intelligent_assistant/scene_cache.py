@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .frames import hash_distance
+
+
+def zone_signature(objects_list):
+  pairs = set()
+  for objects in objects_list:
+    pairs.update(zip(objects['zone'].tolist(), objects['cls'].tolist()))
+  return tuple(sorted(pairs))
+
+
+class _SceneLRU:
+  def __init__(self, max_entries, ttl):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self._entries = OrderedDict()
+
+  def get(self, zones, phash, max_distance, now):
+    best_key = None
+    best_distance = max_distance + 1
+    expired = []
+
+    for key, (_, expires_at) in self._entries.items():
+      if key[0] != zones:
+        continue
+      if expires_at <= now:
+        expired.append(key)
+        continue
+      distance = hash_distance(key[1], phash)
+      if distance < best_distance:
+        best_key, best_distance = key, distance
+
+    for key in expired:
+      del self._entries[key]
+
+    if best_key is None:
+      return None
+    self._entries.move_to_end(best_key)
+    return self._entries[best_key][0]
+
+  def put(self, zones, phash, instruction, now):
+    key = (zones, phash)
+    self._entries[key] = (instruction, now + self.ttl)
+    self._entries.move_to_end(key)
+    while len(self._entries) > self.max_entries:
+      self._entries.popitem(last=False)
+
+
+class SceneInstructionCache:
+  """
+  Caché de instrucciones de Gemini por escena. La firma de la escena es el
+  resumen de zonas de YOLO (pares zona/clase) más el dHash del frame de
+  verificación; dos escenas coinciden si el resumen es idéntico y los hashes
+  difieren en `max_distance` bits o menos. Se busca primero en la caché del
+  usuario y después en la global; ambas con TTL y desalojo LRU.
+  """
+
+  def __init__(self, ttl=10, max_distance=6, user_entries=32, global_entries=512, max_users=1000):
+    self.ttl = ttl
+    self.max_distance = max_distance
+    self.user_entries = user_entries
+    self.max_users = max_users
+    self._users = OrderedDict()
+    self._global = _SceneLRU(global_entries, ttl)
+    self._lock = threading.Lock()
+
+    self.user_hits = 0
+    self.global_hits = 0
+    self.misses = 0
+    self.lookup_seconds = 0.0
+    self.miss_seconds = 0.0
+    self.miss_samples = 0
+
+  def get(self, user_key, zones, phash):
+    start = time.perf_counter()
+    now = time.monotonic()
+    with self._lock:
+      user_cache = self._users.get(user_key)
+      instruction = user_cache.get(zones, phash, self.max_distance, now) if user_cache else None
+      if instruction is not None:
+        self.user_hits += 1
+      else:
+        instruction = self._global.get(zones, phash, self.max_distance, now)
+        if instruction is not None:
+          self.global_hits += 1
+        else:
+          self.misses += 1
+      self.lookup_seconds += time.perf_counter() - start
+    return instruction
+
+  def put(self, user_key, zones, phash, instruction):
+    now = time.monotonic()
+    with self._lock:
+      user_cache = self._users.get(user_key)
+      if user_cache is None:
+        user_cache = self._users[user_key] = _SceneLRU(self.user_entries, self.ttl)
+        while len(self._users) > self.max_users:
+          self._users.popitem(last=False)
+      self._users.move_to_end(user_key)
+      user_cache.put(zones, phash, instruction, now)
+      self._global.put(zones, phash, instruction, now)
+
+  def record_miss_latency(self, seconds):
+    with self._lock:
+      self.miss_seconds += seconds
+      self.miss_samples += 1
+
+  def stats(self):
+    with self._lock:
+      hits = self.user_hits + self.global_hits
+      lookups = hits + self.misses
+      return {
+        'user_hits': self.user_hits,
+        'global_hits': self.global_hits,
+        'misses': self.misses,
+        'hit_rate': hits / lookups if lookups else 0.0,
+        'avg_lookup_ms': 1000 * self.lookup_seconds / lookups if lookups else 0.0,
+        'avg_miss_ms': 1000 * self.miss_seconds / self.miss_samples if self.miss_samples else 0.0,
+      }
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import deque
+
+
+def percentile(values, q):
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+
+class LatestFrameSlot:
+  """
+  Buzón de un solo elemento para el modo continuo: si llega un frame antes de
+  que se haya recogido el anterior, el anterior se descarta en lugar de
+  encolarse. Así el consumidor siempre procesa el frame más reciente y la
+  latencia no crece cuando el cliente envía más rápido de lo que se procesa.
+  """
+
+  def __init__(self):
+    self.received = 0
+    self.dropped = 0
+    self._item = None
+    self._received_at = None
+    self._ready = asyncio.Event()
+
+  def put(self, item):
+    # Devuelve True si el elemento sustituye a otro que no llegó a procesarse.
+    self.received += 1
+    superseded = self._item is not None
+    if superseded:
+      self.dropped += 1
+    self._item = item
+    self._received_at = time.perf_counter()
+    self._ready.set()
+    return superseded
+
+  async def get(self):
+    # Devuelve (elemento, instante de llegada según time.perf_counter()).
+    await self._ready.wait()
+    self._ready.clear()
+    item, received_at = self._item, self._received_at
+    self._item = self._received_at = None
+    return item, received_at
+
+
+class HazardMonitor:
+  """
+  Detecta cambios del estado de peligro con histéresis: un estado nuevo se
+  publica cuando se repite en `confirm_frames` frames seguidos, para que un
+  objeto que aparece y desaparece en un solo frame no genere instrucciones.
+  """
+
+  def __init__(self, confirm_frames=2):
+    self.confirm_frames = confirm_frames
+    self.state = None
+    self._candidate = None
+    self._count = 0
+
+  def update(self, state):
+    if state == self.state:
+      self._candidate, self._count = None, 0
+      return False
+
+    if state == self._candidate:
+      self._count += 1
+    else:
+      self._candidate, self._count = state, 1
+
+    if self._count < self.confirm_frames:
+      return False
+    self.state = state
+    self._candidate, self._count = None, 0
+    return True
+
+
+class StreamStats:
+  # Frames procesados y latencias (s) recientes del modo continuo de una conexión.
+
+  def __init__(self, window=200):
+    self.processed = 0
+    self._queue = deque(maxlen=window)
+    self._total = deque(maxlen=window)
+
+  def record(self, queue_seconds, total_seconds):
+    self.processed += 1
+    self._queue.append(queue_seconds)
+    self._total.append(total_seconds)
+
+  def summary(self, slot):
+    summary = {'received': slot.received, 'processed': self.processed, 'dropped': slot.dropped}
+    if self._total:
+      summary['queue_p50_ms'] = round(1000 * percentile(self._queue, 50), 1)
+      summary['total_p50_ms'] = round(1000 * percentile(self._total, 50), 1)
+      summary['total_p95_ms'] = round(1000 * percentile(self._total, 95), 1)
+    return summary
+
+
+class AdaptiveStreamController:
+  """
+  Control AIMD de lo que envía cada cliente en modo continuo: lado mayor del
+  frame, calidad JPEG e intervalo entre frames. En cada ventana compara la
+  latencia de la etapa de detección (media exponencial) con
+  `target_latency_ms` y la cola del batcher de YOLO con `max_queue_depth`:
+
+  - sobrecarga: el intervalo se multiplica por `decrease_factor` y se baja un
+    nivel de resolución (menos frames y más pequeños);
+  - sin sobrecarga: el intervalo se reduce `increase_ms` y, tras
+    `upgrade_after` ventanas seguidas sanas, se sube un nivel.
+
+  El intervalo nunca baja del tiempo de detección medido: enviar más rápido
+  de lo que se procesa solo produce frames descartados.
+  """
+
+  def __init__(self, levels=((320, 50), (480, 60), (640, 70), (960, 75), (1280, 80)), start_level=2,
+               start_interval_ms=200, min_interval_ms=100, max_interval_ms=2000, target_latency_ms=150,
+               max_queue_depth=8, increase_ms=20, decrease_factor=1.5, upgrade_after=5, smoothing=0.3):
+    self.levels = levels
+    self.level = min(start_level, len(levels) - 1)
+    self.interval_ms = start_interval_ms
+    self.min_interval_ms = min_interval_ms
+    self.max_interval_ms = max_interval_ms
+    self.target_latency_ms = target_latency_ms
+    self.max_queue_depth = max_queue_depth
+    self.increase_ms = increase_ms
+    self.decrease_factor = decrease_factor
+    self.upgrade_after = upgrade_after
+    self.smoothing = smoothing
+    self.latency_ms = None
+    self._observed = False
+    self._healthy = 0
+
+  def observe(self, stage_seconds):
+    latency_ms = 1000 * stage_seconds
+    if self.latency_ms is None:
+      self.latency_ms = latency_ms
+    else:
+      self.latency_ms = self.smoothing * latency_ms + (1 - self.smoothing) * self.latency_ms
+    self._observed = True
+
+  def update(self, queue_depth):
+    # Devuelve los nuevos objetivos si cambian; None si siguen igual o no hubo frames en la ventana.
+    if not self._observed:
+      return None
+    self._observed = False
+    previous = self.targets()
+
+    if self.latency_ms > self.target_latency_ms or queue_depth > self.max_queue_depth:
+      self.interval_ms *= self.decrease_factor
+      self.level = max(0, self.level - 1)
+      self._healthy = 0
+    else:
+      self.interval_ms -= self.increase_ms
+      self._healthy += 1
+      if self._healthy >= self.upgrade_after and self.level < len(self.levels) - 1:
+        self.level += 1
+        self._healthy = 0
+
+    floor = max(self.min_interval_ms, self.latency_ms)
+    self.interval_ms = min(self.max_interval_ms, max(floor, self.interval_ms))
+
+    targets = self.targets()
+    return targets if targets != previous else None
+
+  def targets(self):
+    max_side, quality = self.levels[self.level]
+    return {'max_side': max_side, 'jpeg_quality': quality, 'frame_interval_ms': round(self.interval_ms)}
@@ -1,3 +1,1339 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from PIL import Image
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from intelligent_assistant import consumers, views
+from intelligent_assistant.fast_tier import hazard_state, local_instruction
+from intelligent_assistant.frame_gate import GATE_FULL, GATE_REEMIT, GATE_YOLO, FrameChangeGate
+from intelligent_assistant.frames import (
+  FRAME_HEADER, ROLE_CONTEXT, ROLE_VERIFICATION, Frame, decode_frame, jpeg_size, parse_binary_frame,
+)
+from intelligent_assistant.gemini import (
+  PRIORITY_NAVIGATION, PRIORITY_TEXT_READER, CircuitBreaker, GeminiGateway, GeminiUnavailable, ModelCatalog,
+  compact_yolo_context, stream_text,
+)
+from intelligent_assistant.management.commands.benchmark_pipeline import (
+  LatencyDistribution, StubGeminiModel, compare_results,
+)
+from intelligent_assistant.management.commands.benchmark_startup import HEAVY_MODULES
+from intelligent_assistant.inference import (
+  InferenceBatcher, LocalDetector, assign_zones, load_yolo, resolve_weights, zone_labels,
+)
+from intelligent_assistant.imaging import normalize_image
+from intelligent_assistant.metrics import (
+  MetricsRegistry, Sample, histogram_quantile, merge_snapshots, read_snapshots, render_prometheus, write_snapshot,
+)
+from intelligent_assistant.model_registry import (
+  MODEL_GEMINI, MODEL_YOLO, STATE_FAILED, STATE_IDLE, STATE_READY, ModelRegistry,
+)
+from intelligent_assistant.ocr import LocalOCR, combine_lines, find_text_regions
+from intelligent_assistant.scene_cache import SceneInstructionCache
+from intelligent_assistant.streaming import AdaptiveStreamController, HazardMonitor, LatestFrameSlot
+from intelligent_assistant.tracking import ObjectTracker
+from intelligent_assistant.text_cache import TextResultCache, text_image_hash
+from intelligent_assistant.uploads import FrameUploader, LocalFrameStore, UploadQueueFull
+from intelligent_assistant.views import ObstacleDetectionView
+from intelligent_assistant.worker_pool import InferenceWorkerPool, SharedFrameRing
+from auth_api.views import RegisterView
+from utils.tracing import CorrelationFilter, ProfileSampler, StructuredFormatter, correlation, span
+
+FIXTURE_IMAGE = os.path.join(settings.BASE_DIR, 'static', 'images', 'hero-person-cane.png')
+
+
+class BinaryFrameProtocolTests(SimpleTestCase):
+  def setUp(self):
+    _, jpeg = cv2.imencode('.jpg', np.zeros((24, 32, 3), dtype=np.uint8))
+    self.jpeg = jpeg.tobytes()
+
+  def test_parse_header_and_decode_payload(self):
+    message = FRAME_HEADER.pack(1, ROLE_VERIFICATION, 42, 1700000000000.0) + self.jpeg
+
+    header, payload = parse_binary_frame(message)
+
+    self.assertEqual((header.role, header.seq, header.timestamp), (ROLE_VERIFICATION, 42, 1700000000000.0))
+    self.assertIsInstance(payload, memoryview)
+    self.assertEqual(decode_frame(payload).shape, (24, 32, 3))
+
+  def test_rejects_unknown_version_and_role(self):
+    with self.assertRaises(ValueError):
+      parse_binary_frame(FRAME_HEADER.pack(9, ROLE_VERIFICATION, 1, 0.0) + self.jpeg)
+    with self.assertRaises(ValueError):
+      parse_binary_frame(FRAME_HEADER.pack(1, 7, 1, 0.0) + self.jpeg)
+
+  def test_rejects_header_without_image(self):
+    with self.assertRaises(ValueError):
+      parse_binary_frame(FRAME_HEADER.pack(1, ROLE_VERIFICATION, 1, 0.0))
+
+
+class FrameDecodeTests(SimpleTestCase):
+  def setUp(self):
+    _, jpeg = cv2.imencode('.jpg', np.zeros((720, 1280, 3), dtype=np.uint8))
+    self.jpeg = jpeg.tobytes()
+
+  def test_jpeg_size_reads_sof_header(self):
+    self.assertEqual(jpeg_size(self.jpeg), (1280, 720))
+    self.assertIsNone(jpeg_size(b'not a jpeg'))
+
+  def test_decodes_once_at_reduced_resolution(self):
+    frame = Frame(memoryview(self.jpeg))
+
+    image = frame.image(max_side=640)
+
+    self.assertEqual(image.shape, (360, 640, 3))
+    self.assertIs(frame.image(max_side=640), image)
+
+  def test_full_resolution_without_max_side(self):
+    self.assertEqual(Frame(self.jpeg).image().shape, (720, 1280, 3))
+
+
+def labels_by_zone(detector, image):
+  # Conjunto (etiqueta, zona) de la primera imagen: lo que se compara entre backends.
+  objects = assign_zones(detector([image])[0], image.shape[1], image.shape[0])
+  return {
+    (label, zone)
+    for zone, labels in zone_labels(objects, detector.names).items()
+    for label in labels
+  }
+
+
+class FakeTensor:
+  # Lo mínimo de un tensor de torch que usa results_to_array.
+
+  def __init__(self, values, dtype):
+    self.values = np.asarray(values, dtype=dtype)
+
+  def cpu(self):
+    return self
+
+  def numpy(self):
+    return self.values
+
+
+class FakeYolo:
+  """
+  Modelo con la salida de ultralytics (`result.boxes.xyxy/conf/cls`) para
+  probar LocalDetector sin pesos. `dtype` imita la precisión del backend.
+  """
+
+  names = {0: 'persona', 56: 'silla', 60: 'mesa'}
+
+  def __init__(self, rows, dtype=np.float32):
+    self.rows = rows
+    self.dtype = dtype
+
+  def __call__(self, images, verbose=True):
+    if self.rows is None:
+      return [mock.Mock(boxes=None) for _ in images]
+    rows = np.asarray(self.rows, dtype=self.dtype).reshape(-1, 6)
+    boxes = mock.MagicMock(
+      xyxy=FakeTensor(rows[:, :4], self.dtype),
+      conf=FakeTensor(rows[:, 4], self.dtype),
+      cls=FakeTensor(rows[:, 5], self.dtype),
+    )
+    boxes.__len__.return_value = len(rows)
+    return [mock.Mock(boxes=boxes) for _ in images]
+
+
+class AssignZonesTests(SimpleTestCase):
+  names = {0: 'persona', 1: 'silla', 2: 'mesa'}
+
+  def test_zones_follow_box_center(self):
+    detections = np.array([
+      [0, 0, 50, 10, 0.9, 0],
+      [130, 0, 170, 10, 0.9, 1],
+      [280, 0, 300, 10, 0.9, 2],
+      [60, 0, 140, 10, 0.9, 0],
+    ], dtype=np.float32)
+
+    objects = assign_zones(detections, frame_width=300, frame_height=100)
+
+    self.assertEqual(objects['zone'].tolist(), [0, 1, 2, 1])
+    self.assertEqual(zone_labels(objects, self.names), {
+      'izquierda': ['persona'],
+      'centro': ['persona', 'silla'],
+      'derecha': ['mesa'],
+    })
+
+  def test_zone_boundaries_belong_to_center(self):
+    detections = np.array([
+      [100, 0, 100, 10, 0.9, 0],
+      [200, 0, 200, 10, 0.9, 0],
+    ], dtype=np.float32)
+
+    self.assertEqual(assign_zones(detections, frame_width=300, frame_height=100)['zone'].tolist(), [1, 1])
+
+  def test_no_detections(self):
+    objects = assign_zones(np.empty((0, 6), dtype=np.float32), frame_width=300, frame_height=100)
+    self.assertEqual(len(objects), 0)
+    self.assertEqual(zone_labels(objects, self.names), {'izquierda': [], 'centro': [], 'derecha': []})
+
+  def test_detector_output_gives_the_same_labels_across_precisions(self):
+    # Mismo camino que DetectorBackendParityTests (LocalDetector -> assign_zones -> zone_labels), sin pesos.
+    image = np.zeros((360, 640, 3), dtype=np.uint8)
+    reference = FakeYolo(
+      [[10, 40, 150, 350, 0.91, 0], [280, 200, 360, 359, 0.80, 56], [560, 100, 630, 200, 0.55, 60]],
+    )
+    # Un backend exportado devuelve cajas algo distintas y en float64.
+    exported = FakeYolo(
+      [[12.4, 41, 149.2, 351, 0.90, 0], [281.7, 198, 358.9, 359, 0.82, 56], [559, 99, 631, 201, 0.57, 60]],
+      dtype=np.float64,
+    )
+
+    detections = LocalDetector(exported)([image])[0]
+    self.assertEqual((detections.dtype, detections.shape), (np.float32, (3, 6)))
+    expected = labels_by_zone(LocalDetector(reference), image)
+    self.assertEqual(expected, {('persona', 'izquierda'), ('silla', 'centro'), ('mesa', 'derecha')})
+    self.assertEqual(labels_by_zone(LocalDetector(exported), image), expected)
+
+  def test_detector_without_boxes(self):
+    image = np.zeros((360, 640, 3), dtype=np.uint8)
+
+    for rows in (None, []):
+      detections = LocalDetector(FakeYolo(rows))([image])[0]
+      self.assertEqual(detections.shape, (0, 6))
+      self.assertEqual(labels_by_zone(LocalDetector(FakeYolo(rows)), image), set())
+
+
+class LocalInstructionTests(SimpleTestCase):
+  names = {0: 'person', 1: 'chair', 2: 'kite'}
+
+  def objects(self, *boxes):
+    return assign_zones(np.array(boxes, dtype=np.float32).reshape(-1, 6), frame_width=300, frame_height=100)
+
+  def test_prefers_near_object_over_centered_one(self):
+    objects = self.objects(
+      [130, 10, 170, 40, 0.9, 0],
+      [0, 40, 90, 100, 0.8, 1],
+    )
+    self.assertEqual(local_instruction(objects, self.names), "Cuidado, silla muy cerca a la izquierda")
+
+  def test_far_object_is_announced_by_zone(self):
+    objects = self.objects([130, 10, 170, 40, 0.9, 0])
+    self.assertEqual(local_instruction(objects, self.names), "Persona en el centro")
+
+  def test_unknown_label_is_generic_obstacle(self):
+    objects = self.objects([250, 10, 290, 40, 0.9, 2])
+    self.assertEqual(local_instruction(objects, self.names), "Obstáculo a la derecha")
+
+  def test_small_or_missing_objects_yield_nothing(self):
+    self.assertIsNone(local_instruction(self.objects(), self.names))
+    self.assertIsNone(local_instruction(self.objects([140, 10, 145, 15, 0.9, 0]), self.names))
+
+
+class ObjectTrackerTests(SimpleTestCase):
+  def objects(self, *boxes):
+    return assign_zones(np.array(boxes, dtype=np.float32).reshape(-1, 6), frame_width=100, frame_height=100)
+
+  def test_ids_are_stable_while_objects_move(self):
+    tracker = ObjectTracker()
+    first = tracker.update(self.objects([10, 10, 30, 50, 0.9, 0], [60, 10, 80, 50, 0.9, 56]), timestamp=0.0)
+    second = tracker.update(self.objects([62, 10, 82, 50, 0.9, 56], [14, 10, 34, 50, 0.9, 0]), timestamp=0.5)
+
+    self.assertTrue(first.new.all())
+    self.assertFalse(second.new.any())
+    self.assertEqual(second.ids.tolist(), first.ids[::-1].tolist())
+
+  def test_growing_box_is_approaching_with_finite_ttc(self):
+    tracker = ObjectTracker(approach_ttc=4.0)
+    tracker.update(self.objects([40, 40, 60, 60, 0.9, 0]), timestamp=0.0)
+    update = tracker.update(self.objects([35, 35, 65, 65, 0.9, 0]), timestamp=1.0)
+
+    # Escala 0.2 -> 0.3 en 1 s, suavizada a la mitad: 0.05/s, TTC = 0.3 / 0.05 = 6 s.
+    self.assertAlmostEqual(float(update.ttc[0]), 6.0, places=4)
+    update = tracker.update(self.objects([20, 20, 80, 80, 0.9, 0]), timestamp=2.0)
+    self.assertTrue(tracker.approaching(update)[0])
+
+  def test_static_object_is_not_approaching(self):
+    tracker = ObjectTracker()
+    tracker.update(self.objects([40, 40, 60, 60, 0.9, 0]), timestamp=0.0)
+    update = tracker.update(self.objects([40, 40, 60, 60, 0.9, 0]), timestamp=1.0)
+
+    self.assertEqual(update.ttc.tolist(), [float('inf')])
+    self.assertFalse(tracker.approaching(update).any())
+
+  def test_other_class_or_expired_track_gets_a_new_id(self):
+    tracker = ObjectTracker(max_age=1.0)
+    first = tracker.update(self.objects([40, 40, 60, 60, 0.9, 0]), timestamp=0.0)
+
+    other_class = tracker.update(self.objects([40, 40, 60, 60, 0.9, 56]), timestamp=0.1)
+    self.assertTrue(other_class.new[0])
+
+    expired = tracker.update(self.objects([40, 40, 60, 60, 0.9, 0]), timestamp=5.0)
+    self.assertTrue(expired.new[0])
+    self.assertNotEqual(expired.ids[0], first.ids[0])
+
+
+class FakeBatchDetector:
+  # Detector de las pruebas del batcher: registra cada lote y devuelve un resultado por imagen.
+
+  def __init__(self, error=None, gate=None):
+    self.error = error
+    self.gate = gate
+    self.batches = []
+    self.running = 0
+    self.max_running = 0
+    self._lock = threading.Lock()
+
+  def __call__(self, images):
+    with self._lock:
+      self.batches.append(list(images))
+      self.running += 1
+      self.max_running = max(self.max_running, self.running)
+    try:
+      if self.gate is not None:
+        self.gate.wait(5)
+      if self.error is not None:
+        raise self.error
+      return [f"resultado-{image}" for image in images]
+    finally:
+      with self._lock:
+        self.running -= 1
+
+
+class InferenceBatcherTests(SimpleTestCase):
+  def setUp(self):
+    self.executor = ThreadPoolExecutor(max_workers=4)
+    self.addCleanup(self.executor.shutdown)
+
+  def infer_all(self, batcher, images):
+    async def run():
+      return await asyncio.gather(*(batcher.infer(image) for image in images), return_exceptions=True)
+    return asyncio.run(run())
+
+  def test_window_groups_concurrent_frames_and_fans_out_results(self):
+    detector = FakeBatchDetector()
+    batcher = InferenceBatcher(detector, self.executor, window_ms=50, max_batch_size=8)
+
+    results = self.infer_all(batcher, range(3))
+
+    self.assertEqual(detector.batches, [[0, 1, 2]])
+    self.assertEqual(results, ['resultado-0', 'resultado-1', 'resultado-2'])
+
+  def test_full_batch_is_dispatched_without_waiting_for_the_window(self):
+    detector = FakeBatchDetector()
+    batcher = InferenceBatcher(detector, self.executor, window_ms=10000, max_batch_size=2)
+
+    started = time.perf_counter()
+    results = self.infer_all(batcher, range(4))
+
+    self.assertLess(time.perf_counter() - started, 5)
+    self.assertEqual(detector.batches, [[0, 1], [2, 3]])
+    self.assertEqual(results, [f"resultado-{image}" for image in range(4)])
+
+  def test_detector_error_reaches_every_waiter_of_the_batch(self):
+    error = RuntimeError("fallo de inferencia")
+    batcher = InferenceBatcher(FakeBatchDetector(error=error), self.executor, window_ms=50)
+
+    self.assertEqual(self.infer_all(batcher, range(3)), [error, error, error])
+
+  def test_concurrent_batches_are_limited(self):
+    gate = threading.Event()
+    detector = FakeBatchDetector(gate=gate)
+    batcher = InferenceBatcher(detector, self.executor, window_ms=0, max_batch_size=1, max_concurrent_batches=2)
+
+    async def run():
+      tasks = [asyncio.ensure_future(batcher.infer(image)) for image in range(4)]
+      while len(detector.batches) < 2:
+        await asyncio.sleep(0.01)
+      await asyncio.sleep(0.05)
+      # Dos lotes en el detector; los otros dos frames esperan a que se libere un hueco.
+      in_flight = (len(detector.batches), batcher.stats())
+      gate.set()
+      return in_flight, await asyncio.gather(*tasks)
+
+    (dispatched, stats), results = asyncio.run(run())
+
+    self.assertEqual(dispatched, 2)
+    self.assertEqual(stats, {'queued': 2, 'batches_in_flight': 2})
+    self.assertEqual(detector.max_running, 2)
+    self.assertEqual(len(detector.batches), 4)
+    self.assertEqual(results, [f"resultado-{image}" for image in range(4)])
+
+
+class ObstacleConsumerTests(SimpleTestCase):
+  """
+  Camino por ciclos de verificación a través del WebSocket: dos frames de
+  contexto y uno de verificación forman un ciclo que entra en la cola
+  acotada de la conexión y lo procesa su tarea de análisis.
+  """
+
+  def setUp(self):
+    _, jpeg = cv2.imencode('.jpg', np.zeros((48, 64, 3), dtype=np.uint8))
+    self.jpeg = jpeg.tobytes()
+    models = {
+      MODEL_YOLO: mock.Mock(names={0: 'persona'}),
+      MODEL_GEMINI: StubGeminiModel(LatencyDistribution.parse('fixed:0')),
+    }
+    for patcher in (
+      mock.patch.object(consumers.ai_models, 'aget', mock.AsyncMock(side_effect=models.get)),
+      mock.patch.object(consumers, 'scene_cache', None),
+      mock.patch.object(consumers.frame_uploader, 'submit', return_value=self.uploaded('https://bucket/frame.jpg')),
+    ):
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def uploaded(self, url):
+    future = Future()
+    future.set_result(url)
+    return future
+
+  def cycle(self, seq):
+    return [
+      FRAME_HEADER.pack(1, role, seq + index, 1700000000000.0 + 200 * index) + self.jpeg
+      for index, role in enumerate((ROLE_CONTEXT, ROLE_CONTEXT, ROLE_VERIFICATION))
+    ]
+
+  def dropped(self, reason):
+    return sum(value for labels, value in consumers.FRAMES_DROPPED.series() if labels == {'reason': reason})
+
+  async def connect(self):
+    communicator = WebsocketCommunicator(consumers.ObstacleConsumer.as_asgi(), '/ws/obstacle_detection/')
+    connected, _ = await communicator.connect()
+    self.assertTrue(connected)
+    return communicator
+
+  def test_queued_cycle_sends_the_instruction(self):
+    person = np.array([[16, 8, 48, 46, 0.9, 0]], dtype=np.float32)
+
+    async def run():
+      communicator = await self.connect()
+      for message in self.cycle(1):
+        await communicator.send_to(bytes_data=message)
+      messages = []
+      while not messages or 'frame_s3_url' not in messages[-1]:
+        messages.append(json.loads(await communicator.receive_from(timeout=5)))
+      await communicator.disconnect()
+      return messages
+
+    with mock.patch.object(consumers.yolo_batcher, 'infer', mock.AsyncMock(return_value=person)) as infer:
+      messages = asyncio.run(run())
+
+    # YOLO solo analiza los frames de contexto; el de verificación va a Gemini.
+    self.assertEqual(infer.await_count, 2)
+    final = next(message for message in messages if message.get('final'))
+    self.assertEqual(final['instruction'], 'Siga recto, camino despejado.')
+    self.assertEqual(final['seq'], 3)
+    self.assertEqual(
+      [message['instruction_chunk'] for message in messages if message.get('partial')],
+      list(StubGeminiModel.INSTRUCTION),
+    )
+    self.assertIn('local', [message.get('tier') for message in messages])
+    self.assertEqual(messages[-1], {'frame_s3_url': 'https://bucket/frame.jpg', 'seq': 3})
+
+  def test_cycles_beyond_the_queue_are_dropped(self):
+    processed = []
+    started = release = None
+
+    async def process(consumer, context_frames, verification_frame):
+      processed.append((len(context_frames), verification_frame.seq))
+      started.set()
+      await release.wait()
+
+    async def run():
+      nonlocal started, release
+      started, release = asyncio.Event(), asyncio.Event()
+      communicator = await self.connect()
+      for message in self.cycle(1):
+        await communicator.send_to(bytes_data=message)
+      await asyncio.wait_for(started.wait(), 5)
+
+      # Con un ciclo en análisis, el siguiente espera en la cola (tamaño 1) y el tercero se descarta.
+      with self.assertLogs('intelligent_assistant.consumers', level='WARNING') as logs:
+        for seq in (11, 21):
+          for message in self.cycle(seq):
+            await communicator.send_to(bytes_data=message)
+        await communicator.receive_nothing(timeout=0.2)
+      release.set()
+      while len(processed) < 2:
+        await asyncio.sleep(0.01)
+      await communicator.receive_nothing(timeout=0.1)
+      await communicator.disconnect()
+      return logs
+
+    dropped = self.dropped('queue_full')
+    with self.settings(OBSTACLE_WORK_QUEUE_SIZE=1), \
+        mock.patch.object(consumers.ObstacleConsumer, 'process_frames_for_gemini', process):
+      logs = asyncio.run(run())
+
+    self.assertEqual(processed, [(2, 3), (2, 13)])
+    self.assertEqual(self.dropped('queue_full') - dropped, 1)
+    self.assertIn("Cola de análisis llena", logs.output[0])
+
+  def test_disconnect_stops_the_worker(self):
+    events = []
+    started = None
+
+    async def process(consumer, context_frames, verification_frame):
+      started.set()
+      try:
+        await asyncio.Event().wait()
+      except asyncio.CancelledError:
+        events.append('cancelled')
+        raise
+
+    async def run():
+      nonlocal started
+      started = asyncio.Event()
+      communicator = await self.connect()
+      connections = consumers.ACTIVE_CONNECTIONS.series()[0][1]
+      for message in self.cycle(1):
+        await communicator.send_to(bytes_data=message)
+      await asyncio.wait_for(started.wait(), 5)
+      await communicator.disconnect()
+      for _ in range(100):
+        if events:
+          break
+        await asyncio.sleep(0.01)
+      return connections
+
+    with mock.patch.object(consumers.ObstacleConsumer, 'process_frames_for_gemini', process):
+      connections = asyncio.run(run())
+
+    # El ciclo en curso se cancela y la conexión deja de contarse como activa.
+    self.assertEqual(events, ['cancelled'])
+    self.assertEqual(consumers.ACTIVE_CONNECTIONS.series()[0][1], connections - 1)
+
+
+class ContinuousStreamTests(SimpleTestCase):
+  def objects(self, *boxes):
+    return assign_zones(np.array(boxes, dtype=np.float32).reshape(-1, 6), frame_width=100, frame_height=100)
+
+  def test_slot_keeps_only_the_latest_frame(self):
+    async def run():
+      slot = LatestFrameSlot()
+      for seq in range(3):
+        slot.put(seq)
+      first, _ = await slot.get()
+      slot.put(3)
+      second, _ = await slot.get()
+      return slot, first, second
+
+    slot, first, second = asyncio.run(run())
+    self.assertEqual((first, second), (2, 3))
+    self.assertEqual((slot.received, slot.dropped), (4, 2))
+
+  def test_hazard_state_levels(self):
+    objects = self.objects([10, 10, 30, 40, 0.9, 0], [40, 50, 60, 95, 0.9, 56], [80, 10, 82, 12, 0.9, 60])
+    state = hazard_state(objects, approaching=np.array([True, False, False]))
+
+    # La persona se acerca, la silla toca el borde inferior y la caja diminuta se ignora.
+    self.assertEqual(state, ((0, 0, 2), (56, 1, 1)))
+    self.assertEqual(hazard_state(self.objects(), approaching=np.array([], dtype=bool)), ())
+
+  def test_monitor_publishes_only_confirmed_changes(self):
+    monitor = HazardMonitor(confirm_frames=2)
+    person, chair = ((0, 1, 0),), ((56, 1, 1),)
+
+    self.assertEqual([monitor.update(state) for state in (person, person, person)], [False, True, False])
+    # Un frame aislado con otro estado no cambia nada.
+    self.assertEqual([monitor.update(state) for state in (chair, person, chair, chair)], [False, False, False, True])
+    self.assertEqual(monitor.state, chair)
+
+
+class AdaptiveStreamControllerTests(SimpleTestCase):
+  def controller(self, **kwargs):
+    return AdaptiveStreamController(
+      levels=((320, 50), (640, 70), (1280, 80)), start_level=1, start_interval_ms=200, **kwargs
+    )
+
+  def test_overload_sends_fewer_and_smaller_frames(self):
+    controller = self.controller(target_latency_ms=100)
+    controller.observe(0.12)
+    self.assertEqual(controller.update(queue_depth=0), {'max_side': 320, 'jpeg_quality': 50, 'frame_interval_ms': 300})
+
+    controller.observe(0.05)
+    self.assertEqual(controller.update(queue_depth=20)['frame_interval_ms'], 450)
+
+  def test_healthy_windows_recover_additively(self):
+    controller = self.controller(increase_ms=20, upgrade_after=2, min_interval_ms=150)
+    targets = []
+    for _ in range(4):
+      controller.observe(0.02)
+      targets.append(controller.update(queue_depth=0))
+
+    self.assertEqual([t and t['frame_interval_ms'] for t in targets], [180, 160, 150, None])
+    self.assertEqual(controller.targets()['max_side'], 1280)
+    # Sin frames nuevos en la ventana no hay nada que ajustar.
+    self.assertIsNone(controller.update(queue_depth=0))
+
+  def test_interval_never_below_measured_detection_time(self):
+    controller = self.controller(target_latency_ms=500, min_interval_ms=50)
+    controller.observe(0.4)
+    self.assertEqual(controller.update(queue_depth=0)['frame_interval_ms'], 400)
+
+
+class CompactYoloContextTests(SimpleTestCase):
+  names = {0: 'persona', 1: 'silla', 2: 'mesa'}
+
+  def test_one_line_per_frame_with_zone_keys(self):
+    detections = np.array([
+      [0, 0, 50, 10, 0.9, 0],
+      [130, 0, 170, 10, 0.9, 1],
+      [140, 0, 160, 10, 0.9, 2],
+    ], dtype=np.float32)
+    objects = assign_zones(detections, frame_width=300, frame_height=100)
+    empty = assign_zones(np.empty((0, 6), dtype=np.float32), frame_width=300, frame_height=100)
+
+    self.assertEqual(
+      compact_yolo_context([objects, empty], self.names),
+      "F1 I:persona C:silla,mesa D:-\nF2 I:- C:- D:-",
+    )
+
+
+class FrameChangeGateTests(SimpleTestCase):
+  def setUp(self):
+    self.reference = np.full((90, 160), 100, dtype=np.uint8)
+
+  def test_first_cycle_runs_full_pipeline(self):
+    self.assertEqual(FrameChangeGate().decide(self.reference), GATE_FULL)
+
+  def test_decision_follows_difference(self):
+    gate = FrameChangeGate(static_threshold=3, yolo_threshold=10, max_skips=10)
+    gate.commit(self.reference)
+
+    self.assertEqual(gate.decide(self.reference + 1), GATE_REEMIT)
+    self.assertEqual(gate.decide(self.reference + 5), GATE_YOLO)
+    self.assertEqual(gate.decide(self.reference + 50), GATE_FULL)
+
+  def test_forces_full_cycle_after_max_skips(self):
+    gate = FrameChangeGate(max_skips=2)
+    gate.commit(self.reference)
+
+    self.assertEqual([gate.decide(self.reference) for _ in range(3)], [GATE_REEMIT, GATE_REEMIT, GATE_FULL])
+    gate.commit(self.reference)
+    self.assertEqual(gate.decide(self.reference), GATE_REEMIT)
+
+
+class SceneInstructionCacheTests(SimpleTestCase):
+  zones = ((1, 0),)
+
+  def test_near_duplicate_scene_hits_user_cache(self):
+    cache = SceneInstructionCache(max_distance=4)
+    cache.put('user-1', self.zones, 0b1111, "Cuidado con la persona del centro.")
+
+    self.assertEqual(cache.get('user-1', self.zones, 0b0111), "Cuidado con la persona del centro.")
+    self.assertIsNone(cache.get('user-1', ((0, 0),), 0b1111))
+    self.assertEqual((cache.user_hits, cache.misses), (1, 1))
+
+  def test_other_users_fall_back_to_global_cache(self):
+    cache = SceneInstructionCache(max_distance=0)
+    cache.put('user-1', self.zones, 42, "Gire a la derecha, pared al frente.")
+
+    self.assertEqual(cache.get('user-2', self.zones, 42), "Gire a la derecha, pared al frente.")
+    self.assertIsNone(cache.get('user-2', self.zones, 43))
+    self.assertEqual(cache.stats()['global_hits'], 1)
+
+  def test_entries_expire_and_are_evicted(self):
+    cache = SceneInstructionCache(ttl=5, user_entries=1, global_entries=1)
+    with mock.patch('intelligent_assistant.scene_cache.time.monotonic', return_value=100):
+      cache.put('user-1', self.zones, 1, "a")
+      cache.put('user-1', self.zones, 2 ** 40 - 1, "b")
+      self.assertIsNone(cache.get('user-1', self.zones, 1))
+    with mock.patch('intelligent_assistant.scene_cache.time.monotonic', return_value=106):
+      self.assertIsNone(cache.get('user-1', self.zones, 2 ** 40 - 1))
+
+
+class TextResultCacheTests(SimpleTestCase):
+  def setUp(self):
+    self.cache = TextResultCache(LocMemCache('text-reader-tests', {}), max_distance=24)
+
+  def sign(self, text, brightness=0, shift=0):
+    image = np.full((480, 640, 3), 230, dtype=np.uint8)
+    cv2.putText(image, text, (40 + shift, 260), cv2.FONT_HERSHEY_SIMPLEX, 3, (20, 20, 20), 8)
+    image = cv2.add(image, np.full_like(image, brightness))
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+  def test_near_duplicate_capture_hits(self):
+    self.cache.put(text_image_hash(self.sign("SALIDA")), "Salida")
+
+    self.assertEqual(self.cache.get(text_image_hash(self.sign("SALIDA", brightness=15, shift=3))), "Salida")
+
+  def test_different_text_misses(self):
+    self.cache.put(text_image_hash(self.sign("SALIDA")), "Salida")
+
+    self.assertIsNone(self.cache.get(text_image_hash(self.sign("BANO"))))
+
+  def test_any_hash_within_max_distance_shares_a_band(self):
+    image_hash = text_image_hash(self.sign("SALIDA"))
+    self.cache.put(image_hash, "Salida")
+
+    flipped = image_hash
+    for bit in range(0, 256, 10)[:24]:
+      flipped ^= 1 << bit
+    self.assertEqual(self.cache.get(flipped), "Salida")
+    self.assertIsNone(self.cache.get(flipped ^ (1 << 255)))
+
+
+@override_settings(GEMINI_API_KEY='clave-de-prueba')
+class TextReaderViewTests(SimpleTestCase):
+  """
+  Lector de texto por HTTP con un usuario autenticado simulado, Gemini
+  sustituido por un modelo falso y una caché de resultados propia.
+  """
+
+  def setUp(self):
+    self.url = reverse('auth_api:intelligent_assistant:text_reader')
+    self.jpeg = cv2.imencode('.jpg', np.full((120, 160, 3), 200, dtype=np.uint8))[1].tobytes()
+    self.model = mock.Mock()
+    self.model.generate_content.return_value = mock.Mock(text=" Salida de emergencia \n")
+    self.model_threads = []
+
+    def build_model(name):
+      self.model_threads.append(threading.current_thread())
+      return self.model
+
+    # LocMemCache comparte el almacenamiento entre instancias con el mismo nombre.
+    cache = LocMemCache('text-reader-view-tests', {})
+    cache.clear()
+    gateway = GeminiGateway(max_in_flight=1)
+    catalog = mock.Mock()
+    catalog.resolve.side_effect = lambda name: name
+    for patcher in (
+      mock.patch('django.contrib.auth.middleware.get_user', return_value=mock.Mock(is_authenticated=True)),
+      mock.patch.object(views, 'gemini_gateway', gateway),
+      mock.patch.object(gateway, 'model', side_effect=build_model),
+      mock.patch.object(views, 'model_catalog', catalog),
+      mock.patch.object(views, 'local_ocr', None),
+      mock.patch.object(views, 'text_result_cache', TextResultCache(cache)),
+    ):
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def post(self, *args, **kwargs):
+    response = asyncio.run(self.async_client.post(self.url, *args, **kwargs))
+    self.assertEqual(response.status_code, 200, response.content)
+    return response.json()
+
+  def test_multipart_upload(self):
+    upload = SimpleUploadedFile('cartel.jpg', self.jpeg, content_type='image/jpeg')
+
+    self.assertEqual(self.post({'image': upload}), {'text': 'Salida de emergencia', 'cached': False, 'source': 'gemini'})
+
+  def test_raw_body(self):
+    self.assertEqual(self.post(self.jpeg, content_type='image/jpeg')['text'], 'Salida de emergencia')
+
+  def test_base64_json_body(self):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(self.jpeg).decode()
+
+    body = self.post(json.dumps({'image_data': data_url}), content_type='application/json')
+
+    self.assertEqual(body['text'], 'Salida de emergencia')
+
+  def test_repeated_image_is_served_from_the_cache(self):
+    self.post(self.jpeg, content_type='image/jpeg')
+    body = self.post(self.jpeg, content_type='image/jpeg')
+
+    self.assertEqual((body['text'], body['cached']), ('Salida de emergencia', True))
+    self.assertIn('lookup_ms', body)
+    self.model.generate_content.assert_called_once()
+
+  def test_model_is_built_off_the_event_loop(self):
+    self.post(self.jpeg, content_type='image/jpeg')
+
+    # asyncio.run ejecuta el event loop en el hilo principal; el modelo se construye en otro hilo.
+    self.assertEqual(len(self.model_threads), 1)
+    self.assertIsNot(self.model_threads[0], threading.main_thread())
+
+
+class NormalizeImageTests(SimpleTestCase):
+  def encode(self, image, orientation=None, format='JPEG'):
+    exif = image.getexif()
+    if orientation:
+      exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format, exif=exif)
+    buffer.seek(0)
+    return buffer
+
+  def test_downscales_to_max_edge_and_applies_exif_rotation(self):
+    source = self.encode(Image.new('RGB', (4000, 3000), (200, 200, 200)), orientation=6)
+
+    normalized = Image.open(io.BytesIO(normalize_image(source, max_edge=1600)))
+
+    self.assertEqual(normalized.format, 'JPEG')
+    self.assertEqual(normalized.size, (1200, 1600))
+
+  def test_small_png_is_reencoded_without_upscaling(self):
+    source = self.encode(Image.new('RGBA', (300, 200), (0, 0, 0, 0)), format='PNG')
+
+    normalized = Image.open(io.BytesIO(normalize_image(source, max_edge=1600)))
+
+    self.assertEqual((normalized.format, normalized.mode, normalized.size), ('JPEG', 'RGB', (300, 200)))
+
+  def test_invalid_data_raises_value_error(self):
+    with self.assertRaises(ValueError):
+      normalize_image(io.BytesIO(b'no es una imagen'))
+
+
+class LocalOCRTests(SimpleTestCase):
+  def sign(self, *lines):
+    image = np.full((480, 640), 235, dtype=np.uint8)
+    for i, line in enumerate(lines):
+      cv2.putText(image, line, (40, 140 + 100 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 25, 3)
+    return image
+
+  def test_finds_text_lines_in_reading_order(self):
+    regions = find_text_regions(self.sign("PROHIBIDO", "EL PASO"))
+
+    self.assertGreaterEqual(len(regions), 2)
+    self.assertEqual([box[2] for box in regions], sorted(box[2] for box in regions))
+
+  def test_scenes_without_text_have_no_regions(self):
+    self.assertEqual(find_text_regions(np.full((480, 640), 128, dtype=np.uint8)), [])
+    noise = np.random.RandomState(0).randint(0, 255, (480, 640)).astype(np.uint8)
+    self.assertEqual(find_text_regions(noise), [])
+
+  def test_confidence_is_weighted_by_line_length(self):
+    text, confidence = combine_lines([(None, "SALIDA DE EMERGENCIA", 0.9), (None, "2", 0.1), (None, " ", 0.0)])
+
+    self.assertEqual(text, "SALIDA DE EMERGENCIA 2")
+    self.assertAlmostEqual(confidence, (20 * 0.9 + 0.1) / 21)
+
+  def test_low_confidence_defers_to_gemini(self):
+    image_bytes = cv2.imencode('.jpg', self.sign("PROHIBIDO EL PASO"))[1].tobytes()
+    ocr = LocalOCR(min_confidence=0.8)
+    ocr._reader = mock.Mock()
+
+    ocr._reader.recognize.return_value = [(None, "PROHIBIDO EL PASO", 0.95)]
+    self.assertEqual(ocr.read(image_bytes)[0], "PROHIBIDO EL PASO")
+
+    ocr._reader.recognize.return_value = [(None, "PR0H1B", 0.4)]
+    self.assertIsNone(ocr.read(image_bytes)[0])
+
+
+class MetricsTests(SimpleTestCase):
+  def registry(self, *latencies, drops=0):
+    registry = MetricsRegistry()
+    stage = registry.histogram('stage_seconds', "Etapas", buckets=(0.01, 0.1, 1.0))
+    for latency in latencies:
+      stage.observe(latency, stage='yolo')
+    registry.counter('dropped_total', "Descartes").inc(drops, reason='queue_full')
+    return registry
+
+  def test_quantiles_interpolate_within_buckets(self):
+    self.assertAlmostEqual(histogram_quantile(0.5, [0.01, 0.1, 1.0], [0, 4, 0, 0]), 0.055)
+    self.assertEqual(histogram_quantile(0.99, [0.01, 0.1, 1.0], [0, 0, 0, 3]), 1.0)
+    self.assertIsNone(histogram_quantile(0.5, [0.01], [0, 0]))
+
+  def test_workers_are_merged_and_rendered(self):
+    first = self.registry(0.005, 0.05, drops=2).snapshot()
+    second = self.registry(0.5, drops=1).snapshot()
+    text = render_prometheus(merge_snapshots([first, second]))
+
+    self.assertIn('# TYPE stage_seconds histogram', text)
+    self.assertIn('stage_seconds_bucket{stage="yolo",le="0.1"} 2', text)
+    self.assertIn('stage_seconds_bucket{stage="yolo",le="+Inf"} 3', text)
+    self.assertIn('stage_seconds_count{stage="yolo"} 3', text)
+    self.assertIn('stage_seconds_quantile{stage="yolo",quantile="0.5"}', text)
+    self.assertIn('dropped_total{reason="queue_full"} 3', text)
+
+  def test_stale_worker_files_are_discarded(self):
+    current = self.registry(0.05).snapshot()
+    with tempfile.TemporaryDirectory() as directory:
+      alive = {**self.registry(0.05).snapshot(), 'pid': os.getppid()}
+      dead = {**self.registry(0.05).snapshot(), 'pid': 2 ** 22 + 1}
+      write_snapshot(os.path.join(directory, 'alive.json'), alive)
+      write_snapshot(os.path.join(directory, 'dead.json'), dead)
+
+      snapshots = read_snapshots(directory, current)
+      self.assertEqual(sorted(snapshot['pid'] for snapshot in snapshots), sorted([current['pid'], os.getppid()]))
+      self.assertEqual(os.listdir(directory), ['alive.json'])
+
+  def test_collectors_are_sampled_on_export(self):
+    registry = MetricsRegistry()
+    queue = [1, 2]
+    registry.register_collector(lambda: [Sample('queue_depth', 'gauge', "Cola", {}, len(queue))])
+    queue.append(3)
+    self.assertEqual(registry.snapshot()['metrics']['queue_depth']['series'], [[{}, 3]])
+
+
+class TracingTests(SimpleTestCase):
+  def format(self, record, output='json'):
+    CorrelationFilter().filter(record)
+    return StructuredFormatter(output=output).format(record)
+
+  def test_spans_nest_and_feed_histograms(self):
+    stage = MetricsRegistry().histogram('stage_seconds', "Etapas")
+    with span('cycle', stage, stage='cycle') as cycle:
+      with span('yolo') as yolo:
+        record = logging.makeLogRecord({'name': 'test', 'msg': "dentro", 'levelno': logging.INFO, 'levelname': 'INFO'})
+        entry = json.loads(self.format(record))
+
+    self.assertEqual(yolo.path, 'cycle/yolo')
+    self.assertEqual(entry['span'], 'cycle/yolo')
+    self.assertGreaterEqual(cycle.seconds, yolo.seconds)
+    self.assertEqual(sum(stage.series()[0][1]['counts']), 1)
+
+  def test_correlation_ids_reach_tasks_and_extra_fields(self):
+    async def cycle():
+      with correlation(cycle='c1'):
+        return await asyncio.create_task(emit())
+
+    async def emit():
+      # El filtro se aplica al emitir el registro, dentro de la tarea.
+      record = logging.makeLogRecord({'name': 'test', 'msg': "instrucción", 'levelno': logging.INFO, 'total_ms': 42})
+      CorrelationFilter().filter(record)
+      return record
+
+    with correlation(connection='k1'):
+      record = asyncio.run(cycle())
+    entry = json.loads(StructuredFormatter().format(record))
+    self.assertEqual((entry['connection'], entry['cycle'], entry['total_ms']), ('k1', 'c1', 42))
+    self.assertIn('connection=k1 cycle=c1 total_ms=42', StructuredFormatter(output='text').format(record))
+
+  def test_profiles_one_in_every_n_runs(self):
+    with tempfile.TemporaryDirectory() as directory:
+      sampler = ProfileSampler(every=2, directory=directory)
+      for index in range(4):
+        with correlation(cycle=f"c{index}"), sampler.profile('cycle'):
+          sum(range(1000))
+
+      profiles = sorted(os.listdir(directory))
+      self.assertEqual(len(profiles), 2)
+      self.assertTrue(profiles[0].startswith('cycle-') and profiles[0].endswith('-c1.prof'))
+
+  def test_registration_never_logs_passwords(self):
+    request = RequestFactory().post(
+      reverse('auth_api:register'),
+      {'password2': 'secreta-123', 'password1': 'secreta-123'},
+      HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+    )
+    request.user = AnonymousUser()
+    with self.assertLogs('auth_api', level='DEBUG') as logs:
+      response = RegisterView.as_view()(request)
+
+    self.assertEqual(json.loads(response.content), {'password2': 'valid'})
+    self.assertNotIn('secreta', ''.join(logs.output))
+
+
+class BenchmarkPipelineTests(SimpleTestCase):
+  def test_latency_distributions(self):
+    self.assertEqual(LatencyDistribution.parse('fixed:800').sample(), 0.8)
+    uniform = LatencyDistribution.parse('uniform:100,200', seed=1)
+    self.assertTrue(all(0.1 <= uniform.sample() <= 0.2 for _ in range(50)))
+    self.assertEqual(
+      [LatencyDistribution.parse('lognormal:700,0.3', seed=3).sample() for _ in range(2)],
+      [LatencyDistribution.parse('lognormal:700,0.3', seed=3).sample() for _ in range(2)],
+    )
+    self.assertGreaterEqual(LatencyDistribution.parse('normal:1,100', seed=0).sample(), 0)
+    for spec in ('gauss:1,2', 'fixed', 'uniform:1', 'normal:a,b'):
+      with self.assertRaises(ValueError):
+        LatencyDistribution.parse(spec)
+
+  def test_stub_gemini_streams_the_instruction(self):
+    model = StubGeminiModel(LatencyDistribution.parse('fixed:0'))
+    chunks = [chunk.text for chunk in model.generate_content([], stream=True)]
+    self.assertEqual(''.join(chunks), model.generate_content([]).text)
+    self.assertEqual(len(chunks), 2)
+
+  def test_regressions_against_a_baseline(self):
+    baseline = {'throughput': {'cycles_per_second': 10.0}, 'cycle_latency': {'p50_ms': 100.0, 'p95_ms': 200.0}}
+    current = {'throughput': {'cycles_per_second': 9.5}, 'cycle_latency': {'p50_ms': 130.0, 'p95_ms': 190.0}}
+
+    lines, regressions = compare_results(current, baseline, max_regression=10)
+    self.assertEqual(regressions, ['cycle_latency.p50_ms'])
+    self.assertIn('throughput.cycles_per_second: 10.0 -> 9.5 (-5.0 %)', lines)
+    self.assertEqual(compare_results(current, baseline, max_regression=None)[1], [])
+
+
+class StartupImportTests(SimpleTestCase):
+  # Arrancar la aplicación ASGI o `manage.py check` no debe cargar OpenCV, easyocr ni los modelos.
+
+  def test_asgi_import_skips_heavy_modules(self):
+    code = (
+      "import sys, PathFinder_AI.asgi; "
+      f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    completed = subprocess.run(
+      [sys.executable, '-c', code],
+      cwd=settings.BASE_DIR,
+      env={
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'PathFinder_AI.settings',
+        'AI_MODELS_EAGER_LOAD': 'False',
+        # Sin clave no se arranca el catálogo, que importa google.generativeai en segundo plano.
+        'GEMINI_API_KEY': '',
+      },
+      capture_output=True,
+      text=True,
+      timeout=60,
+    )
+
+    self.assertEqual(completed.returncode, 0, completed.stderr)
+    self.assertEqual(completed.stdout.strip(), '')
+
+
+class ModelRegistryTests(SimpleTestCase):
+  def test_loads_and_warms_up_once_on_first_use(self):
+    loads, warmups = [], []
+    registry = ModelRegistry()
+    registry.register('yolo', lambda: loads.append(1) or 'modelo', warmup=warmups.append)
+
+    self.assertEqual(registry.status()['models']['yolo']['state'], STATE_IDLE)
+    self.assertEqual(asyncio.run(registry.aget('yolo')), 'modelo')
+    self.assertEqual(registry.get('yolo'), 'modelo')
+    self.assertEqual((loads, warmups), ([1], ['modelo']))
+    self.assertIn('warmup_seconds', registry.status()['models']['yolo'])
+
+  def test_failed_load_is_reported_and_retried(self):
+    attempts = []
+
+    def loader():
+      attempts.append(1)
+      if len(attempts) == 1:
+        raise RuntimeError("sin pesos")
+      return 'modelo'
+
+    registry = ModelRegistry()
+    registry.register('yolo', loader)
+    with self.assertRaises(RuntimeError):
+      registry.get('yolo')
+    self.assertEqual(registry.status()['models']['yolo'], {'state': STATE_FAILED, 'error': "sin pesos"})
+    self.assertFalse(registry.is_ready())
+
+    self.assertEqual(registry.get('yolo'), 'modelo')
+    self.assertTrue(registry.is_ready())
+
+  def test_eager_mode_is_ready_only_when_everything_loaded(self):
+    release = threading.Event()
+    registry = ModelRegistry()
+    registry.register('gemini', lambda: 'modelo')
+    registry.register('yolo', lambda: release.wait(5) and 'modelo')
+
+    self.assertTrue(registry.is_ready())
+    registry.load_all(background=True)
+    self.assertFalse(registry.is_ready())
+    release.set()
+    registry.load_all()
+    self.assertEqual(
+      {name: model['state'] for name, model in registry.status()['models'].items()},
+      {'gemini': STATE_READY, 'yolo': STATE_READY},
+    )
+    self.assertTrue(registry.is_ready())
+
+
+class ObstacleDetectionViewTests(SimpleTestCase):
+
+  def render(self):
+    request = RequestFactory().get('/')
+    request.user = mock.Mock(is_authenticated=True)
+    response = ObstacleDetectionView.as_view()(request)
+    return response.render().content.decode()
+
+  def test_cycle_mode_is_the_default(self):
+    self.assertIn('const CONTINUOUS_MODE = false;', self.render())
+
+  def test_continuous_mode_is_opt_in(self):
+    with self.settings(OBSTACLE_CONTINUOUS_MODE=True):
+      self.assertIn('const CONTINUOUS_MODE = true;', self.render())
+
+
+class PoolStubDetector:
+  # Detector de los procesos del pool en las pruebas: el primer píxel decide el comportamiento.
+  names = {0: 'persona'}
+
+  def __call__(self, images):
+    marker = int(images[0][0, 0, 0])
+    if marker == 255:
+      os._exit(1)
+    if marker == 128:
+      time.sleep(1.0)
+    return [np.array([[0, 0, 1, 1, image.mean(), 0]], dtype=np.float32) for image in images]
+
+
+def load_pool_stub_detector(weights, task):
+  return PoolStubDetector()
+
+
+class InferenceWorkerPoolTests(SimpleTestCase):
+  def pool(self, **kwargs):
+    # fork: los procesos heredan el detector de prueba sin volver a importar este módulo.
+    pool = InferenceWorkerPool(
+      'stub.pt', 1, max_frame_size=(8, 8), slots=2, load_detector=load_pool_stub_detector,
+      start_method='fork', **kwargs,
+    )
+    self.addCleanup(pool.close)
+    return pool
+
+  def test_shared_ring_round_trip(self):
+    ring = SharedFrameRing(1, 8 * 8 * 3)
+    self.addCleanup(ring.close)
+    slot = ring.acquire(timeout=0)
+    image = np.arange(48, dtype=np.uint8).reshape(4, 4, 3)
+    shape = ring.write(slot, image)
+    np.testing.assert_array_equal(np.ndarray(shape, dtype=np.uint8, buffer=ring.segments[slot].buf), image)
+
+    with self.assertRaises(TimeoutError):
+      ring.acquire(timeout=0)
+    with self.assertRaises(ValueError):
+      ring.write(slot, np.zeros((10, 10, 3), dtype=np.uint8))
+    ring.release(slot)
+    self.assertEqual(ring.acquire(timeout=0), slot)
+
+  def test_frames_round_trip_through_the_workers(self):
+    pool = self.pool(timeout=10)
+    images = [np.full((8, 8, 3), value, dtype=np.uint8) for value in (10, 20)]
+
+    detections = pool(images)
+    self.assertEqual([float(result[0, 4]) for result in detections], [10.0, 20.0])
+    self.assertEqual(pool.names, {0: 'persona'})
+    self.assertEqual(pool.ring._free.qsize(), 2)
+
+  def test_slots_stay_reserved_until_the_worker_replies(self):
+    pool = self.pool(timeout=0.3, hang_timeout=10)
+    pool([np.zeros((8, 8, 3), dtype=np.uint8)])
+
+    with self.assertRaises(TimeoutError):
+      pool([np.full((8, 8, 3), 128, dtype=np.uint8)])
+    # El worker sigue leyendo la ranura: no puede volver a la lista de libres todavía.
+    self.assertEqual(pool.ring._free.qsize(), 1)
+
+    deadline = time.monotonic() + 5
+    while pool.ring._free.qsize() < 2 and time.monotonic() < deadline:
+      time.sleep(0.05)
+    self.assertEqual(pool.ring._free.qsize(), 2)
+
+  def test_dead_workers_are_replaced(self):
+    pool = self.pool(timeout=10)
+    with self.assertRaisesRegex(RuntimeError, 'terminó inesperadamente'):
+      pool([np.full((8, 8, 3), 255, dtype=np.uint8)])
+
+    self.assertEqual(pool.restarts, 1)
+    self.assertEqual(pool.ring._free.qsize(), 2)
+    self.assertEqual(len(pool([np.zeros((8, 8, 3), dtype=np.uint8)])), 1)
+
+
+class FrameUploaderTests(SimpleTestCase):
+  def test_uploads_to_local_store_in_background(self):
+    with tempfile.TemporaryDirectory() as root:
+      uploader = FrameUploader(LocalFrameStore(root, 'http://testserver/media/'))
+
+      url = uploader.submit(b'jpeg').result(timeout=5)
+
+      self.assertTrue(url.startswith('http://testserver/media/frames/'))
+      with open(os.path.join(root, url.removeprefix('http://testserver/media/')), 'rb') as f:
+        self.assertEqual(f.read(), b'jpeg')
+
+  def test_retries_failed_uploads(self):
+    store = mock.Mock()
+    store.put.side_effect = [RuntimeError("timeout"), 'https://bucket/frame.jpg']
+    uploader = FrameUploader(store, max_retries=1, retry_backoff=0)
+
+    self.assertEqual(uploader.submit(b'jpeg').result(timeout=5), 'https://bucket/frame.jpg')
+    self.assertEqual(store.put.call_count, 2)
+
+  def test_full_queue_rejects_instead_of_blocking(self):
+    uploader = FrameUploader(mock.Mock(), max_queue=1, workers=0)
+
+    uploader.submit(b'first')
+
+    with self.assertRaises(UploadQueueFull):
+      uploader.submit(b'second').result(timeout=0)
+
+  def test_workers_upload_concurrently_one_frame_each(self):
+    release = threading.Event()
+    uploading = []
+
+    def put(key, body):
+      uploading.append(body)
+      release.wait(5)
+      return f"https://bucket/{key}"
+
+    store = mock.Mock()
+    store.put.side_effect = put
+    uploader = FrameUploader(store, workers=2)
+
+    futures = [uploader.submit(body) for body in (b'a', b'b', b'c')]
+    deadline = time.monotonic() + 5
+    while len(uploading) < 2 and time.monotonic() < deadline:
+      time.sleep(0.01)
+    time.sleep(0.05)
+
+    # Dos subidas en curso (una por hilo) y el tercer frame sigue en la cola para el primero que quede libre.
+    self.assertEqual((sorted(uploading), uploader.pending()), ([b'a', b'b'], 1))
+    release.set()
+    self.assertTrue(all(future.result(timeout=5).startswith('https://bucket/frames/') for future in futures))
+
+
+class GeminiStreamingTests(SimpleTestCase):
+  def collect(self, model):
+    async def run():
+      gateway = GeminiGateway(max_in_flight=1)
+      return [text async for text in stream_text(model, ['prompt'], gateway)]
+    return asyncio.run(run())
+
+  def test_yields_chunks_in_order_and_skips_empty_ones(self):
+    model = mock.Mock()
+    model.generate_content.return_value = iter([
+      mock.Mock(text="Cuidado con las escaleras,"),
+      mock.Mock(text=""),
+      mock.Mock(text=" suba con cuidado."),
+    ])
+
+    self.assertEqual(self.collect(model), ["Cuidado con las escaleras,", " suba con cuidado."])
+    self.assertTrue(model.generate_content.call_args.kwargs['stream'])
+
+  def test_propagates_sdk_errors(self):
+    model = mock.Mock()
+    model.generate_content.side_effect = TimeoutError("deadline")
+
+    with self.assertRaises(TimeoutError):
+      self.collect(model)
+
+
+class GeminiGatewayTests(SimpleTestCase):
+  def test_navigation_goes_before_queued_text_reading(self):
+    gateway = GeminiGateway(max_in_flight=1)
+    release = threading.Event()
+    order = []
+
+    blocker = gateway.submit(release.wait, 5)
+    text = gateway.submit(order.append, 'texto', priority=PRIORITY_TEXT_READER)
+    navigation = gateway.submit(order.append, 'navegación', priority=PRIORITY_NAVIGATION)
+    release.set()
+
+    for future in (blocker, text, navigation):
+      future.result(timeout=5)
+    self.assertEqual(order, ['navegación', 'texto'])
+
+  def test_token_bucket_limits_burst(self):
+    gateway = GeminiGateway(rate_per_minute=60, burst=1, max_wait=0.2)
+    first = gateway.submit(lambda: 'ok')
+    second = gateway.submit(lambda: 'ok')
+
+    self.assertEqual(first.result(timeout=5), 'ok')
+    with self.assertRaises(GeminiUnavailable):
+      second.result(timeout=5)
+
+  def test_circuit_opens_after_degraded_failures_and_fails_fast(self):
+    gateway = GeminiGateway(failure_threshold=2, reset_timeout=60)
+
+    def overloaded():
+      raise TimeoutError("deadline")
+
+    for _ in range(2):
+      with self.assertRaises(TimeoutError):
+        gateway.submit(overloaded).result(timeout=5)
+
+    fn = mock.Mock()
+    with self.assertRaises(GeminiUnavailable):
+      gateway.submit(fn).result(timeout=0)
+    fn.assert_not_called()
+
+  def test_half_open_trial_closes_the_circuit(self):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record(True, now=0)
+    self.assertFalse(breaker.allow(now=5))
+
+    self.assertTrue(breaker.allow(now=11))
+    self.assertFalse(breaker.allow(now=11))
+    breaker.record(False, now=12)
+    self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+  def test_cancelled_half_open_trial_does_not_block_the_circuit(self):
+    gateway = GeminiGateway(failure_threshold=1, reset_timeout=60)
+
+    def overloaded():
+      raise TimeoutError("deadline")
+
+    with self.assertRaises(TimeoutError):
+      gateway.submit(overloaded).result(timeout=5)
+    gateway.breaker.opened_at -= 60
+
+    # Con el lock tomado el dispatcher no puede despachar: la prueba se cancela en la cola.
+    with gateway._cond:
+      trial = gateway.submit(mock.Mock())
+      self.assertTrue(trial.cancel())
+
+    self.assertEqual(gateway.submit(lambda: 'ok').result(timeout=5), 'ok')
+    self.assertEqual(gateway.breaker.state, CircuitBreaker.CLOSED)
+
+
+class ModelCatalogTests(SimpleTestCase):
+  def catalog(self, *names):
+    models = []
+    for name, methods in names:
+      model = mock.Mock(supported_generation_methods=methods)
+      model.name = name
+      models.append(model)
+    genai = mock.Mock()
+    genai.list_models.return_value = models
+    gateway = mock.Mock()
+    gateway.configure.return_value = genai
+    catalog = ModelCatalog(gateway, refresh_interval=0)
+    catalog.refresh()
+    return catalog
+
+  def test_keeps_available_model_and_ignores_non_generative_ones(self):
+    catalog = self.catalog(
+      ('models/gemini-2.5-flash', ['generateContent']),
+      ('models/embedding-001', ['embedContent']),
+    )
+    self.assertEqual(catalog.models, {'gemini-2.5-flash'})
+    self.assertEqual(catalog.resolve('gemini-2.5-flash'), 'gemini-2.5-flash')
+
+  def test_missing_model_keeps_configured_name_and_warns_once(self):
+    catalog = self.catalog(
+      ('models/gemini-2.0-flash', ['generateContent']),
+      ('models/gemini-3.0-flash', ['generateContent']),
+    )
+    with self.assertLogs('intelligent_assistant.gemini', level='WARNING') as logs:
+      self.assertEqual(catalog.resolve('gemini-2.5-flash'), 'gemini-2.5-flash')
+      self.assertEqual(catalog.resolve('gemini-2.5-flash'), 'gemini-2.5-flash')
+    self.assertEqual(len(logs.output), 1)
+
+  def test_unknown_catalog_keeps_requested_name(self):
+    self.assertEqual(ModelCatalog(mock.Mock()).resolve('gemini-2.5-flash'), 'gemini-2.5-flash')
+
+
+class DetectorBackendParityTests(SimpleTestCase):
+  """
+  Los backends exportados (ONNX Runtime, OpenVINO) deben producir las mismas
+  etiquetas por zona que los pesos PyTorch del modelo de solo detección.
+  """
+
+  task = 'detect'
+
+  def setUp(self):
+    if importlib.util.find_spec('ultralytics') is None:
+      self.skipTest("ultralytics no está instalado.")
+    self.image = cv2.imread(FIXTURE_IMAGE, cv2.IMREAD_COLOR)
+
+  def load_detector(self, backend):
+    weights = resolve_weights(settings.YOLO_MODELS_DIR, settings.YOLO_MODEL_NAME, backend, self.task)
+    if not os.path.exists(weights):
+      self.skipTest(f"No existen los pesos {weights} (python manage.py export_yolo --backend {backend}).")
+    return LocalDetector(load_yolo(weights, self.task))
+
+  def assert_parity(self, backend):
+    reference = labels_by_zone(self.load_detector('pytorch'), self.image)
+    self.assertTrue(reference, "La imagen de referencia debería contener detecciones.")
+    self.assertEqual(labels_by_zone(self.load_detector(backend), self.image), reference)
+
+  def test_onnx_matches_pytorch(self):
+    self.assert_parity('onnx')
+
+  def test_openvino_matches_pytorch(self):
+    self.assert_parity('openvino')
@@ -0,0 +1,87 @@
+import numpy as np
+
+from .frames import decode_frame, hash_distance
+
+# pHash de 256 bits (DCT 16x16). Un dHash de 64 bits apenas distingue dos carteles
+# con la misma maquetación: el fondo uniforme aporta bits constantes. Los
+# coeficientes de la DCT comparados con su mediana reparten los bits por igual.
+TEXT_HASH_SIZE = 16
+TEXT_HASH_BITS = TEXT_HASH_SIZE ** 2
+
+
+def text_image_hash(image_bytes):
+  import cv2
+
+  gray = decode_frame(image_bytes, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+  small = cv2.resize(gray, (4 * TEXT_HASH_SIZE, 4 * TEXT_HASH_SIZE), interpolation=cv2.INTER_AREA)
+  coefficients = cv2.dct(small.astype(np.float32))[:TEXT_HASH_SIZE, :TEXT_HASH_SIZE].flatten()
+  # El coeficiente DC (brillo medio) se deja fuera para no depender de la exposición.
+  bits = coefficients > np.median(coefficients[1:])
+  bits[0] = False
+  return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class TextResultCache:
+  """
+  Resultados del lector de texto por hash perceptual de la imagen, sobre el
+  framework de caché de Django (memoria local, ficheros, Redis...), de modo
+  que se puede compartir entre workers. El TTL es el timeout de cada entrada
+  y el desalojo LRU lo hace el backend (p. ej. MAX_ENTRIES de LocMemCache).
+
+  Para buscar casi-duplicados sin recorrer la caché, el hash se divide en
+  `max_distance + 1` bandas: dos hashes a `max_distance` bits o menos
+  coinciden por completo en al menos una banda. Cada banda guarda los hashes
+  recientes que la contienen y solo esos candidatos se comparan.
+  """
+
+  def __init__(self, cache, max_distance=24, ttl=3600, candidates_per_band=16, prefix="text_reader",
+               bits=TEXT_HASH_BITS):
+    self.cache = cache
+    self.max_distance = max_distance
+    self.ttl = ttl
+    self.candidates_per_band = candidates_per_band
+    self.prefix = prefix
+    bands = max_distance + 1
+    edges = [bits * i // bands for i in range(bands + 1)]
+    self._bands = list(zip(edges[:-1], edges[1:]))
+
+  def _band_keys(self, image_hash):
+    keys = []
+    for index, (start, end) in enumerate(self._bands):
+      value = (image_hash >> start) & ((1 << (end - start)) - 1)
+      keys.append(f"{self.prefix}:band:{index}:{value:x}")
+    return keys
+
+  def _result_key(self, image_hash):
+    return f"{self.prefix}:result:{image_hash:x}"
+
+  def get(self, image_hash):
+    candidates = set()
+    for hashes in self.cache.get_many(self._band_keys(image_hash)).values():
+      candidates.update(hashes)
+
+    near = sorted(
+      (distance, candidate)
+      for candidate in candidates
+      if (distance := hash_distance(candidate, image_hash)) <= self.max_distance
+    )
+    if not near:
+      return None
+
+    results = self.cache.get_many([self._result_key(candidate) for _, candidate in near])
+    for _, candidate in near:
+      text = results.get(self._result_key(candidate))
+      if text is not None:
+        return text
+    return None
+
+  def put(self, image_hash, text):
+    self.cache.set(self._result_key(image_hash), text, self.ttl)
+
+    band_keys = self._band_keys(image_hash)
+    current = self.cache.get_many(band_keys)
+    updates = {}
+    for key in band_keys:
+      hashes = [image_hash] + [h for h in current.get(key, []) if h != image_hash]
+      updates[key] = hashes[:self.candidates_per_band]
+    self.cache.set_many(updates, self.ttl)
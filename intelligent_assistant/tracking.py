@@ -0,0 +1,123 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Resultado de ObjectTracker.update, alineado con las detecciones recibidas.
+TrackUpdate = namedtuple('TrackUpdate', ['ids', 'new', 'ttc'])
+
+
+def box_iou(a, b):
+  # IoU entre todas las cajas de `a` (N, 4) y `b` (M, 4) -> (N, M).
+  x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+  y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+  x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+  y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+  intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+  area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+  area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+  return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+class ObjectTracker:
+  """
+  Seguimiento por conexión de las detecciones de YOLO entre frames. Asocia
+  por IoU (y, si no hay solapamiento, por distancia entre centros) dentro de
+  la misma clase y mantiene un ID estable por objeto.
+
+  La escala de un objeto es la raíz de su área normalizada; si crece, el
+  objeto se acerca. El tiempo hasta la colisión es escala / (d escala / dt),
+  con la velocidad suavizada por una media exponencial. El coste es un par
+  de operaciones numpy sobre matrices de N tracks x M detecciones.
+  """
+
+  def __init__(self, iou_threshold=0.3, max_centroid_distance=0.15, max_age=3.0, approach_ttc=4.0, smoothing=0.5):
+    self.iou_threshold = iou_threshold
+    self.max_centroid_distance = max_centroid_distance
+    self.max_age = max_age
+    self.approach_ttc = approach_ttc
+    self.smoothing = smoothing
+    self._next_id = 1
+    self._ids = np.empty(0, dtype=np.int64)
+    self._boxes = np.empty((0, 4), dtype=np.float32)
+    self._cls = np.empty(0, dtype=np.int16)
+    self._seen = np.empty(0, dtype=np.float64)
+    self._scale = np.empty(0, dtype=np.float32)
+    self._rate = np.empty(0, dtype=np.float32)
+
+  def __len__(self):
+    return len(self._ids)
+
+  def update(self, objects, timestamp):
+    alive = timestamp - self._seen <= self.max_age
+    self._keep(alive)
+
+    boxes = np.stack([objects['x1'], objects['y1'], objects['x2'], objects['y2']], axis=1).astype(np.float32)
+    scale = np.sqrt(np.clip((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 0, None))
+    matches = self._match(boxes, objects['cls'])
+
+    ids = np.empty(len(objects), dtype=np.int64)
+    new = np.ones(len(objects), dtype=bool)
+    rate = np.zeros(len(objects), dtype=np.float32)
+    for track, detection in matches:
+      dt = timestamp - self._seen[track]
+      if dt > 0:
+        instant = (scale[detection] - self._scale[track]) / dt
+        rate[detection] = self.smoothing * instant + (1 - self.smoothing) * self._rate[track]
+      else:
+        rate[detection] = self._rate[track]
+      ids[detection] = self._ids[track]
+      new[detection] = False
+
+    fresh = np.flatnonzero(new)
+    ids[fresh] = np.arange(self._next_id, self._next_id + len(fresh))
+    self._next_id += len(fresh)
+
+    # Los tracks no vistos en este frame se conservan hasta `max_age`.
+    unmatched = np.ones(len(self._ids), dtype=bool)
+    unmatched[[track for track, _ in matches]] = False
+    self._ids = np.concatenate([self._ids[unmatched], ids])
+    self._boxes = np.concatenate([self._boxes[unmatched], boxes])
+    self._cls = np.concatenate([self._cls[unmatched], objects['cls'].astype(np.int16)])
+    self._seen = np.concatenate([self._seen[unmatched], np.full(len(ids), timestamp)])
+    self._scale = np.concatenate([self._scale[unmatched], scale])
+    self._rate = np.concatenate([self._rate[unmatched], rate])
+
+    with np.errstate(divide='ignore'):
+      ttc = np.where(rate > 0, scale / rate, np.inf).astype(np.float32)
+    return TrackUpdate(ids, new, ttc)
+
+  def approaching(self, update):
+    return update.ttc < self.approach_ttc
+
+  def _keep(self, mask):
+    self._ids = self._ids[mask]
+    self._boxes = self._boxes[mask]
+    self._cls = self._cls[mask]
+    self._seen = self._seen[mask]
+    self._scale = self._scale[mask]
+    self._rate = self._rate[mask]
+
+  def _match(self, boxes, cls):
+    if not len(self._ids) or not len(boxes):
+      return []
+
+    same_class = self._cls[:, None] == cls[None, :].astype(np.int16)
+    iou = np.where(same_class, box_iou(self._boxes, boxes), 0)
+    track_centers = (self._boxes[:, :2] + self._boxes[:, 2:]) / 2
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    distance = np.linalg.norm(track_centers[:, None, :] - centers[None, :, :], axis=2)
+    near = same_class & (distance <= self.max_centroid_distance)
+
+    # Prioridad: IoU y, para objetos sin solapamiento (movimiento rápido), cercanía del centro.
+    score = np.where(iou >= self.iou_threshold, 1 + iou, np.where(near, 1 - distance, 0))
+    matches = []
+    used_tracks, used_detections = set(), set()
+    candidates = np.flatnonzero(score > 0)
+    for flat in candidates[np.argsort(score.flat[candidates])[::-1]]:
+      track, detection = divmod(int(flat), score.shape[1])
+      if track in used_tracks or detection in used_detections:
+        continue
+      used_tracks.add(track)
+      used_detections.add(detection)
+      matches.append((track, detection))
+    return matches
@@ -0,0 +1,155 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from uuid import uuid4
+
+from django.conf import settings
+
+
+class UploadQueueFull(RuntimeError):
+  pass
+
+
+class S3FrameStore:
+  """
+  Sube frames a S3 (o a un servicio compatible como MinIO vía `endpoint_url`)
+  con un único cliente boto3 reutilizado por todos los hilos.
+  """
+
+  def __init__(self, bucket, region=None, access_key=None, secret_key=None, endpoint_url=None,
+               custom_domain=None, max_pool_connections=10):
+    self.bucket = bucket
+    self.region = region
+    self.access_key = access_key
+    self.secret_key = secret_key
+    self.endpoint_url = endpoint_url
+    self.custom_domain = custom_domain or f"{bucket}.s3.amazonaws.com"
+    self.max_pool_connections = max_pool_connections
+    self._client = None
+    self._lock = threading.Lock()
+
+  @property
+  def client(self):
+    with self._lock:
+      if self._client is None:
+        import boto3
+        from botocore.config import Config
+
+        self._client = boto3.client(
+          "s3",
+          aws_access_key_id=self.access_key,
+          aws_secret_access_key=self.secret_key,
+          region_name=self.region,
+          endpoint_url=self.endpoint_url,
+          config=Config(max_pool_connections=self.max_pool_connections),
+        )
+      return self._client
+
+  def put(self, key, body):
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    try:
+      self.client.put_object(
+        Bucket=self.bucket,
+        Key=key,
+        Body=body,
+        ContentType='image/jpeg',
+      )
+    except (BotoCoreError, ClientError) as e:
+      raise RuntimeError(f"Error subiendo a S3: {e}")
+
+    if self.endpoint_url:
+      return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{key}"
+    return f"https://{self.custom_domain}/{key}"
+
+
+class LocalFrameStore:
+  """
+  Sustituto de S3 que guarda los frames en disco (desarrollo y pruebas).
+  """
+
+  def __init__(self, root, base_url):
+    self.root = root
+    self.base_url = base_url
+
+  def put(self, key, body):
+    path = os.path.join(self.root, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+      f.write(body)
+    return f"{self.base_url.rstrip('/')}/{key}"
+
+
+class FrameUploader:
+  """
+  Cola de subidas en segundo plano con tamaño máximo y reintentos con
+  espera exponencial. Cada uno de los `workers` hilos sube un frame a la
+  vez con el cliente compartido, así que hay como mucho `workers` subidas
+  simultáneas. `submit` no bloquea y devuelve un Future con la URL final.
+  """
+
+  def __init__(self, store, max_queue=64, workers=2, max_retries=3, retry_backoff=0.5, prefix="frames"):
+    self.store = store
+    self.workers = workers
+    self.max_retries = max_retries
+    self.retry_backoff = retry_backoff
+    self.prefix = prefix
+    self._queue = queue.Queue(maxsize=max_queue)
+    self._threads = []
+    self._lock = threading.Lock()
+
+  def submit(self, body):
+    self._ensure_started()
+    future = Future()
+    try:
+      self._queue.put_nowait((body, future))
+    except queue.Full:
+      future.set_exception(UploadQueueFull("Cola de subidas llena, se descarta el frame."))
+    return future
+
+  def pending(self):
+    return self._queue.qsize()
+
+  def _ensure_started(self):
+    with self._lock:
+      if self._threads:
+        return
+      for index in range(self.workers):
+        thread = threading.Thread(target=self._run, name=f"frame-uploader-{index}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+  def _run(self):
+    # Un frame por iteración: si un hilo reservara varios, los demás quedarían ociosos mientras los sube en serie.
+    while True:
+      body, future = self._queue.get()
+      self._upload(body, future)
+
+  def _upload(self, body, future):
+    key = f"{self.prefix}/{uuid4().hex}_{int(time.time())}.jpg"
+    for attempt in range(self.max_retries + 1):
+      try:
+        future.set_result(self.store.put(key, body))
+        return
+      except Exception as e:
+        if attempt == self.max_retries:
+          future.set_exception(e)
+          return
+        time.sleep(self.retry_backoff * 2 ** attempt)
+
+
+def build_frame_store():
+  if getattr(settings, "FRAME_UPLOAD_BACKEND", 's3') == 'local':
+    return LocalFrameStore(settings.MEDIA_ROOT, settings.MEDIA_URL)
+
+  return S3FrameStore(
+    settings.AWS_STORAGE_BUCKET_NAME,
+    region=getattr(settings, "AWS_S3_REGION_NAME", None),
+    access_key=getattr(settings, "AWS_ACCESS_KEY_ID", None),
+    secret_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
+    endpoint_url=getattr(settings, "AWS_S3_ENDPOINT_URL", None),
+    custom_domain=getattr(settings, "AWS_S3_CUSTOM_DOMAIN", None),
+    max_pool_connections=getattr(settings, "FRAME_UPLOAD_WORKERS", 2) * 2,
+  )
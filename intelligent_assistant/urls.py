@@ -1,10 +1,12 @@
 from django.urls import path
 
-from .views import TextReaderView, ObstacleDetectionView
+from .views import MetricsView, ModelReadinessView, TextReaderView, ObstacleDetectionView
 
 app_name = 'intelligent_assistant'
 
 urlpatterns = [
   path('text_reader/', TextReaderView.as_view(), name='text_reader'),
   path('obstacle_detection/', ObstacleDetectionView.as_view(), name='obstacle_detection'),
+  path('health/ready/', ModelReadinessView.as_view(), name='readiness'),
+  path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,86 +1,175 @@
+import asyncio
 import base64
+import io
 import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import google.generativeai as genai
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import caches
 from django.contrib.auth.mixins import LoginRequiredMixin
 from utils.safe_views import SafeExceptionMixin
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 
+from .gemini import (
+  PRIORITY_TEXT_READER, TEXT_READER_MODEL, TEXT_READER_PROMPT, GeminiUnavailable, get_gateway, get_model_catalog,
+)
+from .imaging import normalize_image
+from .metrics import merge_snapshots, metrics, read_snapshots, render_prometheus
+from .model_registry import ai_models
+from .ocr import LocalOCR
+from .text_cache import TextResultCache, text_image_hash
 
-@method_decorator(csrf_exempt, name='dispatch')
-class TextReaderView(SafeExceptionMixin, LoginRequiredMixin, View):
+# Cliente y catálogo de modelos compartidos por el proceso; el catálogo lo arranca asgi.py y se
+# refresca en segundo plano, nunca dentro de una petición. Sin catálogo se usa el nombre configurado.
+gemini_gateway = get_gateway()
+model_catalog = get_model_catalog()
 
-  def get(self, request, *args, **kwargs):
-    try:
-      api_key = settings.GEMINI_API_KEY
-      genai.configure(api_key=api_key)
+# Resultados recientes por imagen casi idéntica (mismo cartel, etiqueta o página).
+text_result_cache = TextResultCache(
+  caches[getattr(settings, "TEXT_READER_CACHE_ALIAS", 'text_reader')],
+  max_distance=getattr(settings, "TEXT_READER_CACHE_MAX_DISTANCE", 24),
+  ttl=getattr(settings, "TEXT_READER_CACHE_TTL", 3600),
+  prefix=f"text_reader:{TEXT_READER_MODEL}",
+) if getattr(settings, "TEXT_READER_CACHE_ENABLED", True) else None
 
-      print("\n" + "=" * 60)
-      print("MODELOS DISPONIBLES EN TU API:")
-      print("=" * 60)
 
-      models = genai.list_models()
+# OCR local opcional para texto impreso; si no es fiable, la imagen sigue a Gemini.
+local_ocr = LocalOCR(
+  languages=getattr(settings, "TEXT_OCR_LANGUAGES", ('es', 'en')),
+  max_side=getattr(settings, "TEXT_OCR_MAX_SIDE", 1280),
+  min_confidence=getattr(settings, "TEXT_OCR_MIN_CONFIDENCE", 0.8),
+) if getattr(settings, "TEXT_OCR_ENABLED", False) else None
 
-      for model in models:
-        if 'generateContent' in model.supported_generation_methods:
-          print(f"\n✓ Nombre: {model.name}")
-          print(f"  Display: {model.display_name}")
-          print(f"  Métodos: {model.supported_generation_methods}")
+# Un solo hilo dedicado: el OCR es CPU intensivo y las lecturas se serializan de todos modos.
+OCR_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="text-ocr") if local_ocr else None
 
-      print("\n" + "=" * 60 + "\n")
 
-    except Exception as e:
-      print(f"ERROR listando modelos: {e}")
+logger = logging.getLogger(__name__)
+
+TEXT_READER_RESULTS = metrics.counter('pathfinder_text_reader_results_total', "Lecturas de texto respondidas, por origen")
+TEXT_READER_SECONDS = metrics.histogram('pathfinder_text_reader_seconds', "Duración de las lecturas de texto en segundos, por origen")
+
+
+RAW_IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'application/octet-stream')
+
+
+def read_uploaded_image(request):
+  """
+  Imagen del lector de texto ya normalizada (lado mayor y calidad JPEG de
+  settings). Acepta `multipart/form-data` con el campo `image`, el cuerpo
+  binario tal cual (`image/*`) o el JSON anterior con una data URL en base64.
+  """
+  if request.content_type == 'multipart/form-data':
+    source = request.FILES.get('image')
+  elif request.content_type in RAW_IMAGE_TYPES:
+    source = io.BytesIO(request.body) if request.body else None
+  else:
+    image_data = json.loads(request.body).get('image_data')
+    if image_data and ';base64,' in image_data:
+      source = io.BytesIO(base64.b64decode(image_data.split(';base64,', 1)[1]))
+    else:
+      source = None
+
+  if source is None:
+    raise ValueError('No se proporcionaron datos de imagen válidos.')
+
+  return normalize_image(
+    source,
+    max_edge=getattr(settings, "TEXT_READER_MAX_EDGE", 1600),
+    quality=getattr(settings, "TEXT_READER_JPEG_QUALITY", 85),
+  )
+
+
+def lookup_text_result(image_bytes):
+  image_hash = text_image_hash(image_bytes)
+  return image_hash, text_result_cache.get(image_hash)
+
+
+def text_reader_model():
+  # La primera llamada importa y configura google.generativeai: fuera del event loop.
+  return gemini_gateway.model(model_catalog.resolve(TEXT_READER_MODEL))
 
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TextReaderView(SafeExceptionMixin, LoginRequiredMixin, View):
+
+  async def get(self, request, *args, **kwargs):
     return render(request, 'intelligent_assistant/text_reader.html')
 
-  def post(self, request, *args, **kwargs):
+  async def post(self, request, *args, **kwargs):
+    started = time.perf_counter()
     try:
       api_key = settings.GEMINI_API_KEY
       if not api_key:
         return JsonResponse({'error': 'La clave de API de Google no está configurada en settings.py.'}, status=500)
 
-      genai.configure(api_key=api_key)
-
-      data = json.loads(request.body)
-      image_data = data.get('image_data')
-
-      if not image_data or ';base64,' not in image_data:
-        return JsonResponse({'error': 'No se proporcionaron datos de imagen válidos.'}, status=400)
-
-      header, encoded = image_data.split(';base64,', 1)
-      image_bytes = base64.b64decode(encoded)
+      try:
+        image_bytes = await sync_to_async(read_uploaded_image, thread_sensitive=False)(request)
+      except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+      image_hash = None
+      if text_result_cache is not None:
+        lookup_started = time.perf_counter()
+        image_hash, cached_text = await sync_to_async(lookup_text_result, thread_sensitive=False)(image_bytes)
+        if cached_text is not None:
+          lookup_ms = round(1000 * (time.perf_counter() - lookup_started), 2)
+          self.record_result('cache', started)
+          return JsonResponse({'text': cached_text, 'cached': True, 'lookup_ms': lookup_ms})
+
+      if local_ocr is not None:
+        try:
+          ocr_text, confidence = await asyncio.get_running_loop().run_in_executor(
+            OCR_EXECUTOR, local_ocr.read, image_bytes
+          )
+        except Exception as e:
+          logger.warning("OCR local no disponible, se usa Gemini: %s", e)
+          ocr_text = None
+        if ocr_text:
+          if image_hash is not None:
+            await sync_to_async(text_result_cache.put, thread_sensitive=False)(image_hash, ocr_text)
+          self.record_result('ocr', started)
+          return JsonResponse({'text': ocr_text, 'cached': False, 'source': 'ocr', 'confidence': round(confidence, 3)})
 
       image_parts = [{"mime_type": "image/jpeg", "data": image_bytes}]
 
-      prompt_text = (
-        "Analiza esta imagen. Tu tarea es responder de la manera más concisa posible. "
-        "Si la imagen contiene principalmente texto legible (como un cartel, un documento o una etiqueta), "
-        "extrae y devuelve ÚNICAMENTE el texto que ves, sin añadir ninguna palabra introductoria. "
-        "Si la imagen contiene símbolos, dibujos, objetos, personas o una escena, "
-        "describe brevemente lo que ves en la imagen, como si se lo explicaras a una persona ciega. "
-        "No incluyas formatos como markdown."
-      )
+      model = await sync_to_async(text_reader_model, thread_sensitive=False)()
 
-      model = genai.GenerativeModel('gemini-2.5-flash')
-
-      response = model.generate_content([prompt_text, image_parts[0]])
+      try:
+        response = await asyncio.wrap_future(gemini_gateway.submit(
+          model.generate_content,
+          [TEXT_READER_PROMPT, image_parts[0]],
+          priority=PRIORITY_TEXT_READER,
+        ))
+      except GeminiUnavailable:
+        self.record_result('unavailable', started)
+        return JsonResponse({'error': 'El servicio de lectura está saturado. Intenta de nuevo en unos segundos.'}, status=503)
 
       if response and response.text:
-        return JsonResponse({'text': response.text.strip()})
+        text = response.text.strip()
+        if image_hash is not None:
+          await sync_to_async(text_result_cache.put, thread_sensitive=False)(image_hash, text)
+        self.record_result('gemini', started)
+        return JsonResponse({'text': text, 'cached': False, 'source': 'gemini'})
       else:
         return JsonResponse({'text': 'No se pudo obtener una respuesta de la IA.'})
 
     except Exception as e:
-      print(f"Error en TextReaderView: {e}")
+      logger.exception("Error en TextReaderView.")
       return JsonResponse({'error': f'Ocurrió un error en el servidor: {str(e)}'}, status=500)
 
+  def record_result(self, source, started):
+    TEXT_READER_RESULTS.inc(source=source)
+    TEXT_READER_SECONDS.observe(time.perf_counter() - started, source=source)
+
 
 class ObstacleDetectionView(SafeExceptionMixin, LoginRequiredMixin, TemplateView):
   template_name = 'intelligent_assistant/obstacle_detection.html'
@@ -88,4 +177,28 @@ class ObstacleDetectionView(SafeExceptionMixin, LoginRequiredMixin, TemplateView
   def get_context_data(self, **kwargs):
     context = super().get_context_data(**kwargs)
     context['page_title'] = "Detección de Obstáculos"
+    context['continuous_mode'] = getattr(settings, "OBSTACLE_CONTINUOUS_MODE", False)
     return context
+
+
+class ModelReadinessView(View):
+  # Health check de readiness para el despliegue: 200 si el proceso puede atender, 503 si no.
+
+  def get(self, request, *args, **kwargs):
+    status = ai_models.status()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
+
+class MetricsView(View):
+  # Métricas en formato de texto de Prometheus, sumadas entre todos los workers que exportan a METRICS_DIR.
+
+  def get(self, request, *args, **kwargs):
+    snapshots = read_snapshots(
+      getattr(settings, "METRICS_DIR", None),
+      metrics.snapshot(),
+      max_age=getattr(settings, "METRICS_MAX_AGE", 60),
+    )
+    return HttpResponse(
+      render_prometheus(merge_snapshots(snapshots)),
+      content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
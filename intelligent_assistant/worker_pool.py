@@ -0,0 +1,267 @@
+import atexit
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .inference import LocalDetector, load_yolo
+
+
+class SharedFrameRing:
+  """
+  Ranuras de memoria compartida reutilizables. El proceso principal copia el
+  frame decodificado en una ranura libre y el worker lo lee sin serializarlo.
+  """
+
+  def __init__(self, slots, slot_bytes):
+    self.slot_bytes = slot_bytes
+    self.segments = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(slots)]
+    self._free = queue.Queue()
+    for index in range(slots):
+      self._free.put(index)
+
+  @property
+  def names(self):
+    return [segment.name for segment in self.segments]
+
+  def acquire(self, timeout=None):
+    try:
+      return self._free.get(timeout=timeout)
+    except queue.Empty:
+      raise TimeoutError("No hay ranuras de memoria compartida libres.")
+
+  def release(self, index):
+    self._free.put(index)
+
+  def write(self, index, image):
+    if image.dtype != np.uint8 or image.nbytes > self.slot_bytes:
+      raise ValueError(f"Frame {image.shape} no cabe en una ranura de {self.slot_bytes} bytes.")
+
+    view = np.ndarray(image.shape, dtype=np.uint8, buffer=self.segments[index].buf)
+    np.copyto(view, image)
+    return image.shape
+
+  def close(self):
+    for segment in self.segments:
+      segment.close()
+      segment.unlink()
+    self.segments = []
+
+
+def load_local_detector(weights, task):
+  return LocalDetector(load_yolo(weights, task))
+
+
+def _worker_main(load_detector, weights, task, slot_names, tasks, results, threads):
+  try:
+    import torch
+    torch.set_num_threads(threads)
+  except ImportError:
+    pass
+
+  detector = load_detector(weights, task)
+  segments = [shared_memory.SharedMemory(name=name) for name in slot_names]
+  results.put(('ready', os.getpid(), dict(detector.names)))
+
+  while True:
+    message = tasks.get()
+    if message is None:
+      break
+
+    request_id, frames = message
+    try:
+      images = [np.ndarray(shape, dtype=np.uint8, buffer=segments[slot].buf) for slot, shape in frames]
+      detections = detector(images)
+      del images
+      results.put(('result', request_id, detections, None))
+    except Exception as e:
+      results.put(('result', request_id, None, repr(e)))
+
+  for segment in segments:
+    segment.close()
+
+
+class _Worker:
+  # Proceso de inferencia con su propia cola: el pool sabe qué peticiones tiene cada uno.
+
+  def __init__(self, process, tasks):
+    self.process = process
+    self.tasks = tasks
+    self.requests = set()
+
+
+class _Request:
+  __slots__ = ('future', 'slots', 'worker', 'started')
+
+  def __init__(self, future, slots, worker, started):
+    self.future = future
+    self.slots = slots
+    self.worker = worker
+    self.started = started
+
+
+class InferenceWorkerPool:
+  """
+  Procesos de inferencia YOLO independientes del intérprete de Daphne.
+  Cada proceso carga el modelo una sola vez; los frames llegan por
+  SharedFrameRing y las detecciones vuelven como arreglos float32 (N, 6).
+
+  Las ranuras de una petición se liberan cuando llega la respuesta del
+  worker o cuando ese worker muere, nunca al agotarse la espera del
+  llamador: el worker podría seguir leyéndolas. Un hilo vigila los
+  procesos; si uno termina (o tarda más de `hang_timeout` en responder y se
+  mata), sus peticiones fallan y se arranca otro en su lugar.
+  """
+
+  def __init__(self, weights, processes, task='segment', max_frame_size=(1920, 1080), slots=None, timeout=30,
+               hang_timeout=None, load_detector=load_local_detector, start_method='spawn'):
+    self._context = multiprocessing.get_context(start_method)
+    width, height = max_frame_size
+    self.weights = weights
+    self.task = task
+    self.timeout = timeout
+    self.hang_timeout = hang_timeout or 2 * timeout
+    self.load_detector = load_detector
+    self.restarts = 0
+    self.ring = SharedFrameRing(slots or processes * 8, width * height * 3)
+    self._results = self._context.Queue()
+    self._pending = {}
+    self._lock = threading.Lock()
+    self._ids = itertools.count()
+    self._ready = threading.Event()
+    self._names = {}
+    self._closed = False
+    self._threads = max(1, (os.cpu_count() or 1) // processes)
+    self._workers = [self._spawn() for _ in range(processes)]
+
+    self._collector = threading.Thread(target=self._collect_results, name="yolo-pool-results", daemon=True)
+    self._collector.start()
+    self._monitor = threading.Thread(target=self._watch_workers, name="yolo-pool-monitor", daemon=True)
+    self._monitor.start()
+    atexit.register(self.close)
+
+  @property
+  def processes(self):
+    return len(self._workers)
+
+  @property
+  def names(self):
+    if not self._ready.wait(self.timeout):
+      raise TimeoutError("Los procesos de inferencia no terminaron de cargar el modelo.")
+    return self._names
+
+  def _spawn(self):
+    tasks = self._context.Queue()
+    process = self._context.Process(
+      target=_worker_main,
+      args=(self.load_detector, self.weights, self.task, self.ring.names, tasks, self._results, self._threads),
+      daemon=True,
+    )
+    process.start()
+    return _Worker(process, tasks)
+
+  def __call__(self, images):
+    slots = []
+    try:
+      frames = []
+      for image in images:
+        slot = self.ring.acquire(timeout=self.timeout)
+        slots.append(slot)
+        frames.append((slot, self.ring.write(slot, image)))
+    except Exception:
+      for slot in slots:
+        self.ring.release(slot)
+      raise
+
+    request_id = next(self._ids)
+    future = Future()
+    with self._lock:
+      worker = min(self._workers, key=lambda worker: len(worker.requests))
+      worker.requests.add(request_id)
+      self._pending[request_id] = _Request(future, slots, worker, time.monotonic())
+      worker.tasks.put((request_id, frames))
+    # Si se agota la espera, las ranuras siguen reservadas hasta la respuesta o la muerte del worker.
+    return future.result(timeout=self.timeout)
+
+  def _finish(self, request, detections=None, error=None):
+    for slot in request.slots:
+      self.ring.release(slot)
+    if request.future.done():
+      return
+    if error:
+      request.future.set_exception(RuntimeError(f"Error en el proceso de inferencia: {error}"))
+    else:
+      request.future.set_result(detections)
+
+  def _collect_results(self):
+    while True:
+      message = self._results.get()
+      if message is None:
+        break
+
+      if message[0] == 'ready':
+        self._names = message[2]
+        self._ready.set()
+        continue
+
+      _, request_id, detections, error = message
+      with self._lock:
+        request = self._pending.pop(request_id, None)
+        if request is not None:
+          request.worker.requests.discard(request_id)
+      if request is not None:
+        self._finish(request, detections, error)
+
+  def _watch_workers(self):
+    while not self._closed:
+      workers = {worker.process.sentinel: worker for worker in self._workers}
+      for sentinel in multiprocessing.connection.wait(list(workers), timeout=1.0):
+        if not self._closed:
+          self._replace(workers[sentinel], "terminó inesperadamente")
+
+      now = time.monotonic()
+      with self._lock:
+        hung = [
+          worker for worker in self._workers
+          if any(now - self._pending[request_id].started > self.hang_timeout for request_id in worker.requests)
+        ]
+      for worker in hung:
+        # Al morir, la siguiente vuelta lo sustituye y recupera sus ranuras.
+        worker.process.terminate()
+
+  def _replace(self, worker, reason):
+    # El sustituto arranca fuera del lock: con spawn tarda y bloquearía a los llamadores.
+    replacement = self._spawn()
+    with self._lock:
+      orphaned = [self._pending.pop(request_id) for request_id in worker.requests]
+      self._workers[self._workers.index(worker)] = replacement
+      self.restarts += 1
+
+    worker.process.join(timeout=1)
+    worker.tasks.close()
+    for request in orphaned:
+      self._finish(request, error=f"el proceso {worker.process.pid} {reason}")
+
+  def close(self):
+    if self._closed:
+      return
+    self._closed = True
+
+    for worker in self._workers:
+      worker.tasks.put(None)
+    for worker in self._workers:
+      worker.process.join(timeout=5)
+      if worker.process.is_alive():
+        worker.process.terminate()
+    self._monitor.join(timeout=2)
+    self._workers = []
+
+    self._results.put(None)
+    self.ring.close()
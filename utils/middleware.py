@@ -1,8 +1,19 @@
+import logging
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import render
 from django.urls import resolve, Resolver404, NoReverseMatch
 from django.conf import settings
 from django.urls.exceptions import NoReverseMatch
 
+from utils.tracing import correlation, get_profiler, new_id, span
+
+logger = logging.getLogger(__name__)
+
+# Un X-Request-ID del proxy se reutiliza solo si es un identificador razonable.
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
 class CustomErrorMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -56,4 +67,48 @@ class CustomErrorMiddleware:
                     "is_5xx": True,
                 }
                 return render(request, "errors.html", context=context, status=500)
-            raise  
\ No newline at end of file
+            raise  
+
+
+class RequestTracingMiddleware:
+    """
+    ID de correlación por petición (el X-Request-ID recibido o uno nuevo),
+    span raíz `request` y perfilado por muestreo. Al terminar registra método,
+    ruta, estado y duración, y devuelve el ID en la cabecera X-Request-ID.
+    Funciona en modo síncrono y asíncrono para no forzar cambios de hilo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.profiler = get_profiler()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id = self.request_id(request)
+        with correlation(request=request_id), self.profiler.profile('request'), span('request') as timing:
+            response = self.get_response(request)
+        return self.finish(request, response, request_id, timing)
+
+    async def __acall__(self, request):
+        request_id = self.request_id(request)
+        with correlation(request=request_id), self.profiler.profile('request'), span('request') as timing:
+            response = await self.get_response(request)
+        return self.finish(request, response, request_id, timing)
+
+    def request_id(self, request):
+        received = request.headers.get('X-Request-ID', '')
+        return received if REQUEST_ID_PATTERN.match(received) else new_id()
+
+    def finish(self, request, response, request_id, timing):
+        response['X-Request-ID'] = request_id
+        logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={'request': request_id, 'status': response.status_code, 'duration_ms': round(1000 * timing.seconds, 1)},
+        )
+        return response
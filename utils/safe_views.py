@@ -1,5 +1,5 @@
-import traceback
 import inspect
+import logging
 import os
 from django.http import JsonResponse, HttpResponse, Http404
 from django.contrib import messages
@@ -7,11 +7,13 @@ from django.shortcuts import render
 from django.template import TemplateDoesNotExist, TemplateSyntaxError
 from django.template.response import TemplateResponse
 from django.views import View
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.urls.exceptions import Resolver404, NoReverseMatch
 from django.core.exceptions import PermissionDenied
 from django.urls import resolve, reverse
 
+logger = logging.getLogger(__name__)
 
 class SafeExceptionMixin:
 
@@ -81,144 +83,166 @@ class SafeExceptionMixin:
     except Exception as e:
       return str(e)
 
+  def _run_checks(self, request):
+    url_check = self._verify_url_exists(request)
+    if isinstance(url_check, TemplateResponse):
+      return url_check
+
+    view_check = self._check_view_file()
+    if isinstance(view_check, str):
+      context = {
+        "code": 500,
+        "title": "Error en archivo de vista",
+        "message": f"Se detectó un problema en la vista: {view_check}",
+        "is_4xx": False,
+        "is_5xx": True,
+      }
+      return render(request, "errors.html", context=context, status=500)
+    
+    files_check = self._verify_related_files()
+    if isinstance(files_check, str):
+      context = {
+        "code": 500,
+        "title": "Error en archivos relacionados",
+        "message": f"Se detectó un problema en archivos del sistema: {files_check}",
+        "is_4xx": False,
+        "is_5xx": True,
+      }
+      return render(request, "errors.html", context=context, status=500)
+
+    return None
+
+  def _check_response(self, request, response):
+    try:
+      if isinstance(response, TemplateResponse) and not response.is_rendered:
+        response.render()
+        
+        if not response.content.strip():
+          context = {
+            "code": 404,
+            "title": "Página vacía",
+            "message": "La página que intentas ver está vacía. Por favor, verifica que el contenido exista.",
+            "is_4xx": True,
+            "is_5xx": False,
+          }
+          return render(request, "errors.html", context=context, status=404)
+          
+    except Exception:
+      raise
+
+    return response
+
   def dispatch(self, request, *args, **kwargs):
+    if self.view_is_async:
+      return self._async_dispatch(request, *args, **kwargs)
+
     try:
-      url_check = self._verify_url_exists(request)
-      if isinstance(url_check, TemplateResponse):
-        return url_check
-
-      view_check = self._check_view_file()
-      if isinstance(view_check, str):
-        context = {
-          "code": 500,
-          "title": "Error en archivo de vista",
-          "message": f"Se detectó un problema en la vista: {view_check}",
-          "is_4xx": False,
-          "is_5xx": True,
-        }
-        return render(request, "errors.html", context=context, status=500)
-      
-      files_check = self._verify_related_files()
-      if isinstance(files_check, str):
-        context = {
-          "code": 500,
-          "title": "Error en archivos relacionados",
-          "message": f"Se detectó un problema en archivos del sistema: {files_check}",
-          "is_4xx": False,
-          "is_5xx": True,
-        }
-        return render(request, "errors.html", context=context, status=500)
+      check = self._run_checks(request)
+      if check is not None:
+        return check
 
       response = super().dispatch(request, *args, **kwargs)
+      return self._check_response(request, response)
+    except Exception as e:
+      return self._handle_exception(request, e)
 
-      try:
-        if isinstance(response, TemplateResponse) and not response.is_rendered:
-          response.render()
-          
-          if not response.content.strip():
-            context = {
-              "code": 404,
-              "title": "Página vacía",
-              "message": "La página que intentas ver está vacía. Por favor, verifica que el contenido exista.",
-              "is_4xx": True,
-              "is_5xx": False,
-            }
-            return render(request, "errors.html", context=context, status=404)
-            
-      except Exception:
-        raise
-
-      return response
+  async def _async_dispatch(self, request, *args, **kwargs):
+    try:
+      # request.user se carga desde la sesión (base de datos): se resuelve fuera del event loop.
+      await sync_to_async(lambda: request.user.is_authenticated)()
+
+      check = self._run_checks(request)
+      if check is not None:
+        return check
+
+      response = super().dispatch(request, *args, **kwargs)
+      if inspect.isawaitable(response):
+        response = await response
+      return self._check_response(request, response)
     except Exception as e:
-      tb = traceback.format_exc()
-      print("\n" + "=" * 60)
-      print(f"ERROR HANDLED in view {self.__class__.__name__}: {e}")
-      print(f"Error Type: {type(e).__name__}")
-      print(tb)
-      print("=" * 60 + "\n")
+      return self._handle_exception(request, e)
 
-      status_code = 500
-      tech_details = str(e)
-
-      if isinstance(e, Http404):
-        status_code = 404
-      elif isinstance(e, NoReverseMatch):
-        status_code = 500
-        error_msg = str(e)
-        view_name = error_msg.split("'")[1] if "'" in error_msg else "desconocida"
-        tech_details = f"Error en URL: No se pudo encontrar la ruta para '{view_name}'"
-      elif isinstance(e, PermissionError):
-        status_code = 403
-      elif isinstance(e, (TemplateDoesNotExist, TemplateSyntaxError)):
-        status_code = 500
-        tech_details = f"Template Error: {str(e)}"
-      elif isinstance(e, ImportError):
-        status_code = 500
-        tech_details = f"Import Error: {str(e)}"
-      elif isinstance(e, SyntaxError):
-        status_code = 500
-        tech_details = f"Syntax Error: {str(e)}"
-      elif isinstance(e, NameError):
-        status_code = 500
-        tech_details = f"Name Error: {str(e)}"
-      elif isinstance(e, AttributeError):
-        status_code = 500
-        tech_details = f"Attribute Error: {str(e)}"
-      elif isinstance(e, ValueError):
-        status_code = 400
-        tech_details = f"Value Error: {str(e)}"
-      elif isinstance(e, TypeError):
-        status_code = 500
-        tech_details = f"Type Error: {str(e)}"
-      
-      print(f"\nTechnical Details for Developers:")
-      print(f"Status Code: {status_code}")
-      print(f"Error Type: {type(e).__name__}")
-      print(f"Details: {tech_details}")
-      print(f"File: {getattr(e, '__file__', 'N/A')}")
-      print(f"Line: {getattr(e, 'lineno', 'N/A')}")
-      if hasattr(e, 'filename'):
-          print(f"File with error: {e.filename}")
-
-      if request.headers.get("x-requested-with") == "XMLHttpRequest" or request.content_type == "application/json":
-        return JsonResponse({"error": "Ocurrió un error interno en el servidor."}, status=status_code)
-
-      if status_code == 404:
-        title = "Página no encontrada"
-        message = "La página que buscas no existe o fue movida. Verifica la dirección o vuelve al inicio."
-      elif status_code == 403:
-        title = "Acceso denegado"
-        message = "No tienes permiso para acceder a esta sección. Si crees que esto es un error, por favor contacta con soporte."
-      elif status_code == 400:
-        title = "Solicitud incorrecta"
-        message = "Hubo un problema con la información enviada. Por favor verifica los datos e intenta nuevamente."
-      elif isinstance(e, SyntaxError):
-        title = "Error de sintaxis"
-        message = "Estamos experimentando dificultades técnicas. Nuestro equipo ha sido notificado y estamos trabajando en ello."
-      elif isinstance(e, ImportError):
-        title = "Error de módulo"
-        message = "Hay un problema con algunos componentes del sistema. El equipo técnico está trabajando para resolverlo."
-      elif isinstance(e, (TemplateDoesNotExist, TemplateSyntaxError)):
-        title = "Error de plantilla"
-        message = "Hay un problema con la visualización de esta página. El equipo de desarrollo está trabajando en una solución."
-      else:
-        title = "Error interno"
-        message = "Ocurrió un error inesperado. Nuestro equipo ha sido notificado y estamos trabajando para resolverlo."
-
-      is_4xx = str(status_code).startswith('4')
-      is_5xx = str(status_code).startswith('5')
+  def _handle_exception(self, request, e):
+    status_code = 500
+    tech_details = str(e)
 
-      context = {
-        "code": status_code,
-        "title": title,
-        "message": message,
-        "is_4xx": is_4xx,
-        "is_5xx": is_5xx,
-      }
+    if isinstance(e, Http404):
+      status_code = 404
+    elif isinstance(e, NoReverseMatch):
+      status_code = 500
+      error_msg = str(e)
+      view_name = error_msg.split("'")[1] if "'" in error_msg else "desconocida"
+      tech_details = f"Error en URL: No se pudo encontrar la ruta para '{view_name}'"
+    elif isinstance(e, PermissionError):
+      status_code = 403
+    elif isinstance(e, (TemplateDoesNotExist, TemplateSyntaxError)):
+      status_code = 500
+      tech_details = f"Template Error: {str(e)}"
+    elif isinstance(e, ImportError):
+      status_code = 500
+      tech_details = f"Import Error: {str(e)}"
+    elif isinstance(e, SyntaxError):
+      status_code = 500
+      tech_details = f"Syntax Error: {str(e)}"
+    elif isinstance(e, NameError):
+      status_code = 500
+      tech_details = f"Name Error: {str(e)}"
+    elif isinstance(e, AttributeError):
+      status_code = 500
+      tech_details = f"Attribute Error: {str(e)}"
+    elif isinstance(e, ValueError):
+      status_code = 400
+      tech_details = f"Value Error: {str(e)}"
+    elif isinstance(e, TypeError):
+      status_code = 500
+      tech_details = f"Type Error: {str(e)}"
+
+    # Los 4xx son errores del cliente: sin traza. Los 5xx llevan la traza completa.
+    logger.log(
+      logging.ERROR if status_code >= 500 else logging.WARNING,
+      "Error en la vista %s: %s", self.__class__.__name__, tech_details,
+      exc_info=e if status_code >= 500 else None,
+      extra={'view': self.__class__.__name__, 'status': status_code, 'error_type': type(e).__name__, 'path': request.path},
+    )
+
+    if request.headers.get("x-requested-with") == "XMLHttpRequest" or request.content_type == "application/json":
+      return JsonResponse({"error": "Ocurrió un error interno en el servidor."}, status=status_code)
+
+    if status_code == 404:
+      title = "Página no encontrada"
+      message = "La página que buscas no existe o fue movida. Verifica la dirección o vuelve al inicio."
+    elif status_code == 403:
+      title = "Acceso denegado"
+      message = "No tienes permiso para acceder a esta sección. Si crees que esto es un error, por favor contacta con soporte."
+    elif status_code == 400:
+      title = "Solicitud incorrecta"
+      message = "Hubo un problema con la información enviada. Por favor verifica los datos e intenta nuevamente."
+    elif isinstance(e, SyntaxError):
+      title = "Error de sintaxis"
+      message = "Estamos experimentando dificultades técnicas. Nuestro equipo ha sido notificado y estamos trabajando en ello."
+    elif isinstance(e, ImportError):
+      title = "Error de módulo"
+      message = "Hay un problema con algunos componentes del sistema. El equipo técnico está trabajando para resolverlo."
+    elif isinstance(e, (TemplateDoesNotExist, TemplateSyntaxError)):
+      title = "Error de plantilla"
+      message = "Hay un problema con la visualización de esta página. El equipo de desarrollo está trabajando en una solución."
+    else:
+      title = "Error interno"
+      message = "Ocurrió un error inesperado. Nuestro equipo ha sido notificado y estamos trabajando para resolverlo."
+
+    is_4xx = str(status_code).startswith('4')
+    is_5xx = str(status_code).startswith('5')
+
+    context = {
+      "code": status_code,
+      "title": title,
+      "message": message,
+      "is_4xx": is_4xx,
+      "is_5xx": is_5xx,
+    }
 
-      try:
-        return render(request, "errors.html", context=context, status=status_code)
-      except Exception:
-        print("Error rendering errors.html:")
-        print(traceback.format_exc())
-        return HttpResponse(f"Error {status_code}: {message}", status=status_code, content_type="text/plain")
+    try:
+      return render(request, "errors.html", context=context, status=status_code)
+    except Exception:
+      logger.exception("Error renderizando errors.html.")
+      return HttpResponse(f"Error {status_code}: {message}", status=status_code, content_type="text/plain")
@@ -0,0 +1,246 @@
+import contextlib
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+# Campos de correlación (conexión, ciclo, petición...) y span actual. Cada tarea de asyncio
+# hereda una copia del contexto al crearse, así que las tareas de un ciclo llevan su ID.
+_fields = contextvars.ContextVar('trace_fields', default={})
+_span = contextvars.ContextVar('trace_span', default=None)
+
+# Los spans se registran en DEBUG en su propio logger para activarlos sin cambiar el nivel de la aplicación.
+span_logger = logging.getLogger('pathfinder.spans')
+logger = logging.getLogger(__name__)
+
+
+def new_id():
+  return uuid.uuid4().hex[:12]
+
+
+def bind(**fields):
+  # Añade campos de correlación al contexto actual; devuelve el token para `unbind`.
+  return _fields.set({**_fields.get(), **fields})
+
+
+def unbind(token):
+  _fields.reset(token)
+
+
+@contextlib.contextmanager
+def correlation(**fields):
+  token = bind(**fields)
+  try:
+    yield
+  finally:
+    unbind(token)
+
+
+def current_fields():
+  return _fields.get()
+
+
+class span:
+  """
+  Intervalo de tiempo con nombre, anidado en el span actual (`ciclo/yolo`).
+  Al cerrarse guarda la duración en `seconds`, la observa en `histogram`
+  (con `labels`) si se indica y, con el logger de spans en DEBUG, emite un
+  registro con la ruta y la duración. Funciona igual en código síncrono y
+  alrededor de `await`.
+  """
+
+  __slots__ = ('name', 'histogram', 'labels', 'path', 'started', 'seconds', '_token')
+
+  def __init__(self, name, histogram=None, **labels):
+    self.name = name
+    self.histogram = histogram
+    self.labels = labels
+    self.seconds = None
+
+  def __enter__(self):
+    parent = _span.get()
+    self.path = f"{parent}/{self.name}" if parent else self.name
+    self._token = _span.set(self.path)
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc, traceback):
+    self.seconds = time.perf_counter() - self.started
+    _span.reset(self._token)
+    if self.histogram is not None:
+      self.histogram.observe(self.seconds, **self.labels)
+    if span_logger.isEnabledFor(logging.DEBUG):
+      extra = {'span': self.path, 'duration_ms': round(1000 * self.seconds, 3)}
+      if exc_type is not None:
+        extra['error'] = exc_type.__name__
+      span_logger.debug("span %s", self.path, extra=extra)
+
+
+class CorrelationFilter(logging.Filter):
+  # Copia en cada registro los campos de correlación y el span en el que se emitió.
+
+  def filter(self, record):
+    record.correlation = _fields.get()
+    if not hasattr(record, 'span'):
+      record.span = _span.get()
+    return True
+
+
+# Atributos propios de LogRecord; el resto (los pasados con `extra`) se emiten como campos.
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'correlation', 'span'}
+
+
+def _format_value(value):
+  text = str(value)
+  return json.dumps(text, ensure_ascii=False) if not text or ' ' in text or '"' in text else text
+
+
+class StructuredFormatter(logging.Formatter):
+  """
+  Un registro por línea: JSON (`output='json'`, para el agregador de logs)
+  o texto `clave=valor` para la consola. Incluye los campos de correlación,
+  el span actual y los campos pasados con `extra`.
+  """
+
+  def __init__(self, output='json', **kwargs):
+    super().__init__(**kwargs)
+    self.output = output
+
+  def format(self, record):
+    fields = dict(getattr(record, 'correlation', None) or {})
+    if getattr(record, 'span', None):
+      fields['span'] = record.span
+    fields.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+
+    timestamp = f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}"
+    exception = self.formatException(record.exc_info) if record.exc_info else None
+
+    if self.output == 'json':
+      entry = {'time': timestamp, 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+      entry.update(fields)
+      if exception:
+        entry['exception'] = exception
+      return json.dumps(entry, ensure_ascii=False, default=str)
+
+    line = f"{timestamp} {record.levelname:<7} {record.name}: {record.getMessage()}"
+    if fields:
+      line += ' ' + ' '.join(f"{key}={_format_value(value)}" for key, value in fields.items())
+    if exception:
+      line += '\n' + exception
+    return line
+
+
+class ProfileSampler:
+  """
+  Perfila 1 de cada `every` ejecuciones de cada tipo (ciclos, frames del
+  modo continuo, peticiones) y guarda el perfil en `directory`: `.prof` de
+  cProfile (pstats, snakeviz) o `.html` de pyinstrument si está instalado.
+  El nombre del archivo lleva los IDs de correlación para cruzarlo con los
+  logs.
+
+  Solo hay un perfil activo por proceso. cProfile perfila el hilo entero: en
+  el event loop también recoge lo que hagan otras conexiones mientras dura
+  el ciclo. pyinstrument, en modo async, atribuye las esperas a la tarea
+  perfilada.
+  """
+
+  def __init__(self, every=0, directory='profiles', engine='cprofile'):
+    self.every = every
+    self.directory = directory
+    self.engine = engine
+    self._counts = {}
+    self._active = False
+    self._lock = threading.Lock()
+
+  def profile(self, name):
+    # Fuera de la muestra cuesta un contador bajo un lock.
+    if not self.every:
+      return contextlib.nullcontext()
+    with self._lock:
+      count = self._counts[name] = self._counts.get(name, 0) + 1
+      if count % self.every or self._active:
+        return contextlib.nullcontext()
+      self._active = True
+    return self._capture(name)
+
+  @contextlib.contextmanager
+  def _capture(self, name):
+    try:
+      profiler = self._start()
+    except Exception:
+      self._active = False
+      raise
+    started = time.perf_counter()
+    try:
+      yield
+    finally:
+      try:
+        path = self._save(profiler, name)
+        logger.info(
+          "Perfil guardado", extra={'profile': path, 'duration_ms': round(1000 * (time.perf_counter() - started), 1)}
+        )
+      except Exception:
+        logger.exception("No se pudo guardar el perfil de %s", name)
+      finally:
+        self._active = False
+
+  def _start(self):
+    if self.engine == 'pyinstrument':
+      try:
+        from pyinstrument import Profiler
+      except ImportError:
+        logger.warning("pyinstrument no está instalado; se usa cProfile.")
+        self.engine = 'cprofile'
+      else:
+        profiler = Profiler(async_mode='enabled')
+        profiler.start()
+        return profiler
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+  def _save(self, profiler, name):
+    # El perfilador se detiene antes de tocar el disco, aunque la escritura falle.
+    is_cprofile = isinstance(profiler, cProfile.Profile)
+    if is_cprofile:
+      profiler.disable()
+    else:
+      profiler.stop()
+
+    os.makedirs(self.directory, exist_ok=True)
+    ids = '-'.join(str(value) for value in _fields.get().values())
+    base = os.path.join(self.directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}" + (f"-{ids}" if ids else ''))
+
+    if is_cprofile:
+      path = f"{base}.prof"
+      profiler.dump_stats(path)
+      return path
+
+    path = f"{base}.html"
+    with open(path, 'w') as file:
+      file.write(profiler.output_html())
+    return path
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+  # Muestreador compartido por el proceso (ciclos, modo continuo y peticiones HTTP).
+  global _profiler
+  with _profiler_lock:
+    if _profiler is None:
+      _profiler = ProfileSampler(
+        every=getattr(settings, "TRACE_PROFILE_EVERY", 0),
+        directory=getattr(settings, "TRACE_PROFILE_DIR", 'profiles'),
+        engine=getattr(settings, "TRACE_PROFILE_ENGINE", 'cprofile'),
+      )
+    return _profiler